@@ -2,13 +2,22 @@
 import os
 import aws_cdk as cdk
 from scripts.load_env import load_environmental_vars
-from src.cicd.pipeline_manager import StageManagerWeb, StageManagerMT
+from src.cicd.pipeline_manager import StageManagerWeb, StageManagerMT, StageManagerBuildImage
 from src.core.models.repository import Repository
+from src.core.models.cache_profile import CacheProfile
+from src.core.models.build_compute_profile import BuildComputeProfile
+from src.core.models.build_check import BuildCheck
+from src.core.models.api_cache_route import ApiCacheRoute
+from src.core.models.page_weight_budget import PageWeightBudget
+from src.core.models.media_upload_settings import MediaUploadSettings
 
 from src.stacks.cicd_stack import CICDStack
 from src.stacks.vpc_stack import VPCStack
 from src.stacks.website_stack import WebsiteStack
 from src.stacks.middle_tier_stack import MiddleTierStack
+from src.stacks.monitoring_stack import MonitoringStack
+from src.core.stack_registry import StackRegistry
+from src.core.synth_cache import SynthCache
 
 # Load environment-specific variables
 load_environmental_vars()
@@ -29,6 +38,18 @@ repositories = {
         branch="main",
         deployable=True,
         stageType=StageManagerWeb,
+        pipeline_name="RentalPropertiesAgentWeb_DEV",
+        warm_routes=["/"],
+        warm_from_sitemap=True,
+        trigger_excluded_file_paths=["**/*.md", "docs/**", ".github/**"],
+        # nuxt generate is CPU bound, the deploy only syncs files and is done well within Lambda compute limits
+        build_compute=BuildComputeProfile.heavy(),
+        deploy_compute=BuildComputeProfile.lambda_(),
+        build_checks=[
+            BuildCheck(name="Lint", commands=["npm run lint --if-present", "npm run typecheck --if-present"]),
+            BuildCheck(name="UnitTests", commands=["npm test --if-present -- --shard=$SHARD_INDEX/$SHARD_COUNT"], shards=2),
+        ],
+        page_weight_budget=PageWeightBudget(routes=["/"], max_route_total_kb=1000, max_regression_percent=10),
         code_star_connection_arn="arn:aws:codestar-connections:us-east-2:260374441616:connection/b31b9d20-3949-4c6a-b379-df087079cba6"  #aws codestar-connections list-connections
     ),
     "dev-api-repo": Repository(
@@ -38,31 +59,103 @@ repositories = {
         branch="main",
         deployable=True,
         stageType=StageManagerMT,
+        lambda_package="s3",
+        pipeline_name="RentalPropertiesAgentMT_DEV",
+        trigger_excluded_file_paths=["**/*.md", "docs/**", ".github/**"],
+        deploy_compute=BuildComputeProfile.lambda_(),
+        build_checks=[
+            BuildCheck(name="Lint", commands=["python -m compileall -q RPA"]),
+            BuildCheck(name="UnitTests", commands=[
+                "if [ -d tests ]; then pip3 install --quiet pytest && python -m pytest -q --junitxml=reports/junit.xml; fi"
+            ], report_files=["reports/junit.xml"]),
+        ],
+        code_star_connection_arn="arn:aws:codestar-connections:us-east-2:260374441616:connection/b31b9d20-3949-4c6a-b379-df087079cba6"
+    ),
+    # Rebuilds the CodeBuild images whenever one of their Dockerfiles changes
+    "build-images-repo": Repository(
+        name="PAP-CDK",
+        owner="elwo412",
+        repo_name="PAP-CDK",
+        branch="main",
+        deployable=False,
+        requires_approval=False,
+        # Image builds are slow and idempotent, let every Dockerfile change finish in order
+        execution_mode="QUEUED",
+        stageType=StageManagerBuildImage,
+        pipeline_name="RentalPropertiesAgentBuildImages_DEV",
+        trigger_file_paths=["src/cicd/assets/build_images/**"],
         code_star_connection_arn="arn:aws:codestar-connections:us-east-2:260374441616:connection/b31b9d20-3949-4c6a-b379-df087079cba6"
     )
 }
 
-vpcStack = VPCStack(app, "VPCCDKStack", env=env)
-private_lambda_instance = vpcStack.private_lambda_instance
-cdk.Tags.of(vpcStack).add("AppManagerCFNStackKey", "DevelopmentVPC")
+# The middle tier stack creates the uploads bucket, the VPC stack creates the API function with its settings
+# Browsers upload from the website, WEBSITE_DOMAIN is its domain, e.g. the distribution's *.cloudfront.net domain
+media_upload_settings = MediaUploadSettings(website_domain=os.getenv('WEBSITE_DOMAIN'))
+
+# Stacks are created on first use, so `-c stacks=DevWebsiteStack` only builds that stack and the stacks it depends on
+registry = StackRegistry()
+
+def create_vpc_stack(stacks: StackRegistry) -> VPCStack:
+    # The API function must be an image function exactly when its pipeline builds images, S3-staged packages are zips
+    api_package_type = "image" if repositories["dev-api-repo"].lambda_package == "image" else "zip"
+    vpcStack = VPCStack(app, "VPCCDKStack", api_package_type=api_package_type, media_upload_settings=media_upload_settings, env=env)
+    cdk.Tags.of(vpcStack).add("AppManagerCFNStackKey", "DevelopmentVPC")
+    return vpcStack
+
+def create_middle_tier_stack(stacks: StackRegistry) -> MiddleTierStack:
+    vpcStack: VPCStack = stacks.get("VPCCDKStack")
+    devMiddleTierStack = MiddleTierStack(app, "DevMiddleTierStack", private_lambda=vpcStack.private_lambda_instance, private_lambda_alias=vpcStack.private_lambda_alias,
+                                         media_upload_settings=media_upload_settings, env=env)
+    repositories["dev-api-repo"].build_dependencies.append(devMiddleTierStack.lambda_function)
+    repositories["dev-api-repo"].build_dependencies.append(devMiddleTierStack.api_gateway)
+    repositories["dev-api-repo"].build_dependencies.append(devMiddleTierStack.cognito_user_pool)
+    repositories["dev-api-repo"].build_dependencies.append(vpcStack.private_lambda_alias)
+    repositories["dev-api-repo"].build_dependencies.append(vpcStack.private_lambda_deployment_group)
+    cdk.Tags.of(devMiddleTierStack).add("AppManagerCFNStackKey", "DevelopmentMiddleTier")
+    return devMiddleTierStack
+
+def create_website_stack(stacks: StackRegistry) -> WebsiteStack:
+    devWebStack = WebsiteStack(app, "DevWebsiteStack", updateRefererSecret=False, cache_profile=CacheProfile.for_environment(os.getenv('ENVIRONMENT') or 'development'),
+                               # Listing pages are rendered client-side from the API
+                               spa_routes=["/properties/"], env=env)
+    repositories["dev-website-repo"].build_dependencies.append(devWebStack.website_bucket)
+    repositories["dev-website-repo"].build_dependencies.append(devWebStack.distribution)
+    cdk.Tags.of(devWebStack).add("AppManagerCFNStackKey", "DevelopmentWebApp")
+
+    # Serve the API through the website distribution under /api
+    devMiddleTierStack: MiddleTierStack = stacks.get("DevMiddleTierStack")
+    devWebStack.add_api(devMiddleTierStack.api_gateway, cached_routes=[
+        ApiCacheRoute(path_pattern="/api/properties*", default_ttl=60, max_ttl=300),
+    ])
+    return devWebStack
+
+def create_cicd_stack(stacks: StackRegistry) -> CICDStack:
+    # The pipelines deploy into the website and middle tier stacks
+    stacks.get("DevWebsiteStack")
+    stacks.get("DevMiddleTierStack")
+    cicdStack = CICDStack(app, "CiCdPipeline", repositories=repositories, env=env)
+    cdk.Tags.of(cicdStack).add("AppManagerCFNStackKey", "CiCdPipeline")
+    return cicdStack
+
+def create_monitoring_stack(stacks: StackRegistry) -> MonitoringStack:
+    monitoringStack = MonitoringStack(app, "DevMonitoringStack", repositories=repositories, vpc_stack=stacks.get("VPCCDKStack"), website_stack=stacks.get("DevWebsiteStack"),
+                                      middle_tier_stack=stacks.get("DevMiddleTierStack"), cicd_stack=stacks.get("CiCdPipeline"), env=env)
+    cdk.Tags.of(monitoringStack).add("AppManagerCFNStackKey", "DevelopmentMonitoring")
+    return monitoringStack
 
-devWebStack = WebsiteStack(app, "DevWebsiteStack", updateRefererSecret=False, env=env)
-dev_site_s3_bucket = devWebStack.website_bucket
-repositories["dev-website-repo"].build_dependencies.append(dev_site_s3_bucket)
-cdk.Tags.of(devWebStack).add("AppManagerCFNStackKey", "DevelopmentWebApp")
+registry.register("VPCCDKStack", create_vpc_stack, VPCStack)
+registry.register("DevMiddleTierStack", create_middle_tier_stack, MiddleTierStack, dependencies=["VPCCDKStack"])
+registry.register("DevWebsiteStack", create_website_stack, WebsiteStack, dependencies=["DevMiddleTierStack"])
+registry.register("CiCdPipeline", create_cicd_stack, CICDStack, dependencies=["DevWebsiteStack", "DevMiddleTierStack"])
+registry.register("DevMonitoringStack", create_monitoring_stack, MonitoringStack, dependencies=["VPCCDKStack", "DevWebsiteStack", "DevMiddleTierStack", "CiCdPipeline"])
 
-devMiddleTierStack = MiddleTierStack(app, "DevMiddleTierStack", private_lambda=private_lambda_instance, env=env)
-dev_lambda_function = devMiddleTierStack.lambda_function
-dev_api_gateway = devMiddleTierStack.api_gateway
-dev_cognito_user_pool = devMiddleTierStack.cognito_user_pool
-repositories["dev-api-repo"].build_dependencies.append(dev_lambda_function)
-repositories["dev-api-repo"].build_dependencies.append(dev_api_gateway)
-repositories["dev-api-repo"].build_dependencies.append(dev_cognito_user_pool)
-cdk.Tags.of(devMiddleTierStack).add("AppManagerCFNStackKey", "DevelopmentMiddleTier")
+selected_stacks = app.node.try_get_context("stacks")
+selection = [stack_id.strip() for stack_id in selected_stacks.split(",") if stack_id.strip()] if selected_stacks else None
 
-cicdStack = CICDStack(app, "CiCdPipeline", repositories=repositories, env=env)
-cdk.Tags.of(cicdStack).add("AppManagerCFNStackKey", "CiCdPipeline")
+# With `-c synth_cache=on` stacks whose inputs are unchanged are taken from the previous synth instead
+synth_cache = SynthCache.from_context(app, registry)
+registry.build(synth_cache.plan(app, selection))
 
 cdk.Tags.of(app).add("Project", "RentalPropertiesAgent")
 
-app.synth()
\ No newline at end of file
+synth_cache.complete(app.synth())
\ No newline at end of file
@@ -1,12 +1,14 @@
 from dotenv import load_dotenv
 import os
 
-def load_environmental_vars():
+def environment_file():
     # Determine the environment (e.g., 'development', 'production')
     env = os.getenv('ENVIRONMENT') or 'development'
+    return f"env.\\.env.{env}"
 
+def load_environmental_vars():
     # Load the corresponding .env file
-    env_file = f"env.\\.env.{env}"
+    env_file = environment_file()
     load_dotenv(dotenv_path=env_file)
 
-    print(f"Environment set to {env}, loaded configuration from {env_file}")
\ No newline at end of file
+    print(f"Environment set to {os.getenv('ENVIRONMENT') or 'development'}, loaded configuration from {env_file}")
\ No newline at end of file
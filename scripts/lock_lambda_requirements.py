@@ -0,0 +1,31 @@
+"""
+Resolves the requirements.txt of a Lambda asset directory for the runtime and architecture of the function and
+pins every wheel with its hash in requirements.lock, which create_package_directory then installs offline from the
+local wheelhouse.
+
+Usage: python -m scripts.lock_lambda_requirements <source_dir> --runtime python3.9 [--architecture x86_64]
+
+Rerun it after changing requirements.txt, the runtime or the architecture of the function.
+"""
+import argparse
+from aws_cdk import aws_lambda as lambda_
+from src.core.wheelhouse import WheelhouseTarget, lock_requirements
+
+ARCHITECTURES = {
+    "x86_64": lambda_.Architecture.X86_64,
+    "arm64": lambda_.Architecture.ARM_64,
+}
+
+def main():
+    parser = argparse.ArgumentParser(description="Pin the requirements of a Lambda function for its platform")
+    parser.add_argument("source_dir", help="The Lambda asset directory containing requirements.txt")
+    parser.add_argument("--runtime", required=True, help="The Lambda runtime, e.g. python3.9")
+    parser.add_argument("--architecture", choices=ARCHITECTURES, default="x86_64", help="The Lambda architecture")
+    args = parser.parse_args()
+
+    target = WheelhouseTarget(lambda_.Runtime(args.runtime, lambda_.RuntimeFamily.PYTHON), ARCHITECTURES[args.architecture])
+    lock_path = lock_requirements(args.source_dir, target)
+    print(f"Wrote {lock_path} for {target.name}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,166 @@
+"""
+Targeted CloudFront invalidation and optional cache warming after a delta deploy.
+
+Reads the changed paths written by s3_delta_deploy.py and invalidates only the URLs that can be served stale:
+documents and other non-hashed objects. Content-hashed bundles under /_nuxt/ get new names on every change, so
+they never need invalidating. When the number of paths exceeds the limit they are collapsed into per-directory
+wildcards, and only as a last resort into /*.
+
+With --wait the script only returns once the invalidation has completed, so the objects the old documents
+reference can be pruned afterwards. Warming requests the given routes through the distribution once the invalidation has completed, so the edge
+location closest to the build and the regional edge cache (or Origin Shield) hold the new documents before the
+first visitor arrives.
+"""
+import argparse
+import json
+import logging
+import sys
+import time
+import urllib.request
+import xml.etree.ElementTree as ElementTree
+import boto3
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
+
+logging.basicConfig(level=logging.INFO, format="%(message)s")
+logger = logging.getLogger(__name__)
+
+IMMUTABLE_PREFIXES = ("_nuxt/",)
+MUTABLE_PREFIXES = ("_nuxt/builds/",)
+SITEMAP_NAMESPACE = {"sm": "http://www.sitemaps.org/schemas/sitemap/0.9"}
+
+# Each Accept-Encoding variant is a separate cache entry
+WARM_ENCODINGS = ["br, gzip", "gzip", "identity"]
+
+def needs_invalidation(key):
+    if key.startswith(MUTABLE_PREFIXES):
+        return True
+    return not key.startswith(IMMUTABLE_PREFIXES)
+
+def paths_for_key(key):
+    """
+    Returns the viewer paths under which an object can be cached.
+
+    The viewer-request function rewrites routes such as `/dir/` to `/dir/index.html` before the cache lookup,
+    so the object key is also the cache key.
+
+    Args:
+        key (str): The S3 object key.
+
+    Returns:
+        list: The viewer paths, each starting with a slash.
+    """
+    return [f"/{key}"]
+
+def collapse_paths(paths, max_paths):
+    """
+    Reduces the invalidation paths to at most max_paths entries.
+
+    Args:
+        paths (list): The viewer paths to invalidate.
+        max_paths (int): The maximum number of paths in the invalidation.
+
+    Returns:
+        list: The sorted invalidation paths.
+    """
+    paths = sorted(set(paths))
+    if len(paths) <= max_paths:
+        return paths
+
+    collapsed = set()
+    for path in paths:
+        parts = path.strip("/").split("/")
+        collapsed.add(f"/{parts[0]}/*" if len(parts) > 1 else path)
+    if len(collapsed) <= max_paths:
+        return sorted(collapsed)
+    return ["/*"]
+
+def invalidate(cloudfront, distribution_id, paths, wait):
+    response = cloudfront.create_invalidation(
+        DistributionId=distribution_id,
+        InvalidationBatch={
+            "Paths": {"Quantity": len(paths), "Items": paths},
+            "CallerReference": str(time.time()),
+        }
+    )
+    invalidation_id = response["Invalidation"]["Id"]
+    logger.info(f"Created invalidation {invalidation_id} for {len(paths)} paths")
+    if wait:
+        cloudfront.get_waiter("invalidation_completed").wait(
+            DistributionId=distribution_id,
+            Id=invalidation_id,
+            WaiterConfig={"Delay": 10, "MaxAttempts": 60}
+        )
+        logger.info(f"Invalidation {invalidation_id} completed")
+    return invalidation_id
+
+def routes_from_sitemap(path):
+    """
+    Reads the route paths from a sitemap.xml in the build output.
+
+    Args:
+        path (str): The path of the sitemap file.
+
+    Returns:
+        list: The paths of every <loc> entry, or an empty list if the sitemap does not exist.
+    """
+    try:
+        tree = ElementTree.parse(path)
+    except FileNotFoundError:
+        logger.info(f"No sitemap at {path}, skipping")
+        return []
+    return [urlparse(loc.text.strip()).path or "/" for loc in tree.getroot().iterfind(".//sm:loc", SITEMAP_NAMESPACE)]
+
+def warm(domain, route, encoding):
+    request = urllib.request.Request(f"https://{domain}{route}", headers={"Accept-Encoding": encoding, "User-Agent": "rpa-cache-warmer"})
+    try:
+        with urllib.request.urlopen(request, timeout=15) as response:
+            response.read()
+            return route, encoding, response.status, response.headers.get("X-Cache")
+    except OSError as e:
+        # Warming is best effort, URLError, timeouts and reset connections must not fail the deploy
+        return route, encoding, getattr(e, "code", None), str(e)
+
+def warm_routes(domain, routes, workers):
+    requests_to_make = [(route, encoding) for route in routes for encoding in WARM_ENCODINGS]
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for route, encoding, status, cache in executor.map(lambda r: warm(domain, *r), requests_to_make):
+            logger.info(f"Warmed {route} [{encoding}] -> {status} {cache}")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--distribution-id", required=True)
+    parser.add_argument("--changed-paths-file", required=True, help="JSON file written by s3_delta_deploy.py")
+    parser.add_argument("--max-paths", type=int, default=50, help="Collapse into wildcards above this many paths")
+    parser.add_argument("--domain", default=None, help="Distribution domain name to warm through")
+    parser.add_argument("--routes", default="", help="Comma separated routes to warm, e.g. /,/properties/")
+    parser.add_argument("--sitemap", default=None, help="Also warm every route in this sitemap.xml")
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--wait", action="store_true", help="Wait for the invalidation to complete, e.g. before pruning the old objects")
+    args = parser.parse_args(argv)
+
+    with open(args.changed_paths_file) as f:
+        changed = json.load(f)
+
+    # Stale keys are only pruned after the invalidation, but their cached copies must go as well
+    keys = [k for k in changed.get("uploaded", []) + changed.get("pruned", []) + changed.get("stale", []) if needs_invalidation(k)]
+    paths = collapse_paths([p for k in keys for p in paths_for_key(k)], args.max_paths)
+
+    routes = [r for r in args.routes.split(",") if r]
+    if args.sitemap:
+        routes.extend(routes_from_sitemap(args.sitemap))
+    routes = list(dict.fromkeys(routes))
+    should_warm = bool(args.domain and routes)
+
+    if paths:
+        invalidate(boto3.client("cloudfront"), args.distribution_id, paths, wait=args.wait or should_warm)
+    else:
+        logger.info("No mutable objects changed, skipping invalidation")
+
+    if should_warm:
+        warm_routes(args.domain, routes, args.workers)
+
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
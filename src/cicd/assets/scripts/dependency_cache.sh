@@ -0,0 +1,42 @@
+#!/bin/bash
+# Restores or saves a dependency directory (e.g. node_modules) as a tarball keyed by the hash of its lockfile.
+#
+# Usage: dependency_cache.sh restore|save <lockfile> <directory> <s3 uri prefix> [key salt]
+#
+# restore exits non-zero on a cache miss, so callers can fall back to a clean install:
+#   dependency_cache.sh restore package-lock.json node_modules s3://bucket/prefix node18 || npm ci
+set -uo pipefail
+
+action=$1
+lockfile=$2
+directory=$3
+prefix=$4
+salt=${5:-}
+
+lock_hash=$( (cat "$lockfile"; echo "$salt") | sha256sum | cut -c1-32)
+key="${prefix%/}/$(basename "$directory")-${lock_hash}.tar.gz"
+archive=$(mktemp /tmp/dependency-cache.XXXXXX.tar.gz)
+trap 'rm -f "$archive"' EXIT
+
+case $action in
+    restore)
+        if aws s3 cp --quiet "$key" "$archive" && tar -xzf "$archive"; then
+            echo "Restored $directory from $key"
+        else
+            echo "No cached $directory for $lockfile ($key)"
+            rm -rf "$directory"
+            exit 1
+        fi
+        ;;
+    save)
+        if aws s3 ls "$key" > /dev/null 2>&1; then
+            echo "$key already cached"
+        else
+            tar -czf "$archive" "$directory" && aws s3 cp --quiet "$archive" "$key" && echo "Cached $directory as $key"
+        fi
+        ;;
+    *)
+        echo "Unknown action $action, expected restore or save" >&2
+        exit 2
+        ;;
+esac
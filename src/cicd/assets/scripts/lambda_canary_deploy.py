@@ -0,0 +1,157 @@
+"""
+Canary deploy of new Lambda code through a CodeDeploy deployment group.
+
+Updates the function code from a zip file, an S3-staged package or a container image, publishes it as a new
+version and asks CodeDeploy to shift the alias from its current version to the new one. The deployment group
+decides how fast the traffic moves and rolls the alias back when one of its alarms fires, in which case this script
+fails the build.
+"""
+import argparse
+import hashlib
+import json
+import logging
+import math
+import sys
+import time
+import boto3
+
+logging.basicConfig(level=logging.INFO, format="%(message)s")
+logger = logging.getLogger(__name__)
+
+FINAL_STATUSES = ("Succeeded", "Failed", "Stopped")
+
+def publish_version(lambda_client, function_name, code):
+    """
+    Updates the function code and publishes it as a new version.
+
+    Args:
+        lambda_client: The boto3 Lambda client.
+        function_name (str): The name of the function.
+        code (dict): The code arguments of UpdateFunctionCode, e.g. {"ZipFile": b"..."}.
+
+    Returns:
+        str: The published version.
+    """
+    # A previous update may still be in progress
+    lambda_client.get_waiter("function_updated_v2").wait(FunctionName=function_name)
+    version = lambda_client.update_function_code(FunctionName=function_name, Publish=True, **code)["Version"]
+    lambda_client.get_waiter("published_version_active").wait(FunctionName=function_name, Qualifier=version)
+    logger.info(f"Published {function_name} version {version}")
+    return version
+
+def package_code(args):
+    """
+    Returns the code arguments of UpdateFunctionCode for the package given on the command line.
+    """
+    if args.image_uri:
+        return {"ImageUri": args.image_uri}
+    if args.s3_key:
+        return {"S3Bucket": args.s3_bucket, "S3Key": args.s3_key}
+    with open(args.zip_file, "rb") as f:
+        return {"ZipFile": f.read()}
+
+def create_appspec(function_name, alias, current_version, target_version):
+    return json.dumps({
+        "version": 0.0,
+        "Resources": [{
+            function_name: {
+                "Type": "AWS::Lambda::Function",
+                "Properties": {
+                    "Name": function_name,
+                    "Alias": alias,
+                    "CurrentVersion": current_version,
+                    "TargetVersion": target_version,
+                }
+            }
+        }]
+    })
+
+def traffic_shift_seconds(codedeploy, application, deployment_group):
+    """
+    Returns how long the deployment config of the deployment group takes to shift all traffic, ignoring hooks.
+
+    Returns:
+        tuple: (deployment config name, seconds).
+    """
+    config_name = codedeploy.get_deployment_group(applicationName=application, deploymentGroupName=deployment_group)["deploymentGroupInfo"]["deploymentConfigName"]
+    routing = codedeploy.get_deployment_config(deploymentConfigName=config_name)["deploymentConfigInfo"].get("trafficRoutingConfig", {})
+    if routing.get("type") == "TimeBasedCanary":
+        minutes = routing["timeBasedCanary"]["canaryInterval"]
+    elif routing.get("type") == "TimeBasedLinear":
+        linear = routing["timeBasedLinear"]
+        minutes = linear["linearInterval"] * (math.ceil(100 / linear["linearPercentage"]) - 1)
+    else:
+        minutes = 0
+    return config_name, minutes * 60
+
+def shift_alias(codedeploy, application, deployment_group, appspec, timeout):
+    """
+    Starts the CodeDeploy deployment shifting the alias and waits for it to finish.
+
+    Returns:
+        bool: Whether the deployment succeeded.
+    """
+    deployment_id = codedeploy.create_deployment(
+        applicationName=application,
+        deploymentGroupName=deployment_group,
+        revision={
+            "revisionType": "AppSpecContent",
+            "appSpecContent": {"content": appspec, "sha256": hashlib.sha256(appspec.encode()).hexdigest()},
+        },
+    )["deploymentId"]
+    logger.info(f"Started deployment {deployment_id}")
+
+    deadline = time.time() + timeout
+    status = None
+    while time.time() < deadline:
+        deployment = codedeploy.get_deployment(deploymentId=deployment_id)["deploymentInfo"]
+        if deployment["status"] != status:
+            status = deployment["status"]
+            logger.info(f"Deployment {deployment_id} is {status}")
+        if status in FINAL_STATUSES:
+            if status != "Succeeded":
+                logger.error(f"Deployment {deployment_id} did not succeed: {deployment.get('errorInformation')}")
+            return status == "Succeeded"
+        time.sleep(15)
+
+    logger.error(f"Deployment {deployment_id} did not finish within {timeout} seconds")
+    return False
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--function-name", required=True)
+    parser.add_argument("--alias", required=True)
+    parser.add_argument("--application", required=True, help="CodeDeploy application")
+    parser.add_argument("--deployment-group", required=True, help="CodeDeploy deployment group of the alias")
+    package = parser.add_mutually_exclusive_group(required=True)
+    package.add_argument("--zip-file", help="Deployment package to upload and publish")
+    package.add_argument("--s3-key", help="Key of a deployment package staged in --s3-bucket")
+    package.add_argument("--image-uri", help="Container image to publish")
+    parser.add_argument("--s3-bucket", help="Bucket of the staged deployment package")
+    parser.add_argument("--timeout", type=int, default=1800, help="Seconds to wait for the traffic shift, must fit in the timeout of the build")
+    args = parser.parse_args(argv)
+    if args.s3_key and not args.s3_bucket:
+        parser.error("--s3-key requires --s3-bucket")
+
+    # Fail before publishing when the build would time out while CodeDeploy is still shifting traffic
+    codedeploy = boto3.client("codedeploy")
+    config_name, shift_seconds = traffic_shift_seconds(codedeploy, args.application, args.deployment_group)
+    if shift_seconds >= args.timeout:
+        logger.error(f"{config_name} shifts traffic over {shift_seconds} seconds, longer than the {args.timeout} seconds this build can wait. "
+                     "Run the deploy on EC2 compute with a longer timeout or use a faster deployment config.")
+        return 1
+
+    lambda_client = boto3.client("lambda")
+    target_version = publish_version(lambda_client, args.function_name, package_code(args))
+
+    current_version = lambda_client.get_alias(FunctionName=args.function_name, Name=args.alias)["FunctionVersion"]
+    if current_version == target_version:
+        logger.info(f"{args.alias} already serves version {target_version}, nothing to shift")
+        return 0
+
+    appspec = create_appspec(args.function_name, args.alias, current_version, target_version)
+    succeeded = shift_alias(codedeploy, args.application, args.deployment_group, appspec, args.timeout)
+    return 0 if succeeded else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,235 @@
+"""
+Load test with latency and throughput budgets.
+
+Runs a k6 script or a locustfile against a base URL, reduces the results to the p50/p95/p99 latency, throughput
+and error rate of all requests, writes them as a JUnit report with one test case per measurement and optionally
+publishes them as CloudWatch metrics. Exits with 1 when a measurement is outside its budget.
+
+With --stand-in the scenario runs against a local HTTP server answering every request with an empty JSON object
+after --stand-in-latency-ms, so scenarios can be developed without a deployed API:
+
+    python3 load_testing.py --tool k6 --scenario loadtests/smoke.js --stand-in --duration 10
+"""
+import argparse
+import csv
+import json
+import logging
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import xml.etree.ElementTree as ElementTree
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+logging.basicConfig(level=logging.INFO, format="%(message)s")
+logger = logging.getLogger(__name__)
+
+# Measurement name, unit of its CloudWatch metric and the budget option bounding it from above or below
+MEASUREMENTS = [
+    ("LatencyP50", "Milliseconds", "p50_budget_ms", "max"),
+    ("LatencyP95", "Milliseconds", "p95_budget_ms", "max"),
+    ("LatencyP99", "Milliseconds", "p99_budget_ms", "max"),
+    ("Throughput", "Count/Second", "min_throughput_rps", "min"),
+    ("ErrorRate", "Percent", "max_error_rate_percent", "max"),
+]
+
+# Exit codes meaning the run completed but the tool judged the results: k6 crossed a script threshold, locust saw
+# failed requests. The budgets decide instead, anything else is a failure to run
+K6_THRESHOLD_EXIT_CODE = 99
+LOCUST_FAILURES_EXIT_CODE = 1
+
+def run_tool(command, completed_exit_codes):
+    """
+    Runs a load testing tool and raises CalledProcessError unless it exits with one of completed_exit_codes.
+    """
+    result = subprocess.run(command)
+    if result.returncode not in completed_exit_codes:
+        raise subprocess.CalledProcessError(result.returncode, command)
+    if result.returncode != 0:
+        logger.info(f"{command[0]} exited with {result.returncode}, checking the results against the budgets")
+
+def run_k6(scenario, base_url, users, duration, output_dir):
+    """
+    Runs a k6 script and returns its measurements.
+
+    Args:
+        scenario (str): Path of the k6 script, which reads the target from __ENV.BASE_URL.
+        base_url (str): The URL under test.
+        users (int): Virtual users.
+        duration (int): Seconds to run for.
+        output_dir (str): Directory for the summary export.
+
+    Returns:
+        dict: The measurements keyed by name, see MEASUREMENTS.
+    """
+    summary_file = os.path.join(output_dir, "k6-summary.json")
+    run_tool([
+        "k6", "run", "--quiet",
+        "--vus", str(users), "--duration", f"{duration}s",
+        "--env", f"BASE_URL={base_url}",
+        "--summary-trend-stats", "med,p(95),p(99)",
+        "--summary-export", summary_file,
+        scenario
+    ], [0, K6_THRESHOLD_EXIT_CODE])
+    with open(summary_file) as f:
+        metrics = json.load(f)["metrics"]
+    durations = metrics["http_req_duration"]
+    return {
+        "LatencyP50": durations["med"],
+        "LatencyP95": durations["p(95)"],
+        "LatencyP99": durations["p(99)"],
+        "Throughput": metrics["http_reqs"]["rate"],
+        "ErrorRate": 100 * metrics.get("http_req_failed", {}).get("value", 0),
+    }
+
+def run_locust(scenario, base_url, users, duration, output_dir):
+    """
+    Runs a locustfile headless and returns its measurements.
+
+    Args:
+        scenario (str): Path of the locustfile.
+        base_url (str): The URL under test, passed as the host.
+        users (int): Simulated users, all spawned in the first second.
+        duration (int): Seconds to run for.
+        output_dir (str): Directory for the CSV statistics.
+
+    Returns:
+        dict: The measurements keyed by name, see MEASUREMENTS.
+    """
+    csv_prefix = os.path.join(output_dir, "locust")
+    run_tool([
+        "locust", "--headless", "--only-summary",
+        "-f", scenario, "--host", base_url,
+        "-u", str(users), "-r", str(users), "-t", f"{duration}s",
+        "--csv", csv_prefix
+    ], [0, LOCUST_FAILURES_EXIT_CODE])
+    with open(f"{csv_prefix}_stats.csv", newline="") as f:
+        aggregated = next(row for row in csv.DictReader(f) if row["Name"] == "Aggregated")
+    requests = int(aggregated["Request Count"])
+    return {
+        "LatencyP50": float(aggregated["50%"]),
+        "LatencyP95": float(aggregated["95%"]),
+        "LatencyP99": float(aggregated["99%"]),
+        "Throughput": float(aggregated["Requests/s"]),
+        "ErrorRate": 100 * int(aggregated["Failure Count"]) / max(requests, 1),
+    }
+
+def check_budgets(measurements, budgets):
+    """
+    Compares the measurements against their budgets.
+
+    Args:
+        measurements (dict): The measurements keyed by name.
+        budgets (dict): The budgets keyed by option name, None for measurements without a budget.
+
+    Returns:
+        list: (name, value, budget, passed) for every measurement.
+    """
+    results = []
+    for name, _, budget_option, bound in MEASUREMENTS:
+        value, budget = measurements[name], budgets.get(budget_option)
+        if budget is None:
+            passed = True
+        else:
+            passed = value <= budget if bound == "max" else value >= budget
+        results.append((name, value, budget, passed))
+    return results
+
+def write_junit_report(results, report_file, suite_name):
+    suite = ElementTree.Element("testsuite", name=suite_name, tests=str(len(results)),
+                                failures=str(sum(1 for result in results if not result[3])))
+    for name, value, budget, passed in results:
+        case = ElementTree.SubElement(suite, "testcase", classname=suite_name, name=name)
+        ElementTree.SubElement(case, "system-out").text = f"{name}: {value:.2f}" + (f" (budget {budget})" if budget is not None else "")
+        if not passed:
+            ElementTree.SubElement(case, "failure", message=f"{name} {value:.2f} outside the budget of {budget}")
+    os.makedirs(os.path.dirname(report_file) or ".", exist_ok=True)
+    ElementTree.ElementTree(suite).write(report_file, encoding="utf-8", xml_declaration=True)
+
+def publish_metrics(measurements, namespace, dimensions):
+    import boto3
+    boto3.client("cloudwatch").put_metric_data(Namespace=namespace, MetricData=[
+        {
+            "MetricName": name,
+            "Dimensions": [{"Name": key, "Value": value} for key, value in dimensions.items()],
+            "Value": measurements[name],
+            "Unit": unit,
+        }
+        for name, unit, _, _ in MEASUREMENTS
+    ])
+    logger.info(f"Published {len(MEASUREMENTS)} metrics to {namespace}")
+
+def start_stand_in_server(latency_ms):
+    """
+    Starts a local HTTP server answering every request with {} after latency_ms.
+
+    Returns:
+        ThreadingHTTPServer: The running server, listening on a free port of 127.0.0.1.
+    """
+    class StandInHandler(BaseHTTPRequestHandler):
+        def handle_request(self):
+            length = int(self.headers.get("Content-Length") or 0)
+            if length:
+                self.rfile.read(length)
+            time.sleep(latency_ms / 1000)
+            body = b"{}"
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        do_GET = do_POST = do_PUT = do_PATCH = do_DELETE = handle_request
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StandInHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tool", choices=["k6", "locust"], default="k6")
+    parser.add_argument("--scenario", required=True, help="k6 script or locustfile")
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument("--base-url", help="URL of the API under test")
+    target.add_argument("--stand-in", action="store_true", help="Run against a local stand-in HTTP server")
+    parser.add_argument("--stand-in-latency-ms", type=float, default=20, help="Response time of the stand-in server")
+    parser.add_argument("--users", type=int, default=10)
+    parser.add_argument("--duration", type=int, default=60, help="Seconds to run for")
+    parser.add_argument("--p50-budget-ms", type=float)
+    parser.add_argument("--p95-budget-ms", type=float)
+    parser.add_argument("--p99-budget-ms", type=float)
+    parser.add_argument("--min-throughput-rps", type=float)
+    parser.add_argument("--max-error-rate-percent", type=float)
+    parser.add_argument("--report-file", default="reports/load-test.xml", help="JUnit report to write")
+    parser.add_argument("--metric-namespace", help="CloudWatch namespace to publish the measurements to")
+    parser.add_argument("--metric-dimension", action="append", default=[], metavar="NAME=VALUE",
+                        help="Dimension of the published metrics, may be repeated")
+    args = parser.parse_args(argv)
+
+    base_url = args.base_url
+    if args.stand_in:
+        server = start_stand_in_server(args.stand_in_latency_ms)
+        base_url = f"http://127.0.0.1:{server.server_address[1]}"
+        logger.info(f"Stand-in server listening on {base_url}")
+
+    run = run_k6 if args.tool == "k6" else run_locust
+    with tempfile.TemporaryDirectory() as output_dir:
+        measurements = run(args.scenario, base_url.rstrip("/"), args.users, args.duration, output_dir)
+
+    results = check_budgets(measurements, vars(args))
+    for name, value, budget, passed in results:
+        logger.info(f"{name}: {value:.2f}" + (f" (budget {budget}, {'ok' if passed else 'EXCEEDED'})" if budget is not None else ""))
+    write_junit_report(results, args.report_file, "LoadTest")
+    if args.metric_namespace:
+        publish_metrics(measurements, args.metric_namespace, dict(dimension.split("=", 1) for dimension in args.metric_dimension))
+
+    return 0 if all(result[3] for result in results) else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,209 @@
+"""
+Page weight report of a static site build with budgets and regression checks.
+
+Weighs every route by its HTML document and the scripts, stylesheets, preloads and images it references, and the
+whole output by category. Files with a precompressed Brotli variant (see precompress.mjs) count with the size of
+the variant, as that is what browsers download.
+
+The report is written as JSON, for the next build to compare against, and as a JUnit report with one test case
+per measurement. Exits with 1 when a route exceeds a budget or a measurement grew by more than
+--max-regression-percent over --previous-report.
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+import xml.etree.ElementTree as ElementTree
+from html.parser import HTMLParser
+from urllib.parse import urlparse
+
+logging.basicConfig(level=logging.INFO, format="%(message)s")
+logger = logging.getLogger(__name__)
+
+CATEGORIES = {
+    "js": (".js", ".mjs"),
+    "css": (".css",),
+    "image": (".png", ".jpg", ".jpeg", ".gif", ".webp", ".avif", ".svg", ".ico"),
+    "html": (".html",),
+}
+COMPRESSED_VARIANTS = (".br", ".gz")
+
+# Growth below this many bytes is never a regression, so small pages do not fail on a few added bytes
+MIN_REGRESSION_BYTES = 1024
+
+class ReferenceParser(HTMLParser):
+    """
+    Collects the URLs of the subresources a document loads on first paint.
+    """
+    def __init__(self):
+        super().__init__()
+        self.urls = []
+
+    def handle_starttag(self, tag, attrs):
+        attrs = dict(attrs)
+        if tag == "script" and attrs.get("src"):
+            self.urls.append(attrs["src"])
+        elif tag == "link" and attrs.get("href") and attrs.get("rel") in ("stylesheet", "modulepreload", "preload", "icon"):
+            self.urls.append(attrs["href"])
+        elif tag == "img" and attrs.get("src"):
+            self.urls.append(attrs["src"])
+
+def category_of(path):
+    for category, extensions in CATEGORIES.items():
+        if path.lower().endswith(extensions):
+            return category
+    return "other"
+
+def transfer_size(path):
+    """
+    Returns the bytes transferred for a file, the size of its Brotli variant when there is one.
+    """
+    compressed = f"{path}.br"
+    return os.path.getsize(compressed if os.path.exists(compressed) else path)
+
+def route_document(directory, route):
+    """
+    Returns the HTML document serving a route, or None when the build has none.
+    """
+    route = route.strip("/")
+    candidates = [os.path.join(directory, route, "index.html"), os.path.join(directory, f"{route}.html")] if route else [os.path.join(directory, "index.html")]
+    return next((candidate for candidate in candidates if os.path.isfile(candidate)), None)
+
+def weigh_route(directory, route):
+    """
+    Weighs a route by its document and the local subresources it references.
+
+    Returns:
+        dict: Bytes per category and in total, or None when the route has no document.
+    """
+    document = route_document(directory, route)
+    if document is None:
+        return None
+    parser = ReferenceParser()
+    with open(document, encoding="utf-8", errors="replace") as f:
+        parser.feed(f.read())
+
+    files = {document}
+    for url in parser.urls:
+        parsed = urlparse(url)
+        if parsed.scheme or parsed.netloc:
+            continue  # served by another origin
+        if parsed.path.startswith("/"):
+            path = os.path.join(directory, parsed.path.lstrip("/"))
+        else:
+            path = os.path.join(os.path.dirname(document), parsed.path)
+        if os.path.isfile(path):
+            files.add(os.path.normpath(path))
+
+    weight = {category: 0 for category in [*CATEGORIES, "other"]}
+    for path in files:
+        weight[category_of(path)] += transfer_size(path)
+    weight["total"] = sum(weight.values())
+    return weight
+
+def weigh_output(directory):
+    """
+    Returns the bytes per category of every file in the output, compressed variants counting in place of their file.
+    """
+    weight = {category: 0 for category in [*CATEGORIES, "other"]}
+    for root, _, names in os.walk(directory):
+        for name in names:
+            if not name.endswith(COMPRESSED_VARIANTS):
+                path = os.path.join(root, name)
+                weight[category_of(path)] += transfer_size(path)
+    weight["total"] = sum(weight.values())
+    return weight
+
+def check_report(report, previous, budgets, max_regression_percent):
+    """
+    Compares the report against the budgets and the previous report.
+
+    Args:
+        report (dict): The report, see create_report.
+        previous (dict): The report of the previous build, or None.
+        budgets (dict): Byte budgets per category applying to every route.
+        max_regression_percent (float): Allowed growth over the previous report, None to skip the comparison.
+
+    Returns:
+        list: (name, bytes, failure message or None) for every measurement.
+    """
+    results = []
+    measurements = [(f"route {route} {category}", f"routes.{route}.{category}", size)
+                    for route, weight in report["routes"].items() if weight is not None
+                    for category, size in weight.items()]
+    measurements += [(f"output {category}", f"output.{category}", size) for category, size in report["output"].items()]
+    previous_sizes = flatten(previous) if previous else {}
+
+    for route, weight in report["routes"].items():
+        if weight is None:
+            results.append((f"route {route}", 0, f"No document for {route} in the build output"))
+    for name, key, size in measurements:
+        failure = None
+        category = key.rsplit(".", 1)[1]
+        if key.startswith("routes.") and budgets.get(category) is not None and size > budgets[category]:
+            failure = f"{size / 1000:.1f} kB exceeds the budget of {budgets[category] / 1000:.1f} kB"
+        previous_size = previous_sizes.get(key)
+        if failure is None and max_regression_percent is not None and previous_size is not None:
+            if size - previous_size > max(previous_size * max_regression_percent / 100, MIN_REGRESSION_BYTES):
+                failure = f"{size / 1000:.1f} kB grew by more than {max_regression_percent}% over {previous_size / 1000:.1f} kB of the previous build"
+        results.append((name, size, failure))
+    return results
+
+def flatten(report):
+    sizes = {f"output.{category}": size for category, size in report.get("output", {}).items()}
+    for route, weight in report.get("routes", {}).items():
+        for category, size in (weight or {}).items():
+            sizes[f"routes.{route}.{category}"] = size
+    return sizes
+
+def write_junit_report(results, junit_file):
+    suite = ElementTree.Element("testsuite", name="PageWeight", tests=str(len(results)),
+                                failures=str(sum(1 for result in results if result[2])))
+    for name, size, failure in results:
+        case = ElementTree.SubElement(suite, "testcase", classname="PageWeight", name=name)
+        ElementTree.SubElement(case, "system-out").text = f"{size / 1000:.1f} kB"
+        if failure:
+            ElementTree.SubElement(case, "failure", message=failure)
+    os.makedirs(os.path.dirname(junit_file) or ".", exist_ok=True)
+    ElementTree.ElementTree(suite).write(junit_file, encoding="utf-8", xml_declaration=True)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--directory", required=True, help="Build output served by the site")
+    parser.add_argument("--routes", default="/", help="Comma separated routes to weigh")
+    parser.add_argument("--previous-report", help="JSON report of the previous build, ignored when missing")
+    parser.add_argument("--report-file", required=True, help="JSON report to write")
+    parser.add_argument("--junit-file", required=True, help="JUnit report to write")
+    parser.add_argument("--max-total-kb", type=float)
+    parser.add_argument("--max-js-kb", type=float)
+    parser.add_argument("--max-css-kb", type=float)
+    parser.add_argument("--max-image-kb", type=float)
+    parser.add_argument("--max-regression-percent", type=float)
+    args = parser.parse_args(argv)
+
+    report = {
+        "routes": {route: weigh_route(args.directory, route) for route in args.routes.split(",") if route},
+        "output": weigh_output(args.directory),
+    }
+    previous = None
+    if args.previous_report and os.path.exists(args.previous_report):
+        with open(args.previous_report) as f:
+            previous = json.load(f)
+    else:
+        logger.info("No previous report, only checking the budgets")
+
+    budgets = {category: kb * 1000 for category, kb in
+               [("total", args.max_total_kb), ("js", args.max_js_kb), ("css", args.max_css_kb), ("image", args.max_image_kb)] if kb is not None}
+    results = check_report(report, previous, budgets, args.max_regression_percent)
+    for name, size, failure in results:
+        logger.info(f"{name}: {size / 1000:.1f} kB" + (f" FAILED: {failure}" if failure else ""))
+
+    os.makedirs(os.path.dirname(args.report_file) or ".", exist_ok=True)
+    with open(args.report_file, "w") as f:
+        json.dump(report, f, indent=2)
+    write_junit_report(results, args.junit_file)
+    return 1 if any(result[2] for result in results) else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,75 @@
+/**
+ * Writes Brotli (.br) and gzip (.gz) variants next to every compressible file of a build directory.
+ *
+ * Usage: node precompress.mjs <directory> <comma separated extensions>
+ *
+ * Every file with a listed extension gets both variants, regardless of size, because the viewer-request
+ * CloudFront Function rewrites to the variant purely by extension and cannot check whether it exists.
+ */
+import { promises as fs } from "node:fs";
+import path from "node:path";
+import { promisify } from "node:util";
+import zlib from "node:zlib";
+
+const brotli = promisify(zlib.brotliCompress);
+const gzip = promisify(zlib.gzip);
+
+async function* walk(directory) {
+    for (const entry of await fs.readdir(directory, { withFileTypes: true })) {
+        const entryPath = path.join(directory, entry.name);
+        if (entry.isDirectory()) {
+            yield* walk(entryPath);
+        } else {
+            yield entryPath;
+        }
+    }
+}
+
+async function compress(file) {
+    const content = await fs.readFile(file);
+    const [br, gz] = await Promise.all([
+        brotli(content, {
+            params: {
+                [zlib.constants.BROTLI_PARAM_QUALITY]: zlib.constants.BROTLI_MAX_QUALITY,
+                [zlib.constants.BROTLI_PARAM_MODE]: zlib.constants.BROTLI_MODE_TEXT,
+                [zlib.constants.BROTLI_PARAM_SIZE_HINT]: content.length,
+            },
+        }),
+        gzip(content, { level: zlib.constants.Z_BEST_COMPRESSION }),
+    ]);
+    await Promise.all([fs.writeFile(`${file}.br`, br), fs.writeFile(`${file}.gz`, gz)]);
+    return { file, original: content.length, br: br.length, gz: gz.length };
+}
+
+async function main() {
+    const [directory, extensionList] = process.argv.slice(2);
+    if (!directory || !extensionList) {
+        console.error("Usage: node precompress.mjs <directory> <comma separated extensions>");
+        process.exit(1);
+    }
+    const extensions = new Set(extensionList.split(",").map((e) => (e.startsWith(".") ? e : `.${e}`)));
+
+    const files = [];
+    for await (const file of walk(directory)) {
+        if (extensions.has(path.extname(file).toLowerCase())) {
+            files.push(file);
+        }
+    }
+
+    // zlib runs on the libuv thread pool, so compressing in batches keeps every thread busy
+    const batchSize = 16;
+    const totals = { original: 0, br: 0, gz: 0 };
+    for (let i = 0; i < files.length; i += batchSize) {
+        for (const result of await Promise.all(files.slice(i, i + batchSize).map(compress))) {
+            totals.original += result.original;
+            totals.br += result.br;
+            totals.gz += result.gz;
+        }
+    }
+    console.log(`Precompressed ${files.length} files: ${totals.original} bytes -> ${totals.br} br / ${totals.gz} gzip`);
+}
+
+main().catch((error) => {
+    console.error(error);
+    process.exit(1);
+});
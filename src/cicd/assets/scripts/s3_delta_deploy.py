@@ -0,0 +1,285 @@
+"""
+Delta deploy of a static build directory to an S3 bucket.
+
+Only objects whose MD5 or headers changed since the last deploy are uploaded. Cache-Control is set per path
+pattern, and assets are uploaded before HTML so new pages never reference missing bundles.
+
+Objects that are no longer part of the build are still referenced by the old documents cached at the edge, so
+they must only be pruned once those are invalidated. Deploy with --no-prune, which records the stale keys in the
+changed paths file, and run again with --prune-only after the invalidation has completed. Without --no-prune the
+stale objects are pruned right after the new HTML is uploaded, which is only safe without a CDN in front.
+
+Precompressed variants (`app.js.br`, `app.js.gz`) written next to their original by precompress.mjs are
+uploaded with the matching Content-Encoding and the Content-Type and Cache-Control of the original.
+
+The manifest of the last deploy (key -> md5 and headers) is stored outside of the website bucket, because the
+website bucket only serves objects to requests carrying the CloudFront referer.
+"""
+import argparse
+import fnmatch
+import hashlib
+import json
+import logging
+import mimetypes
+import os
+import sys
+import boto3
+from concurrent.futures import ThreadPoolExecutor
+from botocore.exceptions import ClientError
+
+logging.basicConfig(level=logging.INFO, format="%(message)s")
+logger = logging.getLogger(__name__)
+
+DEFAULT_CACHE_RULES = [
+    ["_nuxt/builds/*", "public, max-age=0, must-revalidate"],
+    ["_nuxt/*", "public, max-age=31536000, immutable"],
+    ["*.html", "public, max-age=0, must-revalidate"],
+    ["*.json", "public, max-age=0, must-revalidate"],
+    ["*", "public, max-age=3600"],
+]
+
+PRECOMPRESSED_ENCODINGS = {
+    ".br": "br",
+    ".gz": "gzip",
+}
+
+# Types mimetypes does not know about or guesses inconsistently across platforms
+CONTENT_TYPES = {
+    ".js": "application/javascript",
+    ".mjs": "application/javascript",
+    ".json": "application/json",
+    ".map": "application/json",
+    ".webmanifest": "application/manifest+json",
+    ".woff": "font/woff",
+    ".woff2": "font/woff2",
+    ".avif": "image/avif",
+    ".webp": "image/webp",
+    ".svg": "image/svg+xml",
+    ".txt": "text/plain; charset=utf-8",
+    ".html": "text/html; charset=utf-8",
+    ".css": "text/css; charset=utf-8",
+}
+
+def md5_of_file(path):
+    """
+    Computes the hex MD5 of a file, matching the ETag S3 returns for single part uploads.
+
+    Args:
+        path (str): The path of the file.
+
+    Returns:
+        str: The hex digest.
+    """
+    digest = hashlib.md5()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def cache_control_for(key, cache_rules):
+    """
+    Returns the Cache-Control header of the first rule whose pattern matches the key.
+
+    Args:
+        key (str): The S3 object key.
+        cache_rules (list): Ordered list of [pattern, cache_control] pairs.
+
+    Returns:
+        str or None: The Cache-Control value, or None if no rule matches.
+    """
+    for pattern, cache_control in cache_rules:
+        if fnmatch.fnmatch(key, pattern):
+            return cache_control
+    return None
+
+def content_type_for(key):
+    extension = os.path.splitext(key)[1].lower()
+    if extension in CONTENT_TYPES:
+        return CONTENT_TYPES[extension]
+    return mimetypes.guess_type(key)[0] or "application/octet-stream"
+
+def split_encoding(key, keys):
+    """
+    Splits a precompressed variant key into its original key and Content-Encoding.
+
+    Args:
+        key (str): The S3 object key.
+        keys (set): Every key of the build, used to check the original exists.
+
+    Returns:
+        tuple: (original_key, content_encoding), with content_encoding None if the key is not a variant.
+    """
+    base, extension = os.path.splitext(key)
+    if extension in PRECOMPRESSED_ENCODINGS and base in keys:
+        return base, PRECOMPRESSED_ENCODINGS[extension]
+    return key, None
+
+def scan_build(source_dir, cache_rules):
+    """
+    Builds the manifest of the local build directory.
+
+    Args:
+        source_dir (str): The build output directory.
+        cache_rules (list): Ordered list of [pattern, cache_control] pairs.
+
+    Returns:
+        dict: key -> {"path", "md5", "cache_control", "content_type", "content_encoding"}.
+    """
+    paths = {}
+    for root, _, files in os.walk(source_dir):
+        for filename in files:
+            path = os.path.join(root, filename)
+            paths[os.path.relpath(path, source_dir).replace(os.sep, "/")] = path
+
+    manifest = {}
+    for key, path in paths.items():
+        original_key, content_encoding = split_encoding(key, paths)
+        manifest[key] = {
+            "path": path,
+            "md5": md5_of_file(path),
+            "cache_control": cache_control_for(original_key, cache_rules),
+            "content_type": content_type_for(original_key),
+            "content_encoding": content_encoding,
+        }
+    return manifest
+
+def list_bucket_etags(s3, bucket):
+    etags = {}
+    paginator = s3.get_paginator("list_objects_v2")
+    for page in paginator.paginate(Bucket=bucket):
+        for obj in page.get("Contents", []):
+            etags[obj["Key"]] = obj["ETag"].strip('"')
+    return etags
+
+def load_previous_manifest(s3, bucket, key):
+    try:
+        response = s3.get_object(Bucket=bucket, Key=key)
+        return json.loads(response["Body"].read())
+    except ClientError as e:
+        if e.response["Error"]["Code"] in ("NoSuchKey", "404"):
+            logger.info("No previous deploy manifest found, uploading every object")
+            return {}
+        raise e
+
+def diff_manifest(local, previous, remote_etags):
+    """
+    Determines which keys need to be uploaded and which are stale.
+
+    A key is uploaded when it is new, its content differs from the object in the bucket, or its headers differ
+    from the last deploy (e.g. a cache rule changed).
+
+    Returns:
+        tuple: (changed_keys, stale_keys), both sorted.
+    """
+    changed = []
+    for key, entry in local.items():
+        last = previous.get(key)
+        if (
+            remote_etags.get(key) != entry["md5"]
+            or last is None
+            or last.get("md5") != entry["md5"]
+            or last.get("cache_control") != entry["cache_control"]
+            or last.get("content_type") != entry["content_type"]
+            or last.get("content_encoding") != entry["content_encoding"]
+        ):
+            changed.append(key)
+    stale = [key for key in remote_etags if key not in local]
+    return sorted(changed), sorted(stale)
+
+def upload(s3, bucket, key, entry):
+    extra_args = {"ContentType": entry["content_type"]}
+    if entry["cache_control"]:
+        extra_args["CacheControl"] = entry["cache_control"]
+    if entry["content_encoding"]:
+        extra_args["ContentEncoding"] = entry["content_encoding"]
+    with open(entry["path"], "rb") as body:
+        s3.put_object(Bucket=bucket, Key=key, Body=body, **extra_args)
+    return key
+
+def upload_all(s3, bucket, keys, local, workers):
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for key in executor.map(lambda k: upload(s3, bucket, k, local[k]), keys):
+            logger.info(f"Uploaded {key}")
+
+def prune(s3, bucket, keys):
+    # DeleteObjects accepts at most 1000 keys per request
+    for i in range(0, len(keys), 1000):
+        batch = keys[i:i + 1000]
+        response = s3.delete_objects(Bucket=bucket, Delete={"Objects": [{"Key": k} for k in batch], "Quiet": True})
+        if response.get("Errors"):
+            raise RuntimeError(f"Failed to delete stale objects: {response['Errors']}")
+        logger.info(f"Pruned {len(batch)} stale objects")
+
+def prune_recorded(s3, bucket, manifest_bucket, manifest_key, changed_paths_file):
+    """
+    Prunes the stale keys recorded by a --no-prune deploy.
+
+    Keys that are part of the manifest again, e.g. because a later deploy restored them, are kept.
+
+    Args:
+        s3: The S3 client.
+        bucket (str): The website bucket.
+        manifest_bucket (str): The bucket storing the deploy manifest.
+        manifest_key (str): The key of the deploy manifest.
+        changed_paths_file (str): The changed paths file written by the deploy.
+    """
+    with open(changed_paths_file) as f:
+        recorded = json.load(f).get("stale", [])
+    manifest = load_previous_manifest(s3, manifest_bucket, manifest_key)
+    stale = [key for key in recorded if key not in manifest]
+    logger.info(f"{len(stale)} of {len(recorded)} recorded stale objects to prune")
+    prune(s3, bucket, stale)
+
+def is_document(key):
+    return key.endswith(".html") or key.endswith(tuple(f".html{extension}" for extension in PRECOMPRESSED_ENCODINGS))
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--source", default=".", help="Build output directory to deploy")
+    parser.add_argument("--bucket", required=True, help="Website bucket")
+    parser.add_argument("--manifest-bucket", required=True, help="Bucket storing the deploy manifest")
+    parser.add_argument("--manifest-key", required=True, help="Key of the deploy manifest")
+    parser.add_argument("--cache-rules", default=None, help="JSON list of [pattern, cache_control] pairs, first match wins")
+    parser.add_argument("--changed-paths-file", default=None, help="Write the uploaded and pruned keys to this JSON file")
+    parser.add_argument("--workers", type=int, default=16)
+    parser.add_argument("--no-prune", action="store_true", help="Keep objects that are no longer part of the build")
+    parser.add_argument("--prune-only", action="store_true", help="Only prune the stale keys recorded in --changed-paths-file by a --no-prune deploy")
+    args = parser.parse_args(argv)
+
+    s3 = boto3.client("s3")
+    if args.prune_only:
+        if not args.changed_paths_file:
+            parser.error("--prune-only requires --changed-paths-file")
+        prune_recorded(s3, args.bucket, args.manifest_bucket, args.manifest_key, args.changed_paths_file)
+        return 0
+
+    cache_rules = json.loads(args.cache_rules) if args.cache_rules else DEFAULT_CACHE_RULES
+
+    local = scan_build(args.source, cache_rules)
+    if not local:
+        logger.error(f"Build directory {args.source} is empty, refusing to deploy")
+        return 1
+
+    previous = load_previous_manifest(s3, args.manifest_bucket, args.manifest_key)
+    remote_etags = list_bucket_etags(s3, args.bucket)
+    changed, stale = diff_manifest(local, previous, remote_etags)
+    logger.info(f"{len(local)} objects in build, {len(changed)} changed, {len(stale)} stale")
+
+    # Assets first, then the documents referencing them
+    upload_all(s3, args.bucket, [k for k in changed if not is_document(k)], local, args.workers)
+    upload_all(s3, args.bucket, [k for k in changed if is_document(k)], local, args.workers)
+
+    if not args.no_prune:
+        prune(s3, args.bucket, stale)
+
+    manifest = {key: {k: v for k, v in entry.items() if k != "path"} for key, entry in local.items()}
+    s3.put_object(Bucket=args.manifest_bucket, Key=args.manifest_key, Body=json.dumps(manifest), ContentType="application/json")
+
+    if args.changed_paths_file:
+        with open(args.changed_paths_file, "w") as f:
+            json.dump({"uploaded": changed, "pruned": [] if args.no_prune else stale, "stale": stale}, f)
+
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
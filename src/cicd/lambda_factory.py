@@ -23,11 +23,12 @@ class LambdaFactory(AbstractLambdaFactory):
         
     def create_github_status_lambda(self, scope, codepipeline_arns: List[str], artifact_buckets: List[s3.Bucket]):
         source_dir = "src/cicd/assets/lambda/github_status"
-        self.create_package_directory(source_dir)
+        runtime = lambda_.Runtime.PYTHON_3_8
+        self.create_package_directory(source_dir, runtime)
         github_status_lambda: lambda_.Function = self.create_lambda(
             id="GithubStatusNotifier",
             handler="github_status.handler",
-            runtime=lambda_.Runtime.PYTHON_3_8,
+            runtime=runtime,
             code=lambda_.Code.from_asset(source_dir+"/package"),
             environment={
                 'GITHUB_REPO_OWNER': 'CaerusLabs',
@@ -57,11 +58,12 @@ class LambdaFactory(AbstractLambdaFactory):
 
     def create_discord_notifier_lambda(self, scope, codepipeline_arns: List[str]):
         source_dir = "src/cicd/assets/lambda/discord_notifier"
-        self.create_package_directory(source_dir)
+        runtime = lambda_.Runtime.PYTHON_3_9
+        self.create_package_directory(source_dir, runtime)
         discord_notifier : lambda_.Function = self.create_lambda(
             id="DiscordNotifier",
             handler="discord_notifier.handler",
-            runtime=lambda_.Runtime.PYTHON_3_9,
+            runtime=runtime,
             code=lambda_.Code.from_asset(source_dir+"/package"),
             environment={
                 'GITHUB_REPO_OWNER': 'CaerusLabs',
@@ -21,6 +21,16 @@ class NotificationManager(AbstractNotificationManager):
     def __init__(self, scope):
         super().__init__(scope)
 
+    def create_build_rules(self, repo: Repository, github_lambda, discord_lambda):
+        """
+        Creates the build start, success and failure rules of a repository.
+        """
+        return [
+            self.create_build_start_rule(repo, github_lambda),
+            self.create_build_success_rule(repo, github_lambda, discord_lambda),
+            self.create_build_failure_rule(repo, github_lambda, discord_lambda),
+        ]
+
     def create_build_success_rule(self, repo: Repository, github_lambda, discord_lambda):
         rule_id = f"{repo.name}BuildSuccessRule"
         description = "Triggered when a build succeeds"
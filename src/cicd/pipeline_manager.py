@@ -8,16 +8,50 @@ from aws_cdk import (
     aws_codebuild as codebuild,
     aws_iam as iam,
     aws_apigateway as apigateway,
-    aws_cognito as cognito
+    aws_cognito as cognito,
+    aws_cloudfront as cloudfront,
+    aws_ecr as ecr,
+    aws_codedeploy as codedeploy,
+    RemovalPolicy
 )
 from constructs import Construct
 from src.core.models.repository import Repository
+from src.core.models.cache_profile import PRECOMPRESSED_EXTENSIONS
+from src.core.models.build_compute_profile import BuildComputeProfile
+from src.core.models.build_check import BuildCheck
+
+# Helper scripts under src/cicd/assets/scripts are shipped to CodeBuild as a zipped asset and unpacked here
+PIPELINE_SCRIPTS_DIR = "/tmp/pipeline_scripts"
+PIPELINE_SCRIPTS_DOWNLOAD_COMMANDS = [
+    'aws s3 cp "$PIPELINE_SCRIPTS_URL" /tmp/pipeline_scripts.zip',
+    # zipfile instead of unzip, which the Lambda compute images do not ship
+    f'python3 -m zipfile -e /tmp/pipeline_scripts.zip {PIPELINE_SCRIPTS_DIR}'
+]
+
+# Prefix of the artifact bucket holding CodeBuild caches and dependency tarballs
+BUILD_CACHE_PREFIX = "build-cache"
+
+# Prefix of the artifact bucket holding S3-staged Lambda deployment packages
+LAMBDA_PACKAGE_PREFIX = "lambda-packages"
+
+# Prefix of the artifact bucket holding the page weight report of the last successful web build
+PAGE_WEIGHT_REPORT_PREFIX = "page-weight"
+
+# Time the canary deploy leaves in the build for publishing the version and updating the API after the traffic shift
+CANARY_DEPLOY_HEADROOM_SECONDS = 180
+
+# Load test measurements are published per repository under this namespace
+LOAD_TEST_METRIC_NAMESPACE = "RPA/LoadTest"
+K6_VERSION = "0.49.0"
+
+# Prebuilt CodeBuild images, each built from src/cicd/assets/build_images/<name>/Dockerfile
+BUILD_IMAGES_DIR = "src/cicd/assets/build_images"
 
 class PipelineManager(AbstractPipelineManager):
     def __init__(self, scope, StageManagerType: AbstractStageManager, artifact_bucket, pipeline_name, repository_info: Repository):
         super().__init__(scope, artifact_bucket, pipeline_name)
-        self.create_pipeline()
         self.repository_info = repository_info
+        self.create_pipeline(execution_mode=repository_info.execution_mode)
         self.stage_manager = StageManagerType(self._pipeline, scope)
         
     def configure_pipeline(self):
@@ -28,19 +62,55 @@ class PipelineManager(AbstractPipelineManager):
         1. Adds a source stage that pulls the latest code from the repository.
         2. Adds a manual approval stage that pauses the pipeline until manual approval is given.
         3. Adds a build stage that builds the code from the repository.
+        4. Adds a deploy stage, followed by a load test stage when the repository has a load test.
         """
         self.stage_manager.add_source_stage(self.repository_info)
-        self.stage_manager.add_manual_approval_stage()
+        self.configure_triggers()
+        if self.repository_info.requires_approval:
+            self.stage_manager.add_manual_approval_stage()
         self.stage_manager.add_build_stage(self.repository_info)
         if self.repository_info.deployable:
             self.stage_manager.add_deploy_stage(self.repository_info)
+            if self.repository_info.load_test is not None:
+                self.stage_manager.add_load_test_stage(self.repository_info)
             
+    def configure_triggers(self):
+        """
+        Restricts the pipeline to pushes matching the branch and file path filters of the repository, so
+        changes that cannot affect the build do not start an execution. Without filters the pipeline starts on
+        every push to the source branch.
+        """
+        repo = self.repository_info
+        if not (repo.trigger_file_paths or repo.trigger_excluded_file_paths or repo.trigger_branches or repo.trigger_excluded_branches):
+            return
+        push_filter = {"Branches": self.create_trigger_filter(repo.trigger_branches or [repo.branch], repo.trigger_excluded_branches)}
+        if repo.trigger_file_paths or repo.trigger_excluded_file_paths:
+            push_filter["FilePaths"] = self.create_trigger_filter(repo.trigger_file_paths, repo.trigger_excluded_file_paths)
+        cfn_pipeline: codepipeline.CfnPipeline = self._pipeline.node.default_child
+        cfn_pipeline.add_property_override("Triggers", [{
+            "ProviderType": "CodeStarSourceConnection",
+            "GitConfiguration": {
+                "SourceActionName": repo.source_action_name,
+                "Push": [push_filter]
+            }
+        }])
+
+    def create_trigger_filter(self, includes: list, excludes: list) -> dict:
+        trigger_filter = {}
+        if includes:
+            trigger_filter["Includes"] = includes
+        if excludes:
+            trigger_filter["Excludes"] = excludes
+        return trigger_filter
+
     @property
     def pipeline(self):
         return self._pipeline
             
             
 class StageManagerWeb(AbstractStageManager):
+    build_image_name = "web"
+
     def __init__(self, pipeline: codepipeline.Pipeline, scope: Construct):
         super().__init__(pipeline, scope)
         self.build_artifact_out = codepipeline.Artifact()
@@ -65,23 +135,71 @@ class StageManagerWeb(AbstractStageManager):
 
     def add_build_stage(self, repo: Repository):
         self.build_artifact_out = codepipeline.Artifact(f"{repo.name}_BuildOutput")
+        cache_prefix = f"{BUILD_CACHE_PREFIX}/{repo.name}"
+        environment_variables = self.create_dependency_cache_variables(repo)
+        page_weight_report_key = f"{PAGE_WEIGHT_REPORT_PREFIX}/{repo.name}/latest.json"
+        if repo.page_weight_budget is not None:
+            environment_variables['PAGE_WEIGHT_REPORT_URI'] = codebuild.BuildEnvironmentVariable(value=self._pipeline.artifact_bucket.s3_url_for_object(page_weight_report_key))
         build_project = codebuild.PipelineProject(
             self._scope, 
             f"{repo.name}BuildProject",
-            build_spec=self.create_build_spec(), 
-            environment=codebuild.BuildEnvironment(
-                build_image=codebuild.LinuxBuildImage.STANDARD_7_0
-            )
+            build_spec=self.create_build_spec(repo), 
+            environment=self.create_build_environment(repo, repo.build_compute, lambda_image="AMAZON_LINUX_2_NODE_18"),
+            timeout=repo.build_compute.timeout,
+            environment_variables=environment_variables,
+            # The npm cache and the Nuxt build caches are restored by CodeBuild, node_modules by dependency_cache.sh.
+            # Lambda compute has no build cache.
+            cache=None if repo.build_compute.lambda_compute else codebuild.Cache.bucket(self._pipeline.artifact_bucket, prefix=f"{cache_prefix}/codebuild")
         )
+        self.grant_dependency_cache(repo, build_project)
+        if repo.page_weight_budget is not None:
+            self._pipeline.artifact_bucket.grant_read_write(build_project, page_weight_report_key)
         build_action = codepipeline_actions.CodeBuildAction(
             action_name=f"{repo.name}_Build",
             project=build_project,
             input=repo.source_output,
             outputs=[self.build_artifact_out]
         )
-        self._pipeline.add_stage(stage_name=f"{repo.name}_BuildStage", actions=[build_action])
+        # Tests and lint run next to the packaging build, so they add no time to the pipeline
+        build_actions = [build_action, *self.create_check_actions(repo, self.create_check_project)]
+        self._pipeline.add_stage(stage_name=f"{repo.name}_BuildStage", actions=build_actions)
         repo.build_project_name = build_project.project_name
 
+    def create_check_project(self, repo: Repository, check: BuildCheck) -> codebuild.PipelineProject:
+        profile = check.compute or repo.build_compute
+        check_project = codebuild.PipelineProject(
+            self._scope,
+            f"{repo.name}{check.name}Project",
+            build_spec=self.create_check_build_spec(check, self.create_install_phase(repo, profile, {"nodejs": "18"}, self.create_install_commands())),
+            environment=self.create_build_environment(repo, profile, lambda_image="AMAZON_LINUX_2_NODE_18"),
+            timeout=profile.timeout,
+            environment_variables=self.create_dependency_cache_variables(repo)
+        )
+        self.grant_dependency_cache(repo, check_project)
+        return check_project
+
+    def create_dependency_cache_variables(self, repo: Repository) -> dict:
+        pipeline_scripts = self.get_pipeline_scripts(repo)
+        return {
+            'PIPELINE_SCRIPTS_URL': codebuild.BuildEnvironmentVariable(value=pipeline_scripts.s3_object_url),
+            'DEPENDENCY_CACHE_URI': codebuild.BuildEnvironmentVariable(value=self._pipeline.artifact_bucket.s3_url_for_object(f"{BUILD_CACHE_PREFIX}/{repo.name}/dependencies")),
+        }
+
+    def grant_dependency_cache(self, repo: Repository, project: codebuild.PipelineProject):
+        self.get_pipeline_scripts(repo).grant_read(project)
+        self._pipeline.artifact_bucket.grant_read_write(project, f"{BUILD_CACHE_PREFIX}/{repo.name}/*")
+
+    def create_install_commands(self) -> list:
+        return [
+            "echo Installing Node.js dependencies...",
+            *PIPELINE_SCRIPTS_DOWNLOAD_COMMANDS,
+            # node_modules is reused as long as package-lock.json and the Node.js version are unchanged
+            f'if bash {PIPELINE_SCRIPTS_DIR}/dependency_cache.sh restore package-lock.json node_modules "$DEPENDENCY_CACHE_URI" "$(node -v)"; then '
+            'npm run postinstall; '  # Ensure all necessary preparations are made
+            'else npm ci --prefer-offline --no-audit --no-fund && '
+            f'bash {PIPELINE_SCRIPTS_DIR}/dependency_cache.sh save package-lock.json node_modules "$DEPENDENCY_CACHE_URI" "$(node -v)"; fi'
+        ]
+
     def add_manual_approval_stage(self):
         manual_approval_action = codepipeline_actions.ManualApprovalAction(
             action_name="ManualApproval",
@@ -100,15 +218,75 @@ class StageManagerWeb(AbstractStageManager):
         if website_bucket is None:
             raise ValueError("The website repository must have a build dependency of type s3.Bucket")
         
-        deploy_action = codepipeline_actions.S3DeployAction(
+        pipeline_scripts = self.get_pipeline_scripts(repo)
+        manifest_key = f"deploy-manifests/{repo.name}.json"
+        environment_variables = {
+            'PIPELINE_SCRIPTS_URL': codebuild.BuildEnvironmentVariable(value=pipeline_scripts.s3_object_url),
+            'WEBSITE_BUCKET': codebuild.BuildEnvironmentVariable(value=website_bucket.bucket_name),
+            'MANIFEST_BUCKET': codebuild.BuildEnvironmentVariable(value=self._pipeline.artifact_bucket.bucket_name),
+            'MANIFEST_KEY': codebuild.BuildEnvironmentVariable(value=manifest_key),
+        }
+        delta_deploy_command = (f'python3 {PIPELINE_SCRIPTS_DIR}/s3_delta_deploy.py --source . --bucket "$WEBSITE_BUCKET" '
+            '--manifest-bucket "$MANIFEST_BUCKET" --manifest-key "$MANIFEST_KEY" --changed-paths-file /tmp/changed-paths.json')
+        deploy_commands = [delta_deploy_command]
+        
+        # Invalidate only the changed documents and optionally warm key routes through the distribution
+        distribution: cloudfront.Distribution = repo.get_build_dependency_of_type(cloudfront.Distribution)
+        if distribution is not None:
+            # Old documents cached at the edge still reference the stale objects, so they are pruned only once the
+            # invalidation has completed
+            deploy_commands = [f'{delta_deploy_command} --no-prune']
+            environment_variables['DISTRIBUTION_ID'] = codebuild.BuildEnvironmentVariable(value=distribution.distribution_id)
+            environment_variables['DISTRIBUTION_DOMAIN'] = codebuild.BuildEnvironmentVariable(value=distribution.distribution_domain_name)
+            environment_variables['WARM_ROUTES'] = codebuild.BuildEnvironmentVariable(value=",".join(repo.warm_routes))
+            invalidate_command = f'python3 {PIPELINE_SCRIPTS_DIR}/cloudfront_invalidate.py --distribution-id "$DISTRIBUTION_ID" --changed-paths-file /tmp/changed-paths.json --wait'
+            if repo.warm_routes or repo.warm_from_sitemap:
+                invalidate_command += ' --domain "$DISTRIBUTION_DOMAIN" --routes "$WARM_ROUTES"'
+            if repo.warm_from_sitemap:
+                invalidate_command += ' --sitemap sitemap.xml'
+            deploy_commands.append(invalidate_command)
+            deploy_commands.append(f'{delta_deploy_command} --prune-only')
+        
+        deploy_project = codebuild.PipelineProject(
+            self._scope,
+            f"{repo.name}S3DeployProject",
+            build_spec=codebuild.BuildSpec.from_object({
+                'version': '0.2',
+                'phases': {
+                    'install': self.create_install_phase(repo, repo.deploy_compute, {'python': '3.11'}, [
+                        # The Lambda compute images ship boto3 and cannot install into the system site-packages
+                        'python3 -c "import boto3" 2>/dev/null || pip3 install --quiet boto3',
+                        *PIPELINE_SCRIPTS_DOWNLOAD_COMMANDS,
+                        *self.create_merge_commands()
+                    ]),
+                    'build': {
+                        'commands': deploy_commands
+                    }
+                }
+            }),
+            environment=self.create_build_environment(repo, repo.deploy_compute),
+            timeout=repo.deploy_compute.timeout,
+            environment_variables=environment_variables
+        )
+        
+        # The deploy lists, uploads and prunes objects in the website bucket and keeps its manifest next to the pipeline artifacts
+        pipeline_scripts.grant_read(deploy_project)
+        website_bucket.grant_read_write(deploy_project)
+        website_bucket.grant_delete(deploy_project)
+        self._pipeline.artifact_bucket.grant_read_write(deploy_project, manifest_key)
+        if distribution is not None:
+            distribution.grant_create_invalidation(deploy_project)
+            distribution.grant(deploy_project, "cloudfront:GetInvalidation")
+        
+        deploy_action = codepipeline_actions.CodeBuildAction(
             action_name=f"{repo.name}Deploy",
+            project=deploy_project,
             input=self.build_artifact_out,
-            bucket=website_bucket,
-            extract=True
+            extra_inputs=self.check_artifacts
         )
         self._pipeline.add_stage(stage_name=f"{repo.name}DeployStage", actions=[deploy_action])
         
-    def create_build_spec(self):
+    def create_build_spec(self, repo: Repository):
         # return codebuild.BuildSpec.from_object({
         #     "version": "0.2",
         #     "phases": {
@@ -136,20 +314,12 @@ class StageManagerWeb(AbstractStageManager):
         #     },
         #     "artifacts": {"files": []}
         # })        
-        return codebuild.BuildSpec.from_object({
+        build_spec = {
             "version": "0.2",
             "phases": {
-                "install": {
-                    "runtime-versions": {
+                "install": self.create_install_phase(repo, repo.build_compute, {
                         "nodejs": "18"  # Nuxt 3 supports Node.js 14 or later; using 16 as an example
-                    },
-                    "commands": [
-                        "echo Installing Node.js dependencies...",
-                        "npm install -g npm@latest",
-                        "npm install",
-                        "npm run postinstall"  # Ensure all necessary preparations are made
-                    ]
-                },
+                    }, self.create_install_commands()),
                 "pre_build": {
                     "commands": [
                         "echo Running tests...",
@@ -160,6 +330,8 @@ class StageManagerWeb(AbstractStageManager):
                     "commands": [
                         "echo Building the Nuxt application...",
                         "npm run generate:dev",
+                        "echo Precompressing static assets...",
+                        f"node {PIPELINE_SCRIPTS_DIR}/precompress.mjs .output/public {','.join(PRECOMPRESSED_EXTENSIONS)}"
                     ]
                 }
             },
@@ -168,13 +340,51 @@ class StageManagerWeb(AbstractStageManager):
                 "files": [
                     "**/*"
                 ]
+            },
+            "cache": {
+                "paths": [
+                    "/root/.npm/**/*",
+                    ".nuxt/**/*",
+                    "node_modules/.cache/**/*"
+                ]
             }
-        })
+        }
+        if repo.page_weight_budget is not None:
+            self.add_page_weight_report(repo, build_spec)
+        return codebuild.BuildSpec.from_object(build_spec)
+
+    def add_page_weight_report(self, repo: Repository, build_spec: dict):
+        """
+        Adds the page weight report of the generated site to a build spec. The report is compared against the
+        report of the last successful build, which is replaced once the build succeeds.
+
+        :param repo: The repository being built.
+        :param build_spec: The build spec of the packaging build, modified in place.
+        """
+        budget = repo.page_weight_budget
+        build_spec["phases"]["build"]["commands"] += [
+            "echo Weighing the generated pages...",
+            'aws s3 cp "$PAGE_WEIGHT_REPORT_URI" reports/page-weight-previous.json --quiet || echo "No previous page weight report"',
+            f"python3 {PIPELINE_SCRIPTS_DIR}/page_weight_report.py --directory .output/public --routes {','.join(budget.routes)} "
+            "--previous-report reports/page-weight-previous.json --report-file reports/page-weight.json --junit-file reports/page-weight.xml "
+            + budget.budget_arguments()
+        ]
+        build_spec["phases"]["post_build"] = {
+            "commands": [
+                'if [ "$CODEBUILD_BUILD_SUCCEEDING" = "1" ]; then aws s3 cp reports/page-weight.json "$PAGE_WEIGHT_REPORT_URI" --quiet; fi'
+            ]
+        }
+        build_spec["reports"] = {
+            "PageWeight": {"files": ["reports/page-weight.xml"], "file-format": "JUNITXML"}
+        }
         
 class StageManagerMT(AbstractStageManager):
+    build_image_name = "mt"
+
     def __init__(self, pipeline: codepipeline.Pipeline, scope: Construct):
         super().__init__(pipeline, scope)
         self.build_artifact_out = codepipeline.Artifact()
+        self.image_repository: ecr.Repository = None
     
     def add_source_stage(self, repo: Repository):
         CI_action_name = f"{repo.name}_Source"
@@ -203,23 +413,121 @@ class StageManagerMT(AbstractStageManager):
             raise ValueError("The middle tier repository must have a build dependency of type cognito.UserPool")
         
         self.build_artifact_out = codepipeline.Artifact(f"{repo.name}_BuildOutput")
+        environment_variables = {}
+        if repo.lambda_package == "s3":
+            environment_variables['PACKAGE_BUCKET'] = codebuild.BuildEnvironmentVariable(value=self._pipeline.artifact_bucket.bucket_name)
+            environment_variables['PACKAGE_PREFIX'] = codebuild.BuildEnvironmentVariable(value=f"{LAMBDA_PACKAGE_PREFIX}/{repo.name}")
+        elif repo.lambda_package == "image":
+            if not repo.build_compute.privileged or repo.build_compute.arm:
+                raise ValueError("Container image packages must be built on privileged x86 compute, matching the architecture of the function")
+            self.image_repository = self.create_image_repository(repo)
+            environment_variables['IMAGE_REPOSITORY_URI'] = codebuild.BuildEnvironmentVariable(value=self.image_repository.repository_uri)
+        
         build_project = codebuild.PipelineProject(
             self._scope, 
             f"{repo.name}BuildProject",
-            build_spec=self.create_build_spec(lambda_function, cognito_user_pool), 
-            environment=codebuild.BuildEnvironment(
-                build_image=codebuild.LinuxBuildImage.STANDARD_7_0
-            )
+            build_spec=self.create_build_spec(repo, lambda_function, cognito_user_pool), 
+            environment=self.create_build_environment(repo, repo.build_compute),
+            timeout=repo.build_compute.timeout,
+            environment_variables=environment_variables,
+            # Reuse downloaded and built wheels between builds, Lambda compute has no build cache
+            cache=None if repo.build_compute.lambda_compute else codebuild.Cache.bucket(self._pipeline.artifact_bucket, prefix=f"{BUILD_CACHE_PREFIX}/{repo.name}/codebuild")
         )
+        if repo.lambda_package == "s3":
+            self._pipeline.artifact_bucket.grant_put(build_project, f"{LAMBDA_PACKAGE_PREFIX}/{repo.name}/*")
+        elif repo.lambda_package == "image":
+            self.image_repository.grant_pull_push(build_project)
         build_action = codepipeline_actions.CodeBuildAction(
             action_name=f"{repo.name}_Build",
             project=build_project,
             input=repo.source_output,
             outputs=[self.build_artifact_out]
         )
-        self._pipeline.add_stage(stage_name=f"{repo.name}_BuildStage", actions=[build_action])
+        # Tests and lint run next to the packaging build, so they add no time to the pipeline
+        build_actions = [build_action, *self.create_check_actions(repo, self.create_check_project)]
+        self._pipeline.add_stage(stage_name=f"{repo.name}_BuildStage", actions=build_actions)
         repo.build_project_name = build_project.project_name
 
+    def create_image_repository(self, repo: Repository) -> ecr.Repository:
+        image_repository = ecr.Repository(
+            self._scope,
+            f"{repo.name}ImageRepository",
+            lifecycle_rules=[ecr.LifecycleRule(max_image_count=20, description="Keep the last 20 images for rollbacks")]
+        )
+        # Lambda pulls the image with its service principal when the function code is updated
+        image_repository.add_to_resource_policy(iam.PolicyStatement(
+            principals=[iam.ServicePrincipal("lambda.amazonaws.com")],
+            actions=["ecr:BatchGetImage", "ecr:GetDownloadUrlForLayer"]
+        ))
+        return image_repository
+
+    def create_package_commands(self, repo: Repository) -> list:
+        """
+        Returns the commands publishing the deployment package built into dist/.
+
+        zip: the package travels to the deploy as part of the build output and is uploaded with the API call,
+        which limits it to 50 MB.
+        s3: the package is staged in the artifact bucket and only its key travels to the deploy.
+        image: the repository's Dockerfile is built with the previous image as layer cache and pushed to ECR,
+        only the image digest travels to the deploy. The Docker daemon is started first when the build image does
+        not run one.
+        """
+        if repo.lambda_package == "s3":
+            return [
+                'PACKAGE_KEY="$PACKAGE_PREFIX/$CODEBUILD_RESOLVED_SOURCE_VERSION-$CODEBUILD_BUILD_NUMBER.zip"',
+                'aws s3 cp "$(ls dist/*.zip | head -n 1)" "s3://$PACKAGE_BUCKET/$PACKAGE_KEY"',
+                'echo "$PACKAGE_KEY" > dist/package-key.txt',
+                'rm -f dist/*.zip'
+            ]
+        if repo.lambda_package == "image":
+            return [
+                # The standard image runs the Docker daemon on privileged compute, the prebuilt mt image only ships it
+                'docker info >/dev/null 2>&1 || (nohup dockerd --host=unix:///var/run/docker.sock --storage-driver=overlay2 >/tmp/dockerd.log 2>&1 & '
+                'timeout 30 sh -c "until docker info >/dev/null 2>&1; do sleep 1; done")',
+                'aws ecr get-login-password | docker login --username AWS --password-stdin "${IMAGE_REPOSITORY_URI%%/*}"',
+                'docker pull "$IMAGE_REPOSITORY_URI:latest" || true',
+                'docker build --build-arg BUILDKIT_INLINE_CACHE=1 --cache-from "$IMAGE_REPOSITORY_URI:latest" '
+                '-t "$IMAGE_REPOSITORY_URI:$CODEBUILD_RESOLVED_SOURCE_VERSION" -t "$IMAGE_REPOSITORY_URI:latest" .',
+                'docker push --all-tags "$IMAGE_REPOSITORY_URI"',
+                # The digest pins the deploy to exactly this build even if latest moves on
+                'docker inspect --format "{{index .RepoDigests 0}}" "$IMAGE_REPOSITORY_URI:$CODEBUILD_RESOLVED_SOURCE_VERSION" > dist/image-uri.txt',
+                'rm -f dist/*.zip'
+            ]
+        return []
+
+    def get_package_arguments(self, repo: Repository) -> str:
+        # Arguments of update-function-code and lambda_canary_deploy.py pointing at the package in the build output
+        if repo.lambda_package == "s3":
+            return f'--s3-bucket {self._pipeline.artifact_bucket.bucket_name} --s3-key "$(cat package-key.txt)"'
+        if repo.lambda_package == "image":
+            return '--image-uri "$(cat image-uri.txt)"'
+        return None
+
+    def create_check_project(self, repo: Repository, check: BuildCheck) -> codebuild.PipelineProject:
+        profile = check.compute or repo.build_compute
+        return codebuild.PipelineProject(
+            self._scope,
+            f"{repo.name}{check.name}Project",
+            build_spec=self.create_check_build_spec(check, self.create_install_phase(repo, profile, {"python": "3.9"}, self.create_install_commands())),
+            environment=self.create_build_environment(repo, profile),
+            timeout=profile.timeout,
+            cache=None if profile.lambda_compute else codebuild.Cache.bucket(self._pipeline.artifact_bucket, prefix=f"{BUILD_CACHE_PREFIX}/{repo.name}/codebuild")
+        )
+
+    def create_install_commands(self) -> list:
+        return [
+            "echo Installing some dependencies...",
+            "pip3 install --prefer-binary -r requirements.txt",
+            # set some dummy environment variables for the build
+            "export ENV='dev'",
+            "export BUILD='true'",
+            "export POSTGRES_URI='localhost'",
+            "export POSTGRES_DB='dev'",
+            "export POSTGRES_USER='admin'",
+            "export POSTGRES_PASS='password'",
+            "echo Finished installing dependencies..."
+        ]
+
     def add_manual_approval_stage(self):
         manual_approval_action = codepipeline_actions.ManualApprovalAction(
             action_name="ManualApproval",
@@ -242,33 +550,85 @@ class StageManagerMT(AbstractStageManager):
         if api_gateway is None:
             raise ValueError("The middle tier repository must have a build dependency of type apigateway.RestApi")
         
+        # With a deployment group the new code is published as a version and CodeDeploy shifts the alias the API invokes
+        deployment_group: codedeploy.LambdaDeploymentGroup = repo.get_build_dependency_of_type(codedeploy.LambdaDeploymentGroup)
+        alias: lambda_.Alias = repo.get_build_dependency_of_type(lambda_.Alias)
+        if deployment_group is not None and alias is None:
+            raise ValueError("A middle tier repository with a codedeploy.LambdaDeploymentGroup must have a build dependency of type lambda_.Alias")
+        pipeline_scripts = self.get_pipeline_scripts(repo)
+        
+        package_arguments = self.get_package_arguments(repo)
+        if deployment_group is not None:
+            code_deploy_command = (
+                f'python3 {PIPELINE_SCRIPTS_DIR}/lambda_canary_deploy.py --function-name {lambda_function.function_name} --alias {alias.alias_name} '
+                f'--application {deployment_group.application.application_name} --deployment-group {deployment_group.deployment_group_name} '
+                # The wait must end before the build times out, which is after 15 minutes on Lambda compute
+                f'--timeout {repo.deploy_compute.max_runtime_seconds - CANARY_DEPLOY_HEADROOM_SECONDS} '
+                + (package_arguments or '--zip-file "$(ls *.zip | head -n 1)"')
+            )
+            invoked_function = alias.function_arn
+        else:
+            code_deploy_command = f'aws lambda update-function-code --function-name {lambda_function.function_name} ' + (package_arguments or '--zip-file fileb://$(ls *.zip | head -n 1)')
+            invoked_function = lambda_function.function_name
+        
         deploy_project = codebuild.PipelineProject(
             self._scope,
             f"{repo.name}LambdaDeployProject",
             build_spec=codebuild.BuildSpec.from_object({
                 'version': '0.2',
                 'phases': {
+                    'install': self.create_install_phase(repo, repo.deploy_compute, {'python': '3.11'}, [
+                        'python3 -c "import boto3" 2>/dev/null || pip3 install --quiet boto3',
+                        *PIPELINE_SCRIPTS_DOWNLOAD_COMMANDS
+                    ]),
                     'build': {
                         'commands': [
+                            *self.create_merge_commands(),
                             'ls',
                             'export ENV="dev"',
-                            f'aws lambda update-function-code --function-name {lambda_function.function_name} --zip-file fileb://$(ls *.zip | head -n 1)',
+                            code_deploy_command,
                             f'aws apigateway put-rest-api --cli-binary-format raw-in-base64-out --rest-api-id {api_gateway.rest_api_id} --mode overwrite --body "file://$(ls *api.json)"',
-                            f'aws lambda add-permission --function-name {lambda_function.function_name} --statement-id "ApiGatewayInvokeAllEndpoints" --action "lambda:InvokeFunction" --principal "apigateway.amazonaws.com" --source-arn "{api_gateway.arn_for_execute_api()}" --output text'
+                            f'aws lambda add-permission --function-name {invoked_function} --statement-id "ApiGatewayInvokeAllEndpoints" --action "lambda:InvokeFunction" --principal "apigateway.amazonaws.com" --source-arn "{api_gateway.arn_for_execute_api()}" --output text'
                         ]
                     }
                 }
             }),
-            environment=codebuild.BuildEnvironment(
-                build_image=codebuild.LinuxBuildImage.STANDARD_7_0
-            )
+            environment=self.create_build_environment(repo, repo.deploy_compute),
+            timeout=repo.deploy_compute.timeout,
+            environment_variables={
+                'PIPELINE_SCRIPTS_URL': codebuild.BuildEnvironmentVariable(value=pipeline_scripts.s3_object_url),
+            }
         )
+        pipeline_scripts.grant_read(deploy_project)
+        # UpdateFunctionCode reads S3 packages and images with the permissions of the caller
+        if repo.lambda_package == "s3":
+            self._pipeline.artifact_bucket.grant_read(deploy_project, f"{LAMBDA_PACKAGE_PREFIX}/{repo.name}/*")
+        elif repo.lambda_package == "image":
+            self.image_repository.grant_pull(deploy_project)
         
         # Define the IAM policy for updating Lambda function code
         lambda_update_policy = iam.PolicyStatement(
             actions=["lambda:UpdateFunctionCode", "lambda:AddPermission"],
             resources=[lambda_function.function_arn]
         )
+        if deployment_group is not None:
+            # Publishing, waiting for the version and reading the alias act on qualified ARNs
+            deploy_project.add_to_role_policy(iam.PolicyStatement(
+                actions=["lambda:UpdateFunctionCode", "lambda:PublishVersion", "lambda:GetFunction", "lambda:GetFunctionConfiguration", "lambda:GetAlias", "lambda:AddPermission"],
+                resources=[lambda_function.function_arn, f"{lambda_function.function_arn}:*"]
+            ))
+            deploy_project.add_to_role_policy(iam.PolicyStatement(
+                actions=["codedeploy:CreateDeployment", "codedeploy:GetDeployment", "codedeploy:GetDeploymentGroup"],
+                resources=[deployment_group.deployment_group_arn]
+            ))
+            deploy_project.add_to_role_policy(iam.PolicyStatement(
+                actions=["codedeploy:GetDeploymentConfig"],
+                resources=[deployment_group.deployment_config.deployment_config_arn]
+            ))
+            deploy_project.add_to_role_policy(iam.PolicyStatement(
+                actions=["codedeploy:RegisterApplicationRevision", "codedeploy:GetApplicationRevision"],
+                resources=[deployment_group.application.application_arn]
+            ))
         
         # Define the IAM policy for updating API Gateway
         apigateway_update_policy = iam.PolicyStatement(
@@ -285,6 +645,7 @@ class StageManagerMT(AbstractStageManager):
             action_name=f"{repo.name}_LambdaDeploy",
             project=deploy_project,
             input=self.build_artifact_out,
+            extra_inputs=self.check_artifacts
         )
 
         # Add deploy stage to the pipeline
@@ -293,27 +654,81 @@ class StageManagerMT(AbstractStageManager):
             actions=[deploy_action]
         )
         
-    def create_build_spec(self, lambda_function: lambda_.Function, cognito_pool: cognito.UserPool):      
+    def add_load_test_stage(self, repo: Repository):
+        api_gateway: apigateway.RestApi = repo.get_build_dependency_of_type(apigateway.RestApi)
+        if api_gateway is None:
+            raise ValueError("The middle tier repository must have a build dependency of type apigateway.RestApi")
+        load_test = repo.load_test
+        pipeline_scripts = self.get_pipeline_scripts(repo)
+
+        if load_test.tool == "k6":
+            tool_install_commands = [
+                "mkdir -p /tmp/bin",
+                f"curl -sSL https://github.com/grafana/k6/releases/download/v{K6_VERSION}/k6-v{K6_VERSION}-linux-{load_test.compute.architecture}.tar.gz "
+                "| tar -xz --strip-components 1 -C /tmp/bin",
+                'export PATH="/tmp/bin:$PATH"'
+            ]
+        else:
+            tool_install_commands = ["pip3 install --quiet locust"]
+
+        load_test_project = codebuild.PipelineProject(
+            self._scope,
+            f"{repo.name}LoadTestProject",
+            build_spec=codebuild.BuildSpec.from_object({
+                "version": "0.2",
+                "phases": {
+                    "install": self.create_install_phase(repo, load_test.compute, {"python": "3.11"}, [
+                        'python3 -c "import boto3" 2>/dev/null || pip3 install --quiet boto3',
+                        *tool_install_commands,
+                        *PIPELINE_SCRIPTS_DOWNLOAD_COMMANDS
+                    ]),
+                    "build": {
+                        "commands": [
+                            f"python3 {PIPELINE_SCRIPTS_DIR}/load_testing.py --tool {load_test.tool} --scenario {load_test.scenario} "
+                            f"--base-url {api_gateway.url} --users {load_test.users} --duration {load_test.duration_seconds} "
+                            f"{load_test.budget_arguments()} --report-file reports/load-test.xml "
+                            f"--metric-namespace {LOAD_TEST_METRIC_NAMESPACE} --metric-dimension Repository={repo.name}"
+                        ]
+                    }
+                },
+                "reports": {
+                    "LoadTest": {"files": ["reports/load-test.xml"], "file-format": "JUNITXML"}
+                }
+            }),
+            environment=self.create_build_environment(repo, load_test.compute),
+            timeout=load_test.compute.timeout,
+            environment_variables={
+                "PIPELINE_SCRIPTS_URL": codebuild.BuildEnvironmentVariable(value=pipeline_scripts.s3_object_url),
+            }
+        )
+        pipeline_scripts.grant_read(load_test_project)
+        load_test_project.add_to_role_policy(iam.PolicyStatement(
+            actions=["cloudwatch:PutMetricData"],
+            resources=["*"],
+            conditions={"StringEquals": {"cloudwatch:namespace": LOAD_TEST_METRIC_NAMESPACE}}
+        ))
+
+        # The scenarios live in the application repository
+        load_test_action = codepipeline_actions.CodeBuildAction(
+            action_name=f"{repo.name}_LoadTest",
+            project=load_test_project,
+            input=repo.source_output
+        )
+        self._pipeline.add_stage(
+            stage_name=f"{repo.name}_LoadTestStage",
+            actions=[load_test_action]
+        )
+
+    def get_invoked_function_arn(self, repo: Repository, lambda_function: lambda_.Function) -> str:
+        # The API invokes the alias when its versions are shifted by CodeDeploy
+        alias: lambda_.Alias = repo.get_build_dependency_of_type(lambda_.Alias)
+        return alias.function_arn if alias is not None else lambda_function.function_arn
+
+    def create_build_spec(self, repo: Repository, lambda_function: lambda_.Function, cognito_pool: cognito.UserPool):      
         return codebuild.BuildSpec.from_object({
             "version": "0.2",
             "phases": {
-                "install": {
-                    "runtime-versions": {
-                        "python": "3.9"
-                    },
-                    "commands": [
-                        "echo Installing some dependencies...",
-                        "pip3 install -r requirements.txt",
-                        # set some dummy environment variables for the build
-                        "export ENV='dev'",
-                        "export BUILD='true'",
-                        "export POSTGRES_URI='localhost'",
-                        "export POSTGRES_DB='dev'",
-                        "export POSTGRES_USER='admin'",
-                        "export POSTGRES_PASS='password'",
-                        "echo Finished installing dependencies..."
-                    ]
-                },
+                "install": self.create_install_phase(repo, repo.build_compute, {"python": "3.9"}, self.create_install_commands()),
                 "pre_build": {
                     "commands": [
                         "echo Running tests...",
@@ -324,9 +739,10 @@ class StageManagerMT(AbstractStageManager):
                     "commands": [
                         "echo Building the application...",
                         "cd RPA/",
-                        f"python3 app.py --mode build --lambda-arn {lambda_function.function_arn} --cognito-arn {cognito_pool.user_pool_arn}",
+                        f"python3 app.py --mode build --lambda-arn {self.get_invoked_function_arn(repo, lambda_function)} --cognito-arn {cognito_pool.user_pool_arn}",
                         "echo Finished building the application...",
-                        "cd .."
+                        "cd ..",
+                        *self.create_package_commands(repo)
                     ]
                 }
             },
@@ -335,5 +751,114 @@ class StageManagerMT(AbstractStageManager):
                 "files": [
                     "**/*"
                 ]
+            },
+            "cache": {
+                "paths": [
+                    "/root/.cache/pip/**/*"
+                ]
             }
-        })
\ No newline at end of file
+        })
+
+class StageManagerBuildImage(AbstractStageManager):
+    """
+    Builds the CodeBuild images of the other stage types from the Dockerfiles under BUILD_IMAGES_DIR and pushes
+    them to one ECR repository per image. Every image is built natively for each architecture, tagged with the
+    commit and `latest`, suffixed with the architecture, and the previous `latest` of the same architecture is used
+    as layer cache so unchanged layers are not rebuilt.
+    """
+    def __init__(self, pipeline: codepipeline.Pipeline, scope: Construct, image_names: list = None, architectures: list = ["amd64", "arm64"]):
+        super().__init__(pipeline, scope)
+        self.architectures = architectures
+        self.image_repositories: dict = {}
+        for image_name in image_names or [StageManagerWeb.build_image_name, StageManagerMT.build_image_name]:
+            self.image_repositories[image_name] = ecr.Repository(
+                scope,
+                f"BuildImageRepository{image_name.upper()}",
+                removal_policy=RemovalPolicy.DESTROY,
+                lifecycle_rules=[ecr.LifecycleRule(max_image_count=10 * len(architectures), description="Keep the last 10 builds of each architecture")]
+            )
+
+    def add_source_stage(self, repo: Repository):
+        CI_action_name = f"{repo.name}_Source"
+        CI_stage_name = f"{repo.name}_SourceStage"
+        source_output = codepipeline.Artifact()
+        source_action = codepipeline_actions.CodeStarConnectionsSourceAction(
+            action_name=CI_action_name,
+            connection_arn=repo.code_star_connection_arn,
+            owner=repo.owner,
+            repo=repo.repo_name,
+            output=source_output,
+            branch=repo.branch,
+            variables_namespace=f"{repo.name}_SourceVariables"
+        )
+        self._pipeline.add_stage(stage_name=CI_stage_name, actions=[source_action])
+        repo.source_output = source_output
+        repo.source_action_name = CI_action_name
+        repo.source_stage_name = CI_stage_name
+
+    def add_build_stage(self, repo: Repository):
+        # The images are independent of each other, so they are built in parallel within one stage
+        build_actions = []
+        for image_name, image_repository in self.image_repositories.items():
+            for architecture in self.architectures:
+                # Privileged mode is required to run the Docker daemon
+                profile = BuildComputeProfile(arm=architecture == "arm64", privileged=True)
+                build_project = codebuild.PipelineProject(
+                    self._scope,
+                    f"{repo.name}BuildImageProject{image_name.upper()}{architecture.upper()}",
+                    build_spec=self.create_build_spec(),
+                    environment=self.create_build_environment(repo, profile),
+                    timeout=profile.timeout,
+                    environment_variables={
+                        'IMAGE_REPOSITORY_URI': codebuild.BuildEnvironmentVariable(value=image_repository.repository_uri),
+                        'IMAGE_CONTEXT': codebuild.BuildEnvironmentVariable(value=f"{BUILD_IMAGES_DIR}/{image_name}"),
+                        'IMAGE_ARCH': codebuild.BuildEnvironmentVariable(value=architecture),
+                    }
+                )
+                image_repository.grant_pull_push(build_project)
+                build_actions.append(codepipeline_actions.CodeBuildAction(
+                    action_name=f"{repo.name}_BuildImage_{image_name}_{architecture}",
+                    project=build_project,
+                    input=repo.source_output
+                ))
+        self._pipeline.add_stage(stage_name=f"{repo.name}_BuildStage", actions=build_actions)
+
+    def add_manual_approval_stage(self):
+        manual_approval_action = codepipeline_actions.ManualApprovalAction(
+            action_name="ManualApproval",
+            additional_information="Approve the change to continue deployment",
+        )
+        self._pipeline.add_stage(
+            stage_name="ManualApproval",
+            actions=[manual_approval_action]
+        )
+
+    def create_build_spec(self):
+        return codebuild.BuildSpec.from_object({
+            "version": "0.2",
+            "phases": {
+                "pre_build": {
+                    "commands": [
+                        "echo Logging in to Amazon ECR...",
+                        'aws ecr get-login-password | docker login --username AWS --password-stdin "${IMAGE_REPOSITORY_URI%%/*}"',
+                        'IMAGE_TAG=$(echo "$CODEBUILD_RESOLVED_SOURCE_VERSION" | cut -c 1-12)-$IMAGE_ARCH',
+                        # The first build has nothing to reuse yet
+                        'docker pull "$IMAGE_REPOSITORY_URI:latest-$IMAGE_ARCH" || true'
+                    ]
+                },
+                "build": {
+                    "commands": [
+                        "echo Building the image in $IMAGE_CONTEXT...",
+                        'docker build --build-arg BUILDKIT_INLINE_CACHE=1 --build-arg TARGETARCH="$IMAGE_ARCH" '
+                        '--cache-from "$IMAGE_REPOSITORY_URI:latest-$IMAGE_ARCH" '
+                        '-t "$IMAGE_REPOSITORY_URI:$IMAGE_TAG" -t "$IMAGE_REPOSITORY_URI:latest-$IMAGE_ARCH" "$IMAGE_CONTEXT"'
+                    ]
+                },
+                "post_build": {
+                    "commands": [
+                        # post_build also runs after a failed build, never publish a stale latest tag
+                        'if [ "$CODEBUILD_BUILD_SUCCEEDING" = "1" ]; then docker push --all-tags "$IMAGE_REPOSITORY_URI"; fi'
+                    ]
+                }
+            }
+        })
@@ -4,13 +4,15 @@ from aws_cdk import (
     Duration
 )
 from constructs import Construct
-import os, shutil, sys, hashlib
+import os, shutil, hashlib
+from src.core.wheelhouse import LOCK_FILE_NAME, WheelhouseTarget, install_locked_requirements, run_pip
 
 class AbstractLambdaFactory(ABC):
     def __init__(self, scope: Construct):
         self.scope = scope
 
-    def create_lambda(self, id: str, handler: str, runtime: lambda_.Runtime, code: lambda_.Code, environment: dict = {}, timeout: Duration = Duration.seconds(5)) -> lambda_.Function:
+    def create_lambda(self, id: str, handler: str, runtime: lambda_.Runtime, code: lambda_.Code, environment: dict = {}, timeout: Duration = Duration.seconds(5), **kwargs) -> lambda_.Function:
+        # Any additional keyword arguments (e.g. vpc, vpc_subnets, security_groups) are passed through to the function
         return lambda_.Function(
             self.scope, id,
             function_name=id,
@@ -19,51 +21,65 @@ class AbstractLambdaFactory(ABC):
             code=code,
             environment=environment,
             timeout=timeout,
+            **kwargs
         )
         
-    def create_package_directory(self, source_dir):
+    def create_package_directory(self, source_dir, runtime: lambda_.Runtime = None, architecture: lambda_.Architecture = lambda_.Architecture.X86_64):
+        """
+        Installs the requirements of a Lambda asset directory into its `package` directory next to its sources.
+
+        When the directory has a requirements.lock (see scripts/lock_lambda_requirements.py) the locked wheels are
+        installed for the platform and architecture of the function from the local wheelhouse, without contacting
+        an index, otherwise requirements.txt is installed for the build machine. A failing install raises an error.
+        """
         # Check if the source directory exists
         if not os.path.exists(source_dir):
             raise Exception(f"Source directory {source_dir} does not exist.")
         
         package_dir = os.path.join(source_dir, "package")
         requirements_path = os.path.join(source_dir, "requirements.txt")
+        lock_path = os.path.join(source_dir, LOCK_FILE_NAME)
         hash_file_path = os.path.join(package_dir, "requirements.hash")
+        target = None
+        if os.path.exists(lock_path):
+            if runtime is None:
+                raise ValueError(f"{lock_path} needs the runtime of the function to install the wheels for")
+            target = WheelhouseTarget(runtime, architecture)
 
-        # Compute the current hash of requirements.txt
-        with open(requirements_path, "rb") as f:
-            current_hash = hashlib.sha256(f.read()).hexdigest()
+        # Compute the current hash of the requirements and the platform they are installed for
+        with open(lock_path if target else requirements_path, "rb") as f:
+            current_hash = hashlib.sha256(f.read() + (target.name.encode() if target else b"")).hexdigest()
 
         # Check if the package directory needs to be updated
+        stored_hash = None
         if os.path.exists(hash_file_path):
             with open(hash_file_path, "r") as f:
                 stored_hash = f.read().strip()
-            
-            if current_hash == stored_hash:
-                print("Packages are up-to-date.")
-                return package_dir
 
-        # If reaching here, packages need to be updated
-        print("Updating packages...")
+        if current_hash == stored_hash:
+            print("Packages are up-to-date.")
+        else:
+            print("Updating packages...")
 
-        if os.path.exists(package_dir):
-            # Remove the package directory and all its contents
-            shutil.rmtree(package_dir)
+            if os.path.exists(package_dir):
+                # Remove the package directory and all its contents
+                shutil.rmtree(package_dir)
 
-        # Create the package directory
-        os.makedirs(package_dir)
+            # Create the package directory
+            os.makedirs(package_dir)
 
-        # pip install the required packages
-        pip_command = "pip3" if sys.platform in ["linux", "darwin"] else "pip"
-        os.system(f"{pip_command} install -r {requirements_path} -t {package_dir}")
+            if target:
+                install_locked_requirements(lock_path, package_dir, target)
+            else:
+                run_pip(["install", "-r", requirements_path, "-t", package_dir])
 
-        # Save the current hash to the package directory
-        with open(hash_file_path, "w") as f:
-            f.write(current_hash)
+            # Save the current hash to the package directory
+            with open(hash_file_path, "w") as f:
+                f.write(current_hash)
 
-        # Copy the source files into the package directory
+        # Copy the source files into the package directory, they may change without the requirements
         for filename in os.listdir(source_dir):
             if filename.endswith(".py"):
                 shutil.copy(os.path.join(source_dir, filename), package_dir)
 
-        return package_dir
\ No newline at end of file
+        return package_dir
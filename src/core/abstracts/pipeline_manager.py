@@ -1,6 +1,11 @@
+import re
 from abc import ABC, abstractmethod
 from aws_cdk import (
     aws_codepipeline as codepipeline,
+    aws_codepipeline_actions as codepipeline_actions,
+    aws_codebuild as codebuild,
+    aws_ecr as ecr,
+    aws_s3_assets as s3_assets,
 )
 from aws_cdk.aws_s3 import Bucket
 from constructs import Construct
@@ -13,21 +18,152 @@ class AbstractPipelineManager(ABC):
         self.stage_manager: AbstractStageManager = None
         self._pipeline: codepipeline.Pipeline = None
 
-    def create_pipeline(self):
+    def create_pipeline(self, execution_mode: str = "SUPERSEDED"):
+        """
+        Creates a V2 pipeline. The CDK version in use does not expose pipeline types, execution modes or
+        triggers yet, so they are set on the underlying CfnPipeline.
+
+        :param execution_mode: SUPERSEDED, QUEUED or PARALLEL.
+        """
         self._pipeline = codepipeline.Pipeline(
             self.scope, f"RPA_{self.pipeline_name}",
             artifact_bucket=self.artifact_bucket,
             pipeline_name=self.pipeline_name
         )
+        cfn_pipeline: codepipeline.CfnPipeline = self._pipeline.node.default_child
+        cfn_pipeline.add_property_override("PipelineType", "V2")
+        cfn_pipeline.add_property_override("ExecutionMode", execution_mode)
 
     @abstractmethod
     def configure_pipeline(self):
         pass
     
 class AbstractStageManager(ABC):
+    # Name of the prebuilt CodeBuild image under src/cicd/assets/build_images used by this stage type
+    build_image_name: str = None
+
     def __init__(self, pipeline: codepipeline.Pipeline, scope: Construct):
         self._pipeline = pipeline
         self._scope = scope
+        self.check_artifacts: list = []
+        self._pipeline_scripts: s3_assets.Asset = None
+
+    def get_pipeline_scripts(self, repo) -> s3_assets.Asset:
+        """
+        Returns the zipped asset of the helper scripts under src/cicd/assets/scripts, created on first use.
+
+        :param repo: The repository being built.
+        """
+        if self._pipeline_scripts is None:
+            self._pipeline_scripts = s3_assets.Asset(self._scope, f"{repo.name}PipelineScripts", path="src/cicd/assets/scripts")
+        return self._pipeline_scripts
+
+    def get_build_image(self, repo, profile, lambda_image: str = "AMAZON_LINUX_2_PYTHON_3_11") -> codebuild.IBuildImage:
+        """
+        Returns the build image for a project of the repository running on the given compute profile.
+
+        Lambda compute only runs the curated Lambda images. Otherwise the prebuilt image for the profile's
+        architecture is used when an ECR repository is one of the repository's build dependencies, and the
+        CodeBuild standard image when it is not.
+
+        :param repo: The repository being built.
+        :param profile: The BuildComputeProfile of the project.
+        :param lambda_image: The curated Lambda image to use on Lambda compute, e.g. AMAZON_LINUX_2_NODE_18.
+        """
+        if profile.lambda_compute:
+            images = codebuild.LinuxArmLambdaBuildImage if profile.arm else codebuild.LinuxLambdaBuildImage
+            return getattr(images, lambda_image)
+        image_repository = repo.get_build_dependency_of_type(ecr.Repository)
+        if image_repository is not None:
+            images = codebuild.LinuxArmBuildImage if profile.arm else codebuild.LinuxBuildImage
+            return images.from_ecr_repository(image_repository, f"latest-{profile.architecture}")
+        return codebuild.LinuxArmBuildImage.AMAZON_LINUX_2_STANDARD_3_0 if profile.arm else codebuild.LinuxBuildImage.STANDARD_7_0
+
+    def create_build_environment(self, repo, profile, lambda_image: str = "AMAZON_LINUX_2_PYTHON_3_11") -> codebuild.BuildEnvironment:
+        """
+        Returns the build environment of a project of the repository running on the given compute profile.
+
+        :param repo: The repository being built.
+        :param profile: The BuildComputeProfile of the project.
+        :param lambda_image: The curated Lambda image to use on Lambda compute.
+        """
+        return codebuild.BuildEnvironment(
+            build_image=self.get_build_image(repo, profile, lambda_image),
+            compute_type=profile.compute_type,
+            privileged=profile.privileged
+        )
+
+    def create_install_phase(self, repo, profile, runtime_versions: dict, commands: list) -> dict:
+        """
+        Returns the install phase of a buildspec. `runtime-versions` is only supported by the CodeBuild standard
+        images, the prebuilt and Lambda images already ship their runtimes.
+
+        :param repo: The repository being built.
+        :param profile: The BuildComputeProfile of the project.
+        :param runtime_versions: The runtimes to select on the standard image.
+        :param commands: The install commands.
+        """
+        if profile.lambda_compute or repo.has_build_dependency_of_type(ecr.Repository):
+            return {"commands": commands}
+        return {"runtime-versions": runtime_versions, "commands": commands}
+
+    def create_check_actions(self, repo, create_project) -> list:
+        """
+        Returns the CodeBuild actions of the repository's build checks, to run in the build stage next to the
+        packaging build. The outputs of checks with `artifact_files` are collected in `check_artifacts` for the
+        deploy to merge.
+
+        :param repo: The repository being built.
+        :param create_project: Callable returning the PipelineProject of a BuildCheck.
+        """
+        actions = []
+        for check in repo.build_checks:
+            project = create_project(repo, check)
+            for shard in range(1, check.shards + 1):
+                action_name = f"{check.name}{shard}" if check.shards > 1 else check.name
+                outputs = []
+                if check.artifact_files:
+                    # Extra inputs are exposed as $CODEBUILD_SRC_DIR_<artifact name>, so the name must be a valid variable name
+                    artifact = codepipeline.Artifact(re.sub(r"\W", "_", f"{repo.name}_{action_name}Output"))
+                    self.check_artifacts.append(artifact)
+                    outputs.append(artifact)
+                actions.append(codepipeline_actions.CodeBuildAction(
+                    action_name=f"{repo.name}_{action_name}",
+                    project=project,
+                    input=repo.source_output,
+                    outputs=outputs,
+                    environment_variables={
+                        "SHARD_INDEX": codebuild.BuildEnvironmentVariable(value=str(shard)),
+                        "SHARD_COUNT": codebuild.BuildEnvironmentVariable(value=str(check.shards)),
+                    }
+                ))
+        return actions
+
+    def create_check_build_spec(self, check, install_phase: dict) -> codebuild.BuildSpec:
+        """
+        Returns the buildspec of a build check.
+
+        :param check: The BuildCheck to run.
+        :param install_phase: The install phase of the stage type, see create_install_phase.
+        """
+        build_spec = {
+            "version": "0.2",
+            "phases": {
+                "install": install_phase,
+                "build": {"commands": check.commands}
+            }
+        }
+        if check.report_files:
+            build_spec["reports"] = {check.name: {"files": check.report_files, "file-format": "JUNITXML"}}
+        if check.artifact_files:
+            build_spec["artifacts"] = {"files": check.artifact_files}
+        return codebuild.BuildSpec.from_object(build_spec)
+
+    def create_merge_commands(self) -> list:
+        """
+        Returns the commands copying the check artifacts into the primary input of a deploy project.
+        """
+        return [f'cp -R "$CODEBUILD_SRC_DIR_{artifact.artifact_name}/." .' for artifact in self.check_artifacts]
 
     @abstractmethod
     def add_source_stage(self, repo):
@@ -42,4 +178,7 @@ class AbstractStageManager(ABC):
         pass
     
     def add_deploy_stage(self):
+        raise NotImplementedError
+
+    def add_load_test_stage(self, repo):
         raise NotImplementedError
\ No newline at end of file
@@ -0,0 +1,13 @@
+from pydantic import BaseModel
+
+class ApiCacheRoute(BaseModel):
+    """
+    An idempotent GET route of the API that CloudFront may cache. TTLs are in seconds.
+
+    The cache key always includes every query string. Unless the route is `public`, it also includes the
+    Authorization header, so cached responses are only ever served to the caller that produced them.
+    """
+    path_pattern: str
+    default_ttl: int = 60
+    max_ttl: int = 300
+    public: bool = False
@@ -0,0 +1,19 @@
+from pydantic import BaseModel
+from typing import List, Optional
+from src.core.models.build_compute_profile import BuildComputeProfile
+
+class BuildCheck(BaseModel):
+    """
+    A quality gate running in parallel with the packaging build of a repository, e.g. unit tests or lint.
+
+    The check runs after the stage type's usual dependency install. With `shards` > 1 the check runs as that many
+    parallel actions with `SHARD_INDEX` (1-based) and `SHARD_COUNT` set, for the test runner to split the suite.
+    `report_files` are published as a JUnit report group. Files matching `artifact_files` are merged into the
+    build output before the deploy.
+    """
+    name: str
+    commands: List[str]
+    shards: int = 1
+    report_files: List[str] = []
+    artifact_files: List[str] = []
+    compute: Optional[BuildComputeProfile] = None
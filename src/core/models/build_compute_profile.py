@@ -0,0 +1,58 @@
+from pydantic import BaseModel, model_validator
+from typing import Optional
+from aws_cdk import aws_codebuild as codebuild, Duration
+
+# Lambda compute ends every build after 15 minutes, whatever the project timeout
+LAMBDA_COMPUTE_TIMEOUT_MINUTES = 15
+
+# Compute types available on ARM EC2 compute in the CDK version in use
+ARM_COMPUTE_TYPES = [codebuild.ComputeType.SMALL, codebuild.ComputeType.LARGE]
+
+class BuildComputeProfile(BaseModel):
+    """
+    Compute settings of a CodeBuild project.
+
+    `LAMBDA_*` compute types run the build on Lambda compute, which starts in seconds instead of provisioning an
+    EC2 instance but always times out after 15 minutes, has no build cache and no Docker, so `timeout_minutes`
+    only applies to EC2 compute. `arm` selects Graviton compute, which is cheaper per minute for the same class of
+    instance.
+    """
+    compute_type: codebuild.ComputeType = codebuild.ComputeType.SMALL
+    arm: bool = False
+    timeout_minutes: int = 60
+    privileged: bool = False
+
+    class Config:
+        arbitrary_types_allowed = True
+
+    @model_validator(mode="after")
+    def check_compute_type(self) -> "BuildComputeProfile":
+        if self.lambda_compute and self.privileged:
+            raise ValueError("Lambda compute does not support privileged mode")
+        if not self.lambda_compute and self.arm and self.compute_type not in ARM_COMPUTE_TYPES:
+            raise ValueError(f"ARM compute supports {', '.join(t.name for t in ARM_COMPUTE_TYPES)}, not {self.compute_type.name}")
+        return self
+
+    @property
+    def lambda_compute(self) -> bool:
+        return self.compute_type.name.startswith("LAMBDA_")
+
+    @property
+    def timeout(self) -> Optional[Duration]:
+        return None if self.lambda_compute else Duration.minutes(self.timeout_minutes)
+
+    @property
+    def max_runtime_seconds(self) -> int:
+        return LAMBDA_COMPUTE_TIMEOUT_MINUTES * 60 if self.lambda_compute else self.timeout_minutes * 60
+
+    @property
+    def architecture(self) -> str:
+        return "arm64" if self.arm else "amd64"
+
+    @classmethod
+    def heavy(cls) -> "BuildComputeProfile":
+        return cls(compute_type=codebuild.ComputeType.LARGE, arm=True, timeout_minutes=30)
+
+    @classmethod
+    def lambda_(cls, compute_type: codebuild.ComputeType = codebuild.ComputeType.LAMBDA_1GB) -> "BuildComputeProfile":
+        return cls(compute_type=compute_type)
@@ -0,0 +1,45 @@
+from pydantic import BaseModel
+from typing import Optional
+
+# Extensions the web build precompresses and the viewer-request function rewrites to .br/.gz variants
+PRECOMPRESSED_EXTENSIONS = [".js", ".mjs", ".css", ".html", ".json", ".svg", ".txt", ".xml", ".map", ".webmanifest"]
+
+class CacheProfile(BaseModel):
+    """
+    Edge caching profile for the website distribution. TTLs are in seconds.
+
+    `asset_*` TTLs apply to the content-hashed Nuxt bundles under `/_nuxt/*`, which never change once
+    published. `html_*` TTLs apply to HTML documents, route payloads (`_payload.json`) and build manifests.
+    `serve_precompressed` rewrites requests to the Brotli/gzip variants emitted by the web build.
+    `origin_shield` adds an Origin Shield layer in `origin_shield_region`, defaulting to the bucket's region.
+    """
+    name: str
+    asset_path_pattern: str = "/_nuxt/*"
+    asset_min_ttl: int = 86400
+    asset_default_ttl: int = 31536000
+    asset_max_ttl: int = 31536000
+    html_min_ttl: int = 0
+    html_default_ttl: int = 60
+    html_max_ttl: int = 300
+    enable_compression: bool = True
+    serve_precompressed: bool = True
+    origin_shield: bool = False
+    origin_shield_region: Optional[str] = None
+
+    @classmethod
+    def development(cls) -> "CacheProfile":
+        return cls(name="development", html_default_ttl=0, html_max_ttl=60)
+
+    @classmethod
+    def production(cls) -> "CacheProfile":
+        return cls(name="production", html_default_ttl=300, html_max_ttl=3600, origin_shield=True)
+
+    @classmethod
+    def for_environment(cls, environment: str) -> "CacheProfile":
+        profiles = {
+            "development": cls.development,
+            "production": cls.production,
+        }
+        if environment not in profiles:
+            raise ValueError(f"No cache profile defined for environment '{environment}'")
+        return profiles[environment]()
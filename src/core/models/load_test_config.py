@@ -0,0 +1,36 @@
+from pydantic import BaseModel
+from typing import Literal, Optional
+from src.core.models.build_compute_profile import BuildComputeProfile
+
+class LoadTest(BaseModel):
+    """
+    A scripted load test run against the deployed API after the deploy of a repository.
+
+    `scenario` is the k6 script or locustfile in the application repository. It is run with `users` virtual users
+    for `duration_seconds` against the base URL of the API, which k6 scripts read from `__ENV.BASE_URL` and
+    locustfiles receive as the host. The pipeline fails when a latency percentile or the error rate is above its
+    budget or the throughput is below `min_throughput_rps`; budgets left unset are only reported.
+    """
+    scenario: str
+    tool: Literal["k6", "locust"] = "k6"
+    users: int = 10
+    duration_seconds: int = 60
+    p50_budget_ms: Optional[float] = None
+    p95_budget_ms: Optional[float] = None
+    p99_budget_ms: Optional[float] = None
+    min_throughput_rps: Optional[float] = None
+    max_error_rate_percent: Optional[float] = 1
+    compute: BuildComputeProfile = BuildComputeProfile()
+
+    def budget_arguments(self) -> str:
+        """
+        Returns the budget options of load_testing.py for the budgets that are set.
+        """
+        budgets = {
+            "--p50-budget-ms": self.p50_budget_ms,
+            "--p95-budget-ms": self.p95_budget_ms,
+            "--p99-budget-ms": self.p99_budget_ms,
+            "--min-throughput-rps": self.min_throughput_rps,
+            "--max-error-rate-percent": self.max_error_rate_percent,
+        }
+        return " ".join(f"{option} {value}" for option, value in budgets.items() if value is not None)
@@ -0,0 +1,39 @@
+from pydantic import BaseModel
+from typing import Dict, List, Optional
+from aws_cdk import Aws
+
+class MediaUploadSettings(BaseModel):
+    """
+    Settings of the media uploads bucket shared by the stack that owns the bucket and the stack that owns the API
+    function minting the presigned URLs.
+
+    The bucket name is built from pseudo parameters, so both stacks resolve it without a reference to each other.
+
+    Browsers may only upload from the website, `website_domain`. Uploads from any origin need `allow_any_origin`.
+    """
+    bucket_prefix: str = "rpa-dev-media-uploads"
+    key_prefix: str = "uploads/"
+    transfer_acceleration: bool = False
+    incomplete_upload_days: int = 1
+    website_domain: Optional[str] = None
+    allow_any_origin: bool = False
+
+    @property
+    def bucket_name(self) -> str:
+        return f"{self.bucket_prefix}-{Aws.ACCOUNT_ID}-{Aws.REGION}"
+
+    @property
+    def cors_allowed_origins(self) -> List[str]:
+        if self.allow_any_origin:
+            return ["*"]
+        return [f"https://{self.website_domain}"] if self.website_domain else []
+
+    def lambda_environment(self) -> Dict[str, str]:
+        """
+        Returns the environment variables the API function reads the upload settings from.
+        """
+        return {
+            "MEDIA_UPLOAD_BUCKET": self.bucket_name,
+            "MEDIA_UPLOAD_PREFIX": self.key_prefix,
+            "MEDIA_UPLOAD_ACCELERATE": "true" if self.transfer_acceleration else "false",
+        }
@@ -0,0 +1,32 @@
+from pydantic import BaseModel
+from typing import List, Optional
+
+class PageWeightBudget(BaseModel):
+    """
+    Page weight budgets of the web build. Sizes are in kB as transferred, i.e. the Brotli variant for
+    precompressed files and the file itself for everything else.
+
+    Each route in `routes` is weighed by its HTML document and the scripts, stylesheets and images it references.
+    The `max_route_*` budgets apply to every route. On top of the budgets the build fails when the weight of a
+    route or the total size of a category in the output grows by more than `max_regression_percent` over the
+    report of the previous build.
+    """
+    routes: List[str] = ["/"]
+    max_route_total_kb: Optional[float] = None
+    max_route_js_kb: Optional[float] = None
+    max_route_css_kb: Optional[float] = None
+    max_route_image_kb: Optional[float] = None
+    max_regression_percent: Optional[float] = 10
+
+    def budget_arguments(self) -> str:
+        """
+        Returns the budget options of page_weight_report.py for the budgets that are set.
+        """
+        budgets = {
+            "--max-total-kb": self.max_route_total_kb,
+            "--max-js-kb": self.max_route_js_kb,
+            "--max-css-kb": self.max_route_css_kb,
+            "--max-image-kb": self.max_route_image_kb,
+            "--max-regression-percent": self.max_regression_percent,
+        }
+        return " ".join(f"{option} {value}" for option, value in budgets.items() if value is not None)
@@ -1,6 +1,10 @@
 from pydantic import BaseModel
-from typing import Type, Optional, List, Any
-from src.cicd.pipeline_manager import AbstractStageManager
+from typing import Type, Optional, List, Any, Literal
+from src.core.abstracts.pipeline_manager import AbstractStageManager
+from src.core.models.build_compute_profile import BuildComputeProfile
+from src.core.models.build_check import BuildCheck
+from src.core.models.load_test_config import LoadTest
+from src.core.models.page_weight_budget import PageWeightBudget
 from aws_cdk.aws_codepipeline import Artifact
 
 class Repository(BaseModel):
@@ -9,6 +13,7 @@ class Repository(BaseModel):
     repo_name: str
     branch: str
     deployable: bool
+    requires_approval: bool = True
     stageType: Type[AbstractStageManager]
     code_star_connection_arn: str
     source_output: Artifact = None
@@ -17,6 +22,23 @@ class Repository(BaseModel):
     build_project_name: str = None
     pipeline_name: str = None
     build_dependencies: List[Any] = []
+    warm_routes: List[str] = []
+    warm_from_sitemap: bool = False
+    execution_mode: Literal["SUPERSEDED", "QUEUED", "PARALLEL"] = "SUPERSEDED"
+    trigger_branches: List[str] = []
+    trigger_excluded_branches: List[str] = []
+    trigger_file_paths: List[str] = []
+    trigger_excluded_file_paths: List[str] = []
+    build_compute: BuildComputeProfile = BuildComputeProfile()
+    deploy_compute: BuildComputeProfile = BuildComputeProfile()
+    build_checks: List[BuildCheck] = []
+    # How the middle tier deployment package reaches Lambda: uploaded with the API call (zip, at most 50 MB),
+    # staged in the artifact bucket (s3) or as a container image in ECR (image, needs an image-based function)
+    lambda_package: Literal["zip", "s3", "image"] = "zip"
+    # Run against the deployed API in a stage after the deploy, only supported by the middle tier
+    load_test: Optional[LoadTest] = None
+    # Checked by the web build against the generated site, only supported by the website
+    page_weight_budget: Optional[PageWeightBudget] = None
     
     class Config:
         arbitrary_types_allowed = True
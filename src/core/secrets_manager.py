@@ -1,28 +1,60 @@
 import json
+from contextlib import contextmanager
 from datetime import datetime, timedelta
 from cryptography.fernet import Fernet
-from typing import Dict, Optional
-import os
+from typing import Dict, Iterator, Optional
+import os, tempfile
+from secrets import token_urlsafe
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
 
 class SecretManager:
+    """
+    Fernet-encrypted secrets stored in secrets.json, with the key in secret.key.
+
+    The files are only read when a secret is first used. Changes are written atomically (a temporary file renamed
+    over secrets.json) under an exclusive lock on secrets.json.lock, so concurrent synths neither corrupt the file
+    nor lose each other's updates. Group several changes in `transaction()` to write them once.
+    """
     def __init__(self) -> None:
         # load password from dotenv
         password = os.getenv("SECRET_MANAGER_PASSWORD")
         self.secret_file = "secrets.json"
         self.key_file = "secret.key"
-        self.cipher = self.init_cipher()
+        self.lock_file = self.secret_file + ".lock"
         self.password = password  # Consider using this to further secure the key storage
-        self.secrets = {}
-        self.load_secrets()
+        self._cipher: Optional[Fernet] = None
+        self._secrets: Optional[Dict[str, dict]] = None
+        self._decrypted: Dict[str, str] = {}
+        self._lock_handle = None
+        self._lock_depth = 0
+        self._transaction_depth = 0
+
+    @property
+    def cipher(self) -> Fernet:
+        if self._cipher is None:
+            self._cipher = self.init_cipher()
+        return self._cipher
+
+    @property
+    def secrets(self) -> Dict[str, dict]:
+        if self._secrets is None:
+            self.load_secrets()
+        return self._secrets
 
     def init_cipher(self):
-        if os.path.exists(self.key_file):
-            with open(self.key_file, 'rb') as keyfile:
-                key = keyfile.read()
-        else:
-            key = Fernet.generate_key()
-            with open(self.key_file, 'wb') as keyfile:
-                keyfile.write(key)
+        if not os.path.exists(self.key_file):
+            # Another synth may be creating the key at the same time, only one of them must write it
+            with self.locked():
+                if not os.path.exists(self.key_file):
+                    with open(self.key_file, 'wb') as keyfile:
+                        keyfile.write(Fernet.generate_key())
+        with open(self.key_file, 'rb') as keyfile:
+            key = keyfile.read()
         return Fernet(key)
 
     def encrypt(self, message: str) -> str:
@@ -31,41 +63,123 @@ class SecretManager:
     def decrypt(self, token: str) -> str:
         return self.cipher.decrypt(token.encode()).decode()
 
+    @contextmanager
+    def transaction(self) -> Iterator["SecretManager"]:
+        """
+        Applies the secrets generated and updated inside the block with a single write of secrets.json when it
+        exits, and discards them when it raises. The file is locked and reloaded for the whole block, so the
+        changes are made to its latest content. Nested transactions are written by the outermost one.
+        """
+        with self.locked():
+            if self._transaction_depth == 0:
+                self.load_secrets()
+            self._transaction_depth += 1
+            try:
+                yield self
+            except BaseException:
+                if self._transaction_depth == 1:
+                    self._secrets = None
+                    self._decrypted.clear()
+                raise
+            else:
+                if self._transaction_depth == 1:
+                    self.save_secrets()
+            finally:
+                self._transaction_depth -= 1
+
     def generate_secret(self, key: str, secret: str) -> None:
-        now = datetime.now().isoformat()
-        self.secrets[key] = {
-            'secret': self.encrypt(secret),
-            'created': now,
-            'updated': now
-        }
-        self.save_secrets()
+        with self.transaction():
+            now = datetime.now().isoformat()
+            self.secrets[key] = {
+                'secret': self.encrypt(secret),
+                'created': now,
+                'updated': now
+            }
+            self._decrypted.pop(key, None)
+
+    def get_or_generate_secret(self, key: str, length: int = 32) -> str:
+        """
+        Returns the secret, generating a random URL-safe value for it first when it does not exist yet.
+        """
+        if key not in self._decrypted and key not in self.secrets:
+            with self.transaction():
+                # Another synth may have generated it since the file was loaded
+                if key not in self.secrets:
+                    self.generate_secret(key, token_urlsafe(length))
+        return self.get_secret(key)
 
     def get_secret(self, key: str) -> Optional[str]:
+        if key in self._decrypted:
+            return self._decrypted[key]
         data = self.secrets.get(key)
         if data:
-            return self.decrypt(data['secret'])
+            self._decrypted[key] = self.decrypt(data['secret'])
+            return self._decrypted[key]
         else:
             raise KeyError(f"Secret '{key}' not found!")
 
     def update_secret(self, key: str, secret: str) -> None:
-        now = datetime.now().isoformat()
-        if key in self.secrets:
-            self.secrets[key]['secret'] = self.encrypt(secret)
-            self.secrets[key]['updated'] = now
-            self.save_secrets()
-        else:
-            raise KeyError(f"Secret '{key}' not found!")
+        with self.transaction():
+            now = datetime.now().isoformat()
+            if key in self.secrets:
+                self.secrets[key]['secret'] = self.encrypt(secret)
+                self.secrets[key]['updated'] = now
+                self._decrypted.pop(key, None)
+            else:
+                raise KeyError(f"Secret '{key}' not found!")
 
     def save_secrets(self) -> None:
-        with open(self.secret_file, 'w') as f:
-            json.dump(self.secrets, f)
+        # Write next to secrets.json and rename over it, readers see either the old or the new file
+        directory = os.path.dirname(os.path.abspath(self.secret_file))
+        fd, temp_path = tempfile.mkstemp(prefix=".secrets.", suffix=".tmp", dir=directory)
+        try:
+            with os.fdopen(fd, 'w') as f:
+                json.dump(self.secrets, f)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(temp_path, self.secret_file)
+        except BaseException:
+            os.remove(temp_path)
+            raise
 
     def load_secrets(self) -> None:
+        self._decrypted.clear()
         try:
             with open(self.secret_file, 'r') as f:
-                self.secrets = json.load(f)
+                self._secrets = json.load(f)
         except FileNotFoundError:
-            self.secrets = {}
+            self._secrets = {}
+
+    @contextmanager
+    def locked(self) -> Iterator[None]:
+        """
+        Holds an exclusive lock on secrets.json.lock, reentrant within this manager.
+        """
+        if self._lock_depth == 0:
+            handle = open(self.lock_file, 'a+')
+            try:
+                if fcntl:
+                    fcntl.flock(handle, fcntl.LOCK_EX)
+                else:
+                    handle.seek(0)
+                    msvcrt.locking(handle.fileno(), msvcrt.LK_LOCK, 1)
+            except BaseException:
+                handle.close()
+                raise
+            self._lock_handle = handle
+        self._lock_depth += 1
+        try:
+            yield
+        finally:
+            self._lock_depth -= 1
+            if self._lock_depth == 0:
+                handle, self._lock_handle = self._lock_handle, None
+                if fcntl:
+                    fcntl.flock(handle, fcntl.LOCK_UN)
+                else:
+                    handle.seek(0)
+                    msvcrt.locking(handle.fileno(), msvcrt.LK_UNLCK, 1)
+                handle.close()
 
     def warn_if_outdated(self, key: str, days: int = 90) -> None:
         data = self.secrets.get(key)
@@ -78,4 +192,7 @@ class SecretManager:
 if __name__ == "__main__":
     sm = SecretManager()
     #print(sm.get_secret("REFERER_SECRET"))
-    #sm.generate_secret("REFERER_SECRET", "my_secret")
\ No newline at end of file
+    #sm.generate_secret("REFERER_SECRET", "my_secret")
+    #with sm.transaction():
+    #    sm.update_secret("REFERER_SECRET", "my_secret")
+    #    sm.update_secret("OTHER_SECRET", "other_secret")
@@ -0,0 +1,95 @@
+"""
+Stack registry -- instantiates stacks on first use, so an app only builds the stacks it is asked for
+"""
+from typing import Callable, Dict, List, Type
+from aws_cdk import Stack
+
+class StackRegistry:
+    """
+    Lazily created stacks of an app, keyed by stack id.
+
+    Every stack declares the stacks it depends on when it is registered. They are created before its factory
+    runs, which receives the registry and gets them with `get`. `build` therefore instantiates the selected stacks
+    together with their dependency closure and nothing else.
+    """
+    def __init__(self):
+        self._factories: Dict[str, Callable[["StackRegistry"], Stack]] = {}
+        self._stack_types: Dict[str, Type[Stack]] = {}
+        self._dependencies: Dict[str, List[str]] = {}
+        self._stacks: Dict[str, Stack] = {}
+        self._building: List[str] = []
+
+    def register(self, stack_id: str, factory: Callable[["StackRegistry"], Stack], stack_type: Type[Stack], dependencies: List[str] = []):
+        """
+        Registers the factory of a stack.
+
+        :param stack_id: The id of the stack.
+        :param factory: Creates the stack, given the registry.
+        :param stack_type: The class of the stack, whose module is the root of the stack's source.
+        :param dependencies: Ids of the stacks the factory gets from the registry.
+        """
+        if stack_id in self._factories:
+            raise ValueError(f"Stack {stack_id} is already registered")
+        unknown = [dependency for dependency in dependencies if dependency not in self._factories]
+        if unknown:
+            raise ValueError(f"Stack {stack_id} depends on {', '.join(unknown)}, which must be registered first")
+        self._factories[stack_id] = factory
+        self._stack_types[stack_id] = stack_type
+        self._dependencies[stack_id] = list(dependencies)
+
+    def get(self, stack_id: str) -> Stack:
+        """
+        Returns the stack, creating it and the stacks it depends on on first use.
+        """
+        if stack_id not in self._factories:
+            raise KeyError(f"Unknown stack {stack_id}, expected one of {', '.join(self._factories)}")
+        if self._building and stack_id not in self._dependencies[self._building[-1]]:
+            raise ValueError(f"Stack {self._building[-1]} gets {stack_id} without declaring it as a dependency")
+        if stack_id not in self._stacks:
+            for dependency in self._dependencies[stack_id]:
+                self._building.append(stack_id)
+                try:
+                    self.get(dependency)
+                finally:
+                    self._building.pop()
+            self._building.append(stack_id)
+            try:
+                self._stacks[stack_id] = self._factories[stack_id](self)
+            finally:
+                self._building.pop()
+        return self._stacks[stack_id]
+
+    def build(self, selection: List[str] = None) -> List[Stack]:
+        """
+        Creates the selected stacks and their dependencies, every registered stack without a selection.
+
+        :param selection: Ids of the stacks to create.
+        """
+        return [self.get(stack_id) for stack_id in (self.stack_ids if selection is None else selection)]
+
+    def closure(self, stack_ids: List[str]) -> List[str]:
+        """
+        Returns the ids of the given stacks and the stacks they depend on, in registration order.
+        """
+        pending, closure = list(stack_ids), set()
+        while pending:
+            stack_id = pending.pop()
+            if stack_id not in self._factories:
+                raise KeyError(f"Unknown stack {stack_id}, expected one of {', '.join(self._factories)}")
+            if stack_id not in closure:
+                closure.add(stack_id)
+                pending.extend(self._dependencies[stack_id])
+        return [stack_id for stack_id in self._factories if stack_id in closure]
+
+    def dependencies_of(self, stack_id: str) -> List[str]:
+        return self._dependencies[stack_id]
+
+    def stack_type_of(self, stack_id: str) -> Type[Stack]:
+        return self._stack_types[stack_id]
+
+    def is_built(self, stack_id: str) -> bool:
+        return stack_id in self._stacks
+
+    @property
+    def stack_ids(self) -> List[str]:
+        return list(self._factories)
@@ -0,0 +1,263 @@
+"""
+Synth cache -- reuses the synthesized templates and asset manifests of stacks whose inputs did not change
+"""
+import ast
+import hashlib
+import importlib.metadata
+import json
+import os
+import shutil
+import sys
+from typing import Dict, List, Optional
+from aws_cdk import App, cx_api
+from scripts.load_env import environment_file
+from src.core.stack_registry import StackRegistry
+
+# Files outside the stack sources that every stack is synthesized from
+ROOT_INPUT_FILES = ["app.py", "cdk.json", "cdk.context.json", "scripts/load_env.py", "secrets.json", "secret.key"]
+
+# Environment variables read while the stacks are constructed
+INPUT_ENVIRONMENT_VARIABLES = ["AWS_ACCOUNT_ID", "AWS_REGION", "ENVIRONMENT", "SECRET_MANAGER_PASSWORD", "WEBSITE_DOMAIN", "CDK_DEFAULT_ACCOUNT", "CDK_DEFAULT_REGION"]
+
+# Packages whose version changes the synthesized output
+INPUT_PACKAGES = ["aws-cdk-lib", "constructs", "cdk-fck-nat"]
+
+# Context keys controlling the app itself rather than the stacks
+IGNORED_CONTEXT_KEYS = ["stacks", "synth_cache"]
+
+# Directories under an assets directory that are generated from its other files, e.g. by create_package_directory
+GENERATED_ASSET_DIRECTORIES = ["package", "__pycache__", "node_modules"]
+
+class SynthCache:
+    """
+    Per-stack cache of synthesized templates, asset manifests and staged assets, keyed by a fingerprint of the
+    stack's inputs.
+
+    The fingerprint of a stack covers its source modules (the transitive `src` imports of its module), the
+    `assets` directories next to them, the root input files, the environment and context of the app, the versions
+    of the CDK packages, the fingerprints of the stacks it depends on and the stacks synthesized with it that
+    depend on it.
+
+    Modes, selected with `-c synth_cache=<mode>`:
+    - off: every stack is constructed, nothing is cached.
+    - on: stacks whose fingerprint matches their cache entry are not constructed and their cached output is put
+      into the cloud assembly instead. A constructed stack also needs every stack consuming its exports to be
+      constructed, so only stacks that nothing constructed depends on can be reused.
+    - verify: every stack is constructed and the output of stacks with a matching fingerprint must be
+      byte-identical to their cache entry, otherwise the synth fails.
+    """
+    MODES = ["off", "on", "verify"]
+
+    def __init__(self, registry: StackRegistry, mode: str = "off", cache_dir: str = ".synth-cache"):
+        if mode not in self.MODES:
+            raise ValueError(f"Unknown synth cache mode {mode}, expected one of {', '.join(self.MODES)}")
+        self.registry = registry
+        self.mode = mode
+        self.cache_dir = cache_dir
+        self.fingerprints: Dict[str, str] = {}
+        self.reused: List[str] = []
+
+    @classmethod
+    def from_context(cls, app: App, registry: StackRegistry) -> "SynthCache":
+        return cls(registry, mode=app.node.try_get_context("synth_cache") or "off")
+
+    def plan(self, app: App, selection: Optional[List[str]]) -> List[str]:
+        """
+        Returns the ids of the stacks to construct for a selection, None selecting every stack.
+        """
+        stack_ids = self.registry.closure(self.registry.stack_ids if selection is None else selection)
+        if self.mode == "off":
+            return stack_ids
+
+        shared_inputs = self.hash_shared_inputs(app)
+        for stack_id in stack_ids:
+            digest = hashlib.sha256(shared_inputs.encode())
+            digest.update(self.hash_stack_sources(stack_id).encode())
+            for dependency in self.registry.dependencies_of(stack_id):
+                digest.update(self.fingerprints[dependency].encode())
+            # The exports of a stack depend on which of its consumers are synthesized with it
+            for dependent in stack_ids:
+                if stack_id in self.registry.dependencies_of(dependent):
+                    digest.update(dependent.encode())
+            self.fingerprints[stack_id] = digest.hexdigest()
+        if self.mode == "verify":
+            return stack_ids
+
+        construct = {stack_id for stack_id in stack_ids if self.read_entry(stack_id, self.fingerprints[stack_id]) is None}
+        while True:
+            required = set(self.registry.closure(list(construct)))
+            # A stack is synthesized with exports only for the consumers constructed next to it
+            required |= {stack_id for stack_id in stack_ids if set(self.registry.dependencies_of(stack_id)) & required}
+            if required == construct:
+                break
+            construct = required
+        self.reused = [stack_id for stack_id in stack_ids if stack_id not in construct]
+        return [stack_id for stack_id in stack_ids if stack_id in construct]
+
+    def complete(self, assembly: cx_api.CloudAssembly):
+        """
+        Adds the reused stacks to the synthesized cloud assembly and caches the constructed ones. In verify mode
+        raises an error when a constructed stack differs from its cache entry.
+        """
+        if self.mode == "off":
+            return
+        outdir = assembly.directory
+        manifest_file = os.path.join(outdir, "manifest.json")
+        with open(manifest_file) as f:
+            manifest = json.load(f)
+
+        mismatches = []
+        for stack_id, fingerprint in self.fingerprints.items():
+            if stack_id in self.reused:
+                entry = self.read_entry(stack_id, fingerprint)
+                self.restore_files(stack_id, entry["files"], outdir)
+                manifest["artifacts"].update(entry["artifacts"])
+                print(f"Reused the cached synth of {stack_id}")
+                continue
+            if not self.registry.is_built(stack_id):
+                continue
+            artifacts, files = self.collect_stack_output(manifest, stack_id, outdir)
+            if self.mode == "verify":
+                entry = self.read_entry(stack_id, fingerprint)
+                if entry is not None:
+                    mismatches += [f"{stack_id}: {name}" for name in entry["compared_files"] if not self.matches_cache(stack_id, name, outdir)]
+            self.write_entry(stack_id, fingerprint, artifacts, files, outdir)
+
+        with open(manifest_file, "w") as f:
+            json.dump(manifest, f, indent=2)
+        if mismatches:
+            raise RuntimeError("Cached synth output differs from a fresh synth with the same inputs:\n" + "\n".join(mismatches))
+        if self.mode == "verify":
+            print("Cached synth output matches a fresh synth")
+
+    def hash_shared_inputs(self, app: App) -> str:
+        digest = hashlib.sha256()
+        for path in [*ROOT_INPUT_FILES, environment_file()]:
+            digest.update(path.encode())
+            digest.update(self.hash_file(path).encode())
+        for name in INPUT_ENVIRONMENT_VARIABLES:
+            digest.update(f"{name}={os.getenv(name)}".encode())
+        for package in INPUT_PACKAGES:
+            digest.update(f"{package}=={importlib.metadata.version(package)}".encode())
+        context = {key: value for key, value in app.node.get_all_context().items() if key not in IGNORED_CONTEXT_KEYS}
+        digest.update(json.dumps(context, sort_keys=True, default=str).encode())
+        digest.update(sys.version.encode())
+        return digest.hexdigest()
+
+    def hash_stack_sources(self, stack_id: str) -> str:
+        digest = hashlib.sha256()
+        modules = self.find_source_modules(self.registry.stack_type_of(stack_id).__module__)
+        asset_dirs = sorted({asset_dir for asset_dir in (os.path.join(os.path.dirname(path), "assets") for path in modules) if os.path.isdir(asset_dir)})
+        for path in sorted(modules) + [file for asset_dir in asset_dirs for file in self.list_asset_files(asset_dir)]:
+            digest.update(path.encode())
+            digest.update(self.hash_file(path).encode())
+        return digest.hexdigest()
+
+    def find_source_modules(self, module: str) -> List[str]:
+        """
+        Returns the files of a module and of the `src` modules it imports, transitively.
+        """
+        pending, paths = [module], set()
+        while pending:
+            path = self.module_path(pending.pop())
+            if path is None or path in paths:
+                continue
+            paths.add(path)
+            with open(path) as f:
+                tree = ast.parse(f.read(), filename=path)
+            for node in ast.walk(tree):
+                if isinstance(node, ast.Import):
+                    pending += [alias.name for alias in node.names]
+                elif isinstance(node, ast.ImportFrom) and node.module:
+                    # `from package import name` may import a submodule
+                    pending += [node.module, *(f"{node.module}.{alias.name}" for alias in node.names)]
+        return sorted(paths)
+
+    def module_path(self, module: str) -> Optional[str]:
+        if not module.startswith("src."):
+            return None
+        base = module.replace(".", os.sep)
+        for path in [f"{base}.py", os.path.join(base, "__init__.py")]:
+            if os.path.isfile(path):
+                return path
+        return None
+
+    def list_asset_files(self, asset_dir: str) -> List[str]:
+        files = []
+        for root, dirs, names in os.walk(asset_dir):
+            dirs[:] = sorted(name for name in dirs if name not in GENERATED_ASSET_DIRECTORIES)
+            files += [os.path.join(root, name) for name in sorted(names)]
+        return files
+
+    def hash_file(self, path: str) -> str:
+        if not os.path.isfile(path):
+            return "missing"
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    def collect_stack_output(self, manifest: dict, stack_id: str, outdir: str):
+        """
+        Returns the manifest artifacts of a stack and its asset manifest, and the files in the assembly they refer to.
+        """
+        stack_artifact = manifest["artifacts"][stack_id]
+        artifacts = {stack_id: stack_artifact}
+        files = [stack_artifact["properties"]["templateFile"]]
+        for dependency in stack_artifact.get("dependencies", []):
+            artifact = manifest["artifacts"][dependency]
+            if artifact["type"] != "cdk:asset-manifest":
+                continue
+            artifacts[dependency] = artifact
+            files.append(artifact["properties"]["file"])
+            with open(os.path.join(outdir, artifact["properties"]["file"])) as f:
+                asset_manifest = json.load(f)
+            files += [asset["source"]["path"] for asset in asset_manifest.get("files", {}).values() if asset["source"].get("path")]
+            files += [asset["source"]["directory"] for asset in asset_manifest.get("dockerImages", {}).values() if asset["source"].get("directory")]
+        return artifacts, list(dict.fromkeys(files))
+
+    def entry_dir(self, stack_id: str) -> str:
+        return os.path.join(self.cache_dir, stack_id)
+
+    def read_entry(self, stack_id: str, fingerprint: str) -> Optional[dict]:
+        entry_file = os.path.join(self.entry_dir(stack_id), "entry.json")
+        if not os.path.isfile(entry_file):
+            return None
+        with open(entry_file) as f:
+            entry = json.load(f)
+        if entry["fingerprint"] != fingerprint:
+            return None
+        if not all(os.path.exists(os.path.join(self.entry_dir(stack_id), "files", name)) for name in entry["files"]):
+            return None
+        return entry
+
+    def write_entry(self, stack_id: str, fingerprint: str, artifacts: dict, files: List[str], outdir: str):
+        entry_dir = self.entry_dir(stack_id)
+        shutil.rmtree(entry_dir, ignore_errors=True)
+        for name in files:
+            self.copy(os.path.join(outdir, name), os.path.join(entry_dir, "files", name))
+        with open(os.path.join(entry_dir, "entry.json"), "w") as f:
+            json.dump({
+                "fingerprint": fingerprint,
+                "artifacts": artifacts,
+                "files": files,
+                # Staged assets are named by their content hash, the manifests are what a fresh synth must reproduce
+                "compared_files": [name for name in files if name.endswith(".json")],
+            }, f, indent=2)
+
+    def restore_files(self, stack_id: str, files: List[str], outdir: str):
+        for name in files:
+            target = os.path.join(outdir, name)
+            if not os.path.exists(target):
+                self.copy(os.path.join(self.entry_dir(stack_id), "files", name), target)
+
+    def matches_cache(self, stack_id: str, name: str, outdir: str) -> bool:
+        return self.hash_file(os.path.join(outdir, name)) == self.hash_file(os.path.join(self.entry_dir(stack_id), "files", name))
+
+    def copy(self, source: str, target: str):
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        if os.path.isdir(source):
+            shutil.copytree(source, target, symlinks=True)
+        else:
+            shutil.copy2(source, target)
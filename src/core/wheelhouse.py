@@ -0,0 +1,113 @@
+"""
+Wheelhouse -- reproducible, offline installs of Lambda dependencies from a pinned lock and a local wheel cache
+"""
+import os
+import re
+import subprocess
+import sys
+from typing import List
+from aws_cdk import aws_lambda as lambda_
+
+LOCK_FILE_NAME = "requirements.lock"
+
+# Wheels are cached per target under this directory, LAMBDA_WHEELHOUSE overrides it
+DEFAULT_WHEELHOUSE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "pap-cdk", "wheelhouse")
+
+class WheelhouseTarget:
+    """
+    The interpreter and platform a Lambda function runs its dependencies on.
+
+    Runtimes up to Python 3.11 run on Amazon Linux 2, which only loads manylinux2014 wheels. Later runtimes run on
+    Amazon Linux 2023 and also load manylinux_2_28 wheels.
+    """
+    def __init__(self, runtime: lambda_.Runtime, architecture: lambda_.Architecture = lambda_.Architecture.X86_64):
+        if not runtime.name.startswith("python"):
+            raise ValueError(f"Wheelhouse installs need a Python runtime, not {runtime.name}")
+        self.python_version = runtime.name[len("python"):]
+        self.machine = "aarch64" if architecture.name == lambda_.Architecture.ARM_64.name else "x86_64"
+        self.platform_tags = ["manylinux2014"]
+        if tuple(int(part) for part in self.python_version.split(".")) >= (3, 12):
+            self.platform_tags.append("manylinux_2_28")
+
+    @property
+    def name(self) -> str:
+        return f"python{self.python_version}-{self.machine}"
+
+    @property
+    def platforms(self) -> List[str]:
+        return [f"{tag}_{self.machine}" for tag in self.platform_tags]
+
+    @property
+    def uv_platform(self) -> str:
+        # uv also accepts the wheels of older manylinux tags than the one it resolves for
+        return f"{self.machine}-{self.platform_tags[-1]}"
+
+    def pip_arguments(self) -> List[str]:
+        arguments = ["--only-binary=:all:", "--implementation", "cp", "--python-version", self.python_version]
+        for platform in self.platforms:
+            arguments += ["--platform", platform]
+        return arguments
+
+def run_pip(arguments: List[str]):
+    """
+    Runs pip with the running interpreter and raises CalledProcessError when it fails.
+    """
+    subprocess.run([sys.executable, "-m", "pip", *arguments], check=True)
+
+def lock_requirements(source_dir: str, target: WheelhouseTarget) -> str:
+    """
+    Resolves the requirements.txt of a Lambda asset directory for the target and writes every resolved package,
+    pinned with the hashes of its distributions, to requirements.lock next to it.
+
+    pip evaluates environment markers against the running interpreter even with --python-version, so the lock is
+    resolved with uv, which evaluates them for the target interpreter and platform.
+
+    :param source_dir: The Lambda asset directory.
+    :param target: The target the wheels must run on.
+    :returns: The path of the lock file.
+    """
+    lock_path = os.path.join(source_dir, LOCK_FILE_NAME)
+    try:
+        result = subprocess.run([
+            sys.executable, "-m", "uv", "pip", "compile", os.path.join(source_dir, "requirements.txt"),
+            "--python-version", target.python_version, "--python-platform", target.uv_platform,
+            "--only-binary", ":all:", "--generate-hashes", "--no-header", "--no-annotate", "--quiet",
+        ], check=True, capture_output=True, text=True)
+    except subprocess.CalledProcessError as e:
+        raise RuntimeError(f"Could not resolve the requirements of {source_dir} for {target.name}:\n{e.stderr}") from e
+    with open(lock_path, "w") as f:
+        f.write("# Generated from requirements.txt by scripts/lock_lambda_requirements.py, do not edit\n")
+        f.write(f"# target: {target.name}\n")
+        f.write(result.stdout)
+    return lock_path
+
+def read_lock_target(lock_path: str) -> str:
+    with open(lock_path) as f:
+        match = re.search(r"^# target: (\S+)$", f.read(), re.MULTILINE)
+    return match.group(1) if match else None
+
+def install_locked_requirements(lock_path: str, target_dir: str, target: WheelhouseTarget, wheelhouse_dir: str = None):
+    """
+    Installs the locked wheels into target_dir without contacting an index. Wheels missing from the wheelhouse are
+    downloaded once, checked against the hashes of the lock.
+
+    :param lock_path: The requirements.lock to install.
+    :param target_dir: The directory to install into.
+    :param target: The target the lock was resolved for.
+    :param wheelhouse_dir: The wheel cache, LAMBDA_WHEELHOUSE or DEFAULT_WHEELHOUSE_DIR by default.
+    """
+    locked_target = read_lock_target(lock_path)
+    if locked_target != target.name:
+        raise ValueError(f"{lock_path} was resolved for {locked_target}, not {target.name}; regenerate it with scripts/lock_lambda_requirements.py")
+    wheelhouse = os.path.join(wheelhouse_dir or os.getenv("LAMBDA_WHEELHOUSE") or DEFAULT_WHEELHOUSE_DIR, target.name)
+    os.makedirs(wheelhouse, exist_ok=True)
+
+    # The lock pins every transitive dependency, so nothing is resolved at install time
+    locked = ["--require-hashes", "--no-deps", "-r", lock_path, *target.pip_arguments()]
+    install = ["install", "--quiet", "--no-index", "--find-links", wheelhouse, "--target", target_dir, *locked]
+    try:
+        run_pip(install)
+    except subprocess.CalledProcessError:
+        print(f"Downloading the wheels of {lock_path} missing from {wheelhouse}...")
+        run_pip(["download", "--quiet", "-d", wheelhouse, *locked])
+        run_pip(install)
@@ -0,0 +1,63 @@
+from aws_cdk import aws_s3 as s3
+from aws_cdk import aws_iam as iam
+from aws_cdk import aws_lambda as lambda_
+from aws_cdk import Duration, RemovalPolicy
+from constructs import Construct
+from src.core.models.media_upload_settings import MediaUploadSettings
+
+class MediaUploads(Construct):
+    """
+    Bucket for listing photos uploaded directly from the browser through presigned multipart URLs.
+
+    The API Lambda only mints the URLs (CreateMultipartUpload, presigned UploadPart, CompleteMultipartUpload), so
+    uploads bypass the API Gateway payload limit and no Lambda time is spent streaming bytes. The function reads
+    the bucket from the environment the VPC stack creates it with from the same `settings`.
+    """
+    def __init__(self, scope: Construct, id: str, api_lambda: lambda_.Function, settings: MediaUploadSettings):
+        super().__init__(scope, id)
+
+        # Without an allowed origin browsers cannot upload, the bucket itself stays usable
+        cors_allowed_origins = settings.cors_allowed_origins
+        if not cors_allowed_origins:
+            print(f"{self.node.path}: no website_domain is set, browsers cannot upload to the media bucket")
+
+        self.bucket = s3.Bucket(
+            self, "MediaUploadsBucket",
+            bucket_name=settings.bucket_name,
+            block_public_access=s3.BlockPublicAccess.BLOCK_ALL,
+            encryption=s3.BucketEncryption.S3_MANAGED,
+            enforce_ssl=True,
+            transfer_acceleration=settings.transfer_acceleration,
+            removal_policy=RemovalPolicy.RETAIN,
+            cors=[s3.CorsRule(
+                allowed_methods=[s3.HttpMethods.PUT, s3.HttpMethods.POST, s3.HttpMethods.GET, s3.HttpMethods.HEAD],
+                allowed_origins=cors_allowed_origins,
+                allowed_headers=["*"],
+                # The browser needs each part's ETag to complete the multipart upload
+                exposed_headers=["ETag"],
+                max_age=3600
+            )] if cors_allowed_origins else None,
+            lifecycle_rules=[s3.LifecycleRule(
+                abort_incomplete_multipart_upload_after=Duration.days(settings.incomplete_upload_days)
+            )]
+        )
+
+        # Presigned URLs carry the permissions of the role that signs them, so scope it to the upload prefix
+        iam.Policy(
+            self, "MediaUploadsPolicy",
+            roles=[api_lambda.role],
+            statements=[
+                iam.PolicyStatement(
+                    actions=["s3:PutObject", "s3:GetObject", "s3:AbortMultipartUpload", "s3:ListMultipartUploadParts"],
+                    resources=[self.bucket.arn_for_objects(f"{settings.key_prefix}*")]
+                ),
+                iam.PolicyStatement(
+                    actions=["s3:ListBucketMultipartUploads"],
+                    resources=[self.bucket.bucket_arn]
+                ),
+            ]
+        )
+
+    @property
+    def bucket_name(self) -> str:
+        return self.bucket.bucket_name
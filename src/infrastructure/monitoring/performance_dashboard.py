@@ -0,0 +1,236 @@
+from aws_cdk import aws_cloudwatch as cloudwatch
+from aws_cdk import aws_lambda as lambda_
+from aws_cdk import aws_apigateway as apigateway
+from aws_cdk import aws_cloudfront as cloudfront
+from aws_cdk import aws_rds as rds
+from aws_cdk import aws_events as events
+from aws_cdk import aws_events_targets as targets
+from aws_cdk import aws_logs
+from aws_cdk import Duration, RemovalPolicy
+from constructs import Construct
+from typing import List
+from src.core.models.repository import Repository
+from src.cicd.pipeline_manager import LOAD_TEST_METRIC_NAMESPACE
+
+# CodeBuild publishes one duration metric per build phase, in the order the phases run
+CODEBUILD_PHASES = [
+    "QueuedDuration",
+    "ProvisioningDuration",
+    "DownloadSourceDuration",
+    "InstallDuration",
+    "PreBuildDuration",
+    "BuildDuration",
+    "PostBuildDuration",
+    "UploadArtifactsDuration",
+]
+
+class PerformanceDashboard(Construct):
+    """
+    CloudWatch dashboard covering build times and the runtime performance of the application.
+
+    One row per pipeline with its execution and stage durations and the phase timings of its packaging build,
+    followed by the notifier Lambdas, the API, the FastAPI function, the NAT instances and the database. With a
+    distribution, its additional metrics are enabled for the CloudFront cache hit rate.
+    CodePipeline does not publish stage durations, so the stage state changes are captured in a log group and
+    the durations are derived with Logs Insights.
+    """
+    def __init__(self, scope: Construct, id: str, repositories: List[Repository], notifier_functions: List[lambda_.IFunction],
+                 rest_api: apigateway.RestApi, api_function: lambda_.IFunction, database: rds.DatabaseInstance,
+                 nat_auto_scaling_group_names: List[str] = [], distribution: cloudfront.IDistribution = None,
+                 dashboard_name: str = "RentalPropertiesAgent-DEV", period: Duration = Duration.minutes(5)):
+        super().__init__(scope, id)
+        self.period = period
+        pipeline_repositories = [repo for repo in repositories if repo.pipeline_name is not None]
+
+        self.stage_events_log_group = aws_logs.LogGroup(self, "PipelineStageEvents",
+            retention=aws_logs.RetentionDays.ONE_MONTH,
+            removal_policy=RemovalPolicy.DESTROY
+        )
+        events.Rule(self, "PipelineStageEventsRule",
+            event_pattern=events.EventPattern(
+                source=["aws.codepipeline"],
+                detail_type=["CodePipeline Stage Execution State Change"],
+                detail={"pipeline": [repo.pipeline_name for repo in pipeline_repositories]}
+            ),
+            targets=[targets.CloudWatchLogGroup(self.stage_events_log_group)]
+        )
+
+        self.dashboard = cloudwatch.Dashboard(self, "Dashboard",
+            dashboard_name=dashboard_name,
+            default_interval=Duration.days(7)
+        )
+        self.dashboard.add_widgets(cloudwatch.TextWidget(markdown="# Pipelines", width=24, height=1))
+        for repo in pipeline_repositories:
+            self.dashboard.add_widgets(*self.create_pipeline_widgets(repo))
+        self.dashboard.add_widgets(cloudwatch.TextWidget(markdown="# Runtime", width=24, height=1))
+        self.dashboard.add_widgets(self.create_notifier_widget(notifier_functions), *self.create_api_widgets(rest_api, distribution))
+        self.dashboard.add_widgets(*self.create_function_widgets(api_function))
+        self.dashboard.add_widgets(self.create_nat_widget(nat_auto_scaling_group_names), *self.create_database_widgets(database))
+
+    def create_pipeline_widgets(self, repo: Repository) -> List[cloudwatch.IWidget]:
+        pipeline_metric_options = dict(namespace="AWS/CodePipeline", dimensions_map={"PipelineName": repo.pipeline_name}, period=Duration.hours(1))
+        widgets = [
+            cloudwatch.GraphWidget(
+                title=f"{repo.name} pipeline duration (s)",
+                left=[
+                    cloudwatch.Metric(metric_name="PipelineDuration", statistic="p50", label="p50", **pipeline_metric_options),
+                    cloudwatch.Metric(metric_name="PipelineDuration", statistic="Maximum", label="max", **pipeline_metric_options),
+                ],
+                right=[cloudwatch.Metric(metric_name="FailedPipelineExecutions", statistic="Sum", label="failed", **pipeline_metric_options)],
+                width=8
+            ),
+            cloudwatch.LogQueryWidget(
+                title=f"{repo.name} stage duration (s)",
+                log_group_names=[self.stage_events_log_group.log_group_name],
+                query_lines=[
+                    "fields @timestamp, detail.stage as stage, `detail.execution-id` as execution",
+                    f"filter detail.pipeline = '{repo.pipeline_name}'",
+                    "stats min(@timestamp) as started, (max(@timestamp) - min(@timestamp)) / 1000 as seconds by execution, stage",
+                    "sort started desc",
+                    "limit 30",
+                ],
+                width=8
+            ),
+        ]
+        if repo.build_project_name is not None:
+            widgets.append(cloudwatch.GraphWidget(
+                title=f"{repo.name} build phases (s)",
+                left=[
+                    cloudwatch.Metric(namespace="AWS/CodeBuild", metric_name=phase, dimensions_map={"ProjectName": repo.build_project_name},
+                                      statistic="Average", period=Duration.hours(1), label=phase.replace("Duration", ""))
+                    for phase in CODEBUILD_PHASES
+                ],
+                stacked=True,
+                width=8
+            ))
+        if repo.load_test is not None:
+            load_test_metric_options = dict(namespace=LOAD_TEST_METRIC_NAMESPACE, dimensions_map={"Repository": repo.name}, statistic="Maximum", period=Duration.hours(1))
+            widgets.append(cloudwatch.GraphWidget(
+                title=f"{repo.name} load test latency (ms)",
+                left=[cloudwatch.Metric(metric_name=f"Latency{percentile}", label=percentile.lower(), **load_test_metric_options) for percentile in ["P50", "P95", "P99"]],
+                right=[cloudwatch.Metric(metric_name="Throughput", label="requests/s", **load_test_metric_options)],
+                width=8
+            ))
+        return widgets
+
+    def create_notifier_widget(self, notifier_functions: List[lambda_.IFunction]) -> cloudwatch.IWidget:
+        return cloudwatch.GraphWidget(
+            title="Notifier duration (ms)",
+            left=[function.metric_duration(statistic="p90", period=self.period, label=function.node.id) for function in notifier_functions],
+            right=[function.metric_errors(statistic="Sum", period=self.period, label=f"{function.node.id} errors") for function in notifier_functions],
+            width=8
+        )
+
+    def create_api_widgets(self, rest_api: apigateway.RestApi, distribution: cloudfront.IDistribution) -> List[cloudwatch.IWidget]:
+        cache_metrics = {
+            "hits": rest_api.metric_cache_hit_count(statistic="Sum", period=self.period),
+            "misses": rest_api.metric_cache_miss_count(statistic="Sum", period=self.period),
+        }
+        cache_hit_rates = [cloudwatch.MathExpression(
+            expression="100 * hits / MAX([hits + misses, 1])",
+            using_metrics=cache_metrics,
+            period=self.period,
+            label="API Gateway"
+        )]
+        if distribution is not None:
+            # CacheHitRate is one of the additional distribution metrics, which are billed per distribution
+            cloudfront.CfnMonitoringSubscription(self, "DistributionMonitoringSubscription",
+                distribution_id=distribution.distribution_id,
+                monitoring_subscription=cloudfront.CfnMonitoringSubscription.MonitoringSubscriptionProperty(
+                    realtime_metrics_subscription_config=cloudfront.CfnMonitoringSubscription.RealtimeMetricsSubscriptionConfigProperty(
+                        realtime_metrics_subscription_status="Enabled"
+                    )
+                )
+            )
+            cache_hit_rates.append(cloudwatch.Metric(
+                namespace="AWS/CloudFront", metric_name="CacheHitRate",
+                dimensions_map={"DistributionId": distribution.distribution_id, "Region": "Global"},
+                region="us-east-1", statistic="Average", period=self.period, label="CloudFront"
+            ))
+        return [
+            cloudwatch.GraphWidget(
+                title="API latency (ms)",
+                left=[
+                    rest_api.metric_latency(statistic="p50", period=self.period, label="p50"),
+                    rest_api.metric_latency(statistic="p99", period=self.period, label="p99"),
+                    rest_api.metric_integration_latency(statistic="p99", period=self.period, label="integration p99"),
+                ],
+                width=8
+            ),
+            cloudwatch.GraphWidget(
+                title="API errors and cache hit rate (%)",
+                left=[
+                    rest_api.metric_client_error(statistic="Sum", period=self.period, label="4xx"),
+                    rest_api.metric_server_error(statistic="Sum", period=self.period, label="5xx"),
+                ],
+                right=cache_hit_rates,
+                right_y_axis=cloudwatch.YAxisProps(min=0, max=100),
+                width=8
+            ),
+        ]
+
+    def create_function_widgets(self, function: lambda_.IFunction) -> List[cloudwatch.IWidget]:
+        return [
+            cloudwatch.GraphWidget(
+                title="FastAPI duration (ms)",
+                left=[
+                    function.metric_duration(statistic="p50", period=self.period, label="p50"),
+                    function.metric_duration(statistic="p99", period=self.period, label="p99"),
+                ],
+                right=[function.metric_throttles(statistic="Sum", period=self.period, label="throttles")],
+                width=8
+            ),
+            # Lambda has no init duration metric, it is only reported on the REPORT line of cold starts
+            cloudwatch.LogQueryWidget(
+                title="FastAPI cold starts (init ms)",
+                log_group_names=[f"/aws/lambda/{function.function_name}"],
+                query_lines=[
+                    "filter @type = 'REPORT' and ispresent(@initDuration)",
+                    "stats count() as cold_starts, avg(@initDuration) as avg_init, max(@initDuration) as max_init by bin(1h)",
+                ],
+                view=cloudwatch.LogQueryVisualizationType.LINE,
+                width=8
+            ),
+            cloudwatch.GraphWidget(
+                title="FastAPI concurrency",
+                left=[cloudwatch.Metric(
+                    namespace="AWS/Lambda", metric_name="ConcurrentExecutions",
+                    dimensions_map={"FunctionName": function.function_name},
+                    statistic="Maximum", period=Duration.minutes(1), label="concurrent executions"
+                )],
+                right=[function.metric_invocations(statistic="Sum", period=self.period, label="invocations")],
+                width=8
+            ),
+        ]
+
+    def create_nat_widget(self, nat_auto_scaling_group_names: List[str]) -> cloudwatch.IWidget:
+        # The NAT instances are replaced by their auto scaling groups, so the metrics are aggregated per group
+        return cloudwatch.GraphWidget(
+            title="NAT throughput (bytes)",
+            left=[
+                cloudwatch.Metric(namespace="AWS/EC2", metric_name=metric_name, dimensions_map={"AutoScalingGroupName": group_name},
+                                  statistic="Sum", period=self.period, label=f"NAT {index + 1} {direction}")
+                for index, group_name in enumerate(nat_auto_scaling_group_names)
+                for metric_name, direction in [("NetworkIn", "in"), ("NetworkOut", "out")]
+            ],
+            width=8
+        )
+
+    def create_database_widgets(self, database: rds.DatabaseInstance) -> List[cloudwatch.IWidget]:
+        return [
+            cloudwatch.GraphWidget(
+                title="Database CPU (%) and connections",
+                left=[database.metric_cpu_utilization(statistic="Average", period=self.period, label="CPU")],
+                right=[database.metric_database_connections(statistic="Maximum", period=self.period, label="connections")],
+                width=8
+            ),
+            cloudwatch.GraphWidget(
+                title="Database read latency (s)",
+                left=[
+                    database.metric("ReadLatency", statistic="Average", period=self.period, label="average"),
+                    database.metric("ReadLatency", statistic="p99", period=self.period, label="p99"),
+                ],
+                right=[database.metric_read_iops(statistic="Average", period=self.period, label="read IOPS")],
+                width=8
+            ),
+        ]
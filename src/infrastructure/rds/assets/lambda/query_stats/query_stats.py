@@ -0,0 +1,153 @@
+import json
+import os
+import boto3
+import logging
+import pg8000.native
+from datetime import datetime, timezone
+from botocore.exceptions import ClientError
+
+# Configure logging
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+METRIC_NAMESPACE = "RPA/Database"
+
+TOP_STATEMENTS_QUERY = """
+    SELECT queryid, query, calls, total_exec_time, mean_exec_time, rows,
+           shared_blks_hit, shared_blks_read
+    FROM pg_stat_statements
+    WHERE dbid = (SELECT oid FROM pg_database WHERE datname = current_database())
+    ORDER BY {order_by} DESC
+    LIMIT :limit
+"""
+
+def handler(event, context):
+    """
+    Lambda function handler for snapshotting pg_stat_statements.
+
+    Args:
+        event (dict): The scheduled event passed to the Lambda function.
+        context (object): The runtime information of the Lambda function.
+
+    Returns:
+        dict: The response data returned by the Lambda function.
+    """
+    top_n = int(os.environ.get('TOP_N', '10'))
+    report_bucket = os.environ.get('REPORT_BUCKET')
+
+    credentials = get_db_credentials(os.environ.get('DB_CREDENTIALS_SECRET_ARN'))
+    connection = pg8000.native.Connection(
+        user=credentials['username'],
+        password=credentials['password'],
+        host=credentials['host'],
+        port=int(credentials.get('port', 5432)),
+        database=credentials.get('dbname', 'dev'),
+        timeout=10,
+    )
+    try:
+        connection.run("CREATE EXTENSION IF NOT EXISTS pg_stat_statements")
+        by_total_time = fetch_top_statements(connection, "total_exec_time", top_n)
+        by_mean_time = fetch_top_statements(connection, "mean_exec_time", top_n)
+    finally:
+        connection.close()
+
+    snapshot_time = datetime.now(timezone.utc)
+    put_statement_metrics(by_total_time + by_mean_time, snapshot_time)
+    report_key = write_report(report_bucket, snapshot_time, by_total_time, by_mean_time)
+
+    logger.info(f"Exported {len(by_total_time)} statements by total time and {len(by_mean_time)} by mean time to {report_key}")
+    return {"statusCode": 200, "body": json.dumps({"report": report_key})}
+
+def get_db_credentials(secret_arn):
+    """
+    Retrieves the database credentials from AWS Secrets Manager.
+
+    Args:
+        secret_arn (str): The ARN of the secret generated for the RDS instance.
+
+    Returns:
+        dict: The username, password, host, port and dbname of the database.
+
+    Raises:
+        ClientError: If there is an error retrieving the secret.
+    """
+    client = boto3.client('secretsmanager')
+    try:
+        get_secret_value_response = client.get_secret_value(SecretId=secret_arn)
+        return json.loads(get_secret_value_response['SecretString'])
+    except ClientError as e:
+        logger.error(f"Error retrieving secret: {e}")
+        raise e
+
+def fetch_top_statements(connection, order_by, limit):
+    """
+    Fetches the top statements from pg_stat_statements for the current database.
+
+    Args:
+        connection (pg8000.native.Connection): An open database connection.
+        order_by (str): The pg_stat_statements column to rank by, either "total_exec_time" or "mean_exec_time".
+        limit (int): The number of statements to return.
+
+    Returns:
+        list: A list of dictionaries, one per statement.
+    """
+    if order_by not in ("total_exec_time", "mean_exec_time"):
+        raise ValueError(f"Unsupported ordering column: {order_by}")
+
+    rows = connection.run(TOP_STATEMENTS_QUERY.format(order_by=order_by), limit=limit)
+    columns = [column['name'] for column in connection.columns]
+    return [dict(zip(columns, row)) for row in rows]
+
+def put_statement_metrics(statements, snapshot_time):
+    """
+    Publishes the per-statement timings as CloudWatch metrics, one QueryId dimension per statement.
+
+    Args:
+        statements (list): The statements returned by fetch_top_statements.
+        snapshot_time (datetime): The timestamp to record the metrics at.
+    """
+    cloudwatch = boto3.client('cloudwatch')
+    metric_data = []
+    seen = set()
+    for statement in statements:
+        query_id = str(statement['queryid'])
+        if query_id in seen:
+            continue
+        seen.add(query_id)
+        dimensions = [{"Name": "QueryId", "Value": query_id}]
+        metric_data.extend([
+            {"MetricName": "TotalExecTime", "Dimensions": dimensions, "Timestamp": snapshot_time, "Value": float(statement['total_exec_time']), "Unit": "Milliseconds"},
+            {"MetricName": "MeanExecTime", "Dimensions": dimensions, "Timestamp": snapshot_time, "Value": float(statement['mean_exec_time']), "Unit": "Milliseconds"},
+            {"MetricName": "Calls", "Dimensions": dimensions, "Timestamp": snapshot_time, "Value": float(statement['calls']), "Unit": "Count"},
+        ])
+
+    # PutMetricData accepts at most 1000 metrics per request
+    for i in range(0, len(metric_data), 1000):
+        cloudwatch.put_metric_data(Namespace=METRIC_NAMESPACE, MetricData=metric_data[i:i + 1000])
+
+def write_report(bucket_name, snapshot_time, by_total_time, by_mean_time):
+    """
+    Writes the snapshot as a JSON report to the report bucket.
+
+    Args:
+        bucket_name (str): The name of the S3 bucket to write the report to.
+        snapshot_time (datetime): The time the snapshot was taken.
+        by_total_time (list): The statements ranked by total execution time.
+        by_mean_time (list): The statements ranked by mean execution time.
+
+    Returns:
+        str: The S3 key of the report.
+    """
+    key = f"query-stats/{snapshot_time:%Y/%m/%d/%H%M%S}.json"
+    report = {
+        "snapshot_time": snapshot_time.isoformat(),
+        "top_by_total_time": by_total_time,
+        "top_by_mean_time": by_mean_time,
+    }
+    boto3.client('s3').put_object(
+        Bucket=bucket_name,
+        Key=key,
+        Body=json.dumps(report, default=str, indent=2),
+        ContentType="application/json",
+    )
+    return key
@@ -0,0 +1,84 @@
+from aws_cdk import aws_ec2 as ec2
+from aws_cdk import aws_lambda as lambda_
+from aws_cdk import aws_s3 as s3
+from aws_cdk import aws_events as events
+from aws_cdk import aws_events_targets as targets
+from aws_cdk import aws_iam as iam
+from aws_cdk import Duration, RemovalPolicy
+from constructs import Construct
+from src.core.abstracts.lambda_factory import AbstractLambdaFactory
+from src.infrastructure.rds.rds_instance import RdsInstance
+
+class QueryStatsLambdaFactory(AbstractLambdaFactory):
+    def __init__(self, scope: Construct):
+        super().__init__(scope)
+
+    def create_query_stats_lambda(self, vpc: ec2.Vpc, vpc_subnet: ec2.SubnetSelection, security_group: ec2.SecurityGroup, environment: dict) -> lambda_.Function:
+        source_dir = "src/infrastructure/rds/assets/lambda/query_stats"
+        runtime = lambda_.Runtime.PYTHON_3_9
+        self.create_package_directory(source_dir, runtime)
+        return self.create_lambda(
+            id="QueryStatsExporter-DEV",
+            handler="query_stats.handler",
+            runtime=runtime,
+            code=lambda_.Code.from_asset(source_dir+"/package"),
+            environment=environment,
+            timeout=Duration.seconds(60),
+            vpc=vpc,
+            vpc_subnets=vpc_subnet,
+            security_groups=[security_group],
+        )
+
+class QueryStatsExporter(Construct):
+    """
+    Scheduled Lambda that snapshots the top pg_stat_statements entries of the RDS instance
+    into CloudWatch metrics (namespace RPA/Database) and a JSON report in S3.
+    """
+    def __init__(self, scope: Construct, id: str, vpc: ec2.Vpc, vpc_subnet: ec2.SubnetSelection, rds_instance: RdsInstance, top_n: int = 10, schedule: Duration = Duration.minutes(15)):
+        super().__init__(scope, id)
+
+        # Security group for the exporter; the RDS security group must allow it in on 5432
+        self.security_group = ec2.SecurityGroup(
+            self, "QueryStatsSecurityGroup",
+            vpc=vpc,
+            allow_all_outbound=True,
+            description="Security group for the query statistics exporter"
+        )
+        rds_instance.set_rds_sg_ingress_rule(
+            peer=self.security_group,
+            port=ec2.Port.tcp(5432),
+            description="Ingress rule for allowing the query statistics exporter access"
+        )
+
+        self.report_bucket = s3.Bucket(
+            self, "QueryStatsReportBucket",
+            removal_policy=RemovalPolicy.DESTROY,
+            lifecycle_rules=[s3.LifecycleRule(expiration=Duration.days(90))]
+        )
+
+        db_secret = rds_instance.instance.secret
+        self.lambda_function = QueryStatsLambdaFactory(self).create_query_stats_lambda(
+            vpc=vpc,
+            vpc_subnet=vpc_subnet,
+            security_group=self.security_group,
+            environment={
+                "DB_CREDENTIALS_SECRET_ARN": db_secret.secret_arn,
+                "REPORT_BUCKET": self.report_bucket.bucket_name,
+                "TOP_N": str(top_n),
+            }
+        )
+
+        db_secret.grant_read(self.lambda_function)
+        self.report_bucket.grant_put(self.lambda_function)
+        self.lambda_function.add_to_role_policy(iam.PolicyStatement(
+            actions=["cloudwatch:PutMetricData"],
+            resources=["*"],
+            conditions={"StringEquals": {"cloudwatch:namespace": "RPA/Database"}}
+        ))
+
+        events.Rule(
+            self, "QueryStatsSchedule",
+            description="Snapshot pg_stat_statements into CloudWatch and S3",
+            schedule=events.Schedule.rate(schedule),
+            targets=[targets.LambdaFunction(self.lambda_function)]
+        )
@@ -1,15 +1,20 @@
 from aws_cdk import aws_ec2 as ec2
 from aws_cdk import aws_rds as rds
 from aws_cdk import aws_secretsmanager as secretsmanager
+from aws_cdk import aws_logs
 from aws_cdk import RemovalPolicy
 from constructs import Construct
 
 class RdsInstance(Construct):
-    def __init__(self, scope: Construct, id: str, vpc: ec2.Vpc, bastion_sg: ec2.SecurityGroup, vpc_subnet: ec2.SubnetSelection):
+    def __init__(self, scope: Construct, id: str, vpc: ec2.Vpc, bastion_sg: ec2.SecurityGroup, vpc_subnet: ec2.SubnetSelection, slow_query_threshold_ms: int = 500):
         super().__init__(scope, id)
         
         self.vpc = vpc
         self.vpc_subnet = vpc_subnet
+        self.slow_query_threshold_ms = slow_query_threshold_ms
+        self.engine = rds.DatabaseInstanceEngine.postgres(
+            version=rds.PostgresEngineVersion.VER_15_4
+        )
 
         # Define the RDS Security Group
         self.rds_sg = ec2.SecurityGroup(
@@ -36,13 +41,31 @@ class RdsInstance(Construct):
     def set_rds_sg_ingress_rule(self, peer: ec2.SecurityGroup, port: ec2.Port, description: str):
         self.rds_sg.add_ingress_rule(peer, port, description)
         
+    def create_parameter_group(self) -> rds.ParameterGroup:
+        # Load pg_stat_statements and log every statement slower than the threshold
+        return rds.ParameterGroup(
+            self, "PostgresParameterGroup",
+            engine=self.engine,
+            description="Postgres parameters with query statistics and slow query logging",
+            parameters={
+                "shared_preload_libraries": "pg_stat_statements",
+                "pg_stat_statements.track": "top",
+                "pg_stat_statements.max": "5000",
+                "track_io_timing": "1",
+                "log_min_duration_statement": str(self.slow_query_threshold_ms),
+            }
+        )
+        
     def create(self):
-                # Define the RDS instance
+        self.parameter_group = self.create_parameter_group()
+        
+        # Define the RDS instance
         self.instance = rds.DatabaseInstance(
             self, "MyRDSInstance",
-            engine=rds.DatabaseInstanceEngine.postgres(
-                version=rds.PostgresEngineVersion.VER_15_4
-            ),
+            engine=self.engine,
+            parameter_group=self.parameter_group,
+            cloudwatch_logs_exports=["postgresql"],
+            cloudwatch_logs_retention=aws_logs.RetentionDays.ONE_MONTH,
             vpc=self.vpc,
             credentials=self.secret_creds_db,
             database_name="dev",
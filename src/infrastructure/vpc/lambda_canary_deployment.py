@@ -0,0 +1,70 @@
+from aws_cdk import aws_lambda as lambda_
+from aws_cdk import aws_codedeploy as codedeploy
+from aws_cdk import aws_cloudwatch as cloudwatch
+from aws_cdk import Duration
+from constructs import Construct
+
+class LambdaCanaryDeployment(Construct):
+    """
+    Serves a Lambda function through an alias whose version is shifted by CodeDeploy.
+
+    New versions first receive a slice of the traffic according to `deployment_config`. Alarms on the p99
+    duration, error rate and throttles of the alias stop the shift and roll the alias back to the previous
+    version. While a canary takes a tenth of the traffic it makes up the slowest percent on its own, so a latency
+    regression shows in the alias p99 before the shift completes.
+    """
+    def __init__(self, scope: Construct, id: str, lambda_function: lambda_.Function, alias_name: str = "live",
+                 deployment_config: codedeploy.ILambdaDeploymentConfig = codedeploy.LambdaDeploymentConfig.CANARY_10_PERCENT_5_MINUTES,
+                 p99_duration_threshold_ms: int = 3000, error_rate_threshold_percent: float = 5, throttle_threshold: int = 1):
+        super().__init__(scope, id)
+
+        self.alias = lambda_.Alias(self, "Alias",
+            alias_name=alias_name,
+            version=lambda_function.current_version
+        )
+
+        period = Duration.minutes(1)
+        p99_duration_alarm = cloudwatch.Alarm(self, "P99DurationAlarm",
+            metric=self.alias.metric_duration(statistic="p99", period=period),
+            threshold=p99_duration_threshold_ms,
+            evaluation_periods=2,
+            comparison_operator=cloudwatch.ComparisonOperator.GREATER_THAN_THRESHOLD,
+            treat_missing_data=cloudwatch.TreatMissingData.NOT_BREACHING,
+            alarm_description=f"p99 duration of {alias_name} above {p99_duration_threshold_ms} ms"
+        )
+        error_rate_alarm = cloudwatch.Alarm(self, "ErrorRateAlarm",
+            metric=cloudwatch.MathExpression(
+                expression="100 * errors / MAX([invocations, 1])",
+                using_metrics={
+                    "errors": self.alias.metric_errors(statistic="Sum", period=period),
+                    "invocations": self.alias.metric_invocations(statistic="Sum", period=period),
+                },
+                period=period,
+                label="Error rate (%)"
+            ),
+            threshold=error_rate_threshold_percent,
+            evaluation_periods=2,
+            comparison_operator=cloudwatch.ComparisonOperator.GREATER_THAN_OR_EQUAL_TO_THRESHOLD,
+            treat_missing_data=cloudwatch.TreatMissingData.NOT_BREACHING,
+            alarm_description=f"Error rate of {alias_name} at or above {error_rate_threshold_percent}%"
+        )
+        throttle_alarm = cloudwatch.Alarm(self, "ThrottleAlarm",
+            metric=self.alias.metric_throttles(statistic="Sum", period=period),
+            threshold=throttle_threshold,
+            evaluation_periods=1,
+            comparison_operator=cloudwatch.ComparisonOperator.GREATER_THAN_OR_EQUAL_TO_THRESHOLD,
+            treat_missing_data=cloudwatch.TreatMissingData.NOT_BREACHING,
+            alarm_description=f"Throttled invocations of {alias_name}"
+        )
+        self.alarms = [p99_duration_alarm, error_rate_alarm, throttle_alarm]
+
+        self.deployment_group = codedeploy.LambdaDeploymentGroup(self, "DeploymentGroup",
+            alias=self.alias,
+            deployment_config=deployment_config,
+            alarms=self.alarms,
+            auto_rollback=codedeploy.AutoRollbackConfig(
+                failed_deployment=True,
+                stopped_deployment=True,
+                deployment_in_alarm=True
+            )
+        )
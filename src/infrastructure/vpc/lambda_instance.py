@@ -8,10 +8,14 @@ from aws_cdk import aws_secretsmanager as secretsmanager
 from constructs import Construct
 
 class LambdaInstance(Construct):
-    def __init__(self, scope: Construct, id: str, vpc: ec2.Vpc, vpc_subnet: ec2.SubnetSelection):
+    def __init__(self, scope: Construct, id: str, vpc: ec2.Vpc, vpc_subnet: ec2.SubnetSelection, package_type: str = "zip", environment: dict = {}):
         super().__init__(scope, id)
         self.vpc = vpc
         self.vpc_subnet = vpc_subnet
+        # "zip" or "image", must match the lambda_package of the middle tier repository
+        self.package_type = package_type
+        # Added to the function environment, e.g. the settings of resources other stacks create for the function
+        self.environment = environment
         
         self.execution_role = iam.Role(self, "LambdaExecutionRole",
                             assumed_by=iam.ServicePrincipal("lambda.amazonaws.com"),
@@ -45,12 +49,20 @@ class LambdaInstance(Construct):
         self.execution_role.add_to_policy(secret_access_policy_statement)
         
         # Create the lambda function
-        self._lambda_function = lambda_.Function(
+        if self.package_type == "image":
+            function_type, code_options = lambda_.DockerImageFunction, {
+                "code": lambda_.DockerImageCode.from_image_asset("src/infrastructure/vpc/assets/placeholder_image"), # placeholder image
+            }
+        else:
+            function_type, code_options = lambda_.Function, {
+                "runtime": lambda_.Runtime.PYTHON_3_9,
+                "handler": "app.handler",
+                "code": lambda_.InlineCode("def handler(event, context): return {'statusCode': 200, 'body': 'hello world'}"), # placeholder code
+            }
+        self._lambda_function = function_type(
             self, f"FastApiLambda-DEV",
             role=self.execution_role,
-            runtime=lambda_.Runtime.PYTHON_3_9,
-            handler="app.handler",
-            code=lambda_.InlineCode("def handler(event, context): return {'statusCode': 200, 'body': 'hello world'}"), # placeholder code
+            **code_options,
             vpc=self.vpc,
             vpc_subnets=self.vpc_subnet,
             security_groups=[ec2.SecurityGroup(
@@ -63,7 +75,8 @@ class LambdaInstance(Construct):
                 # environment variables
                 "DB_CREDENTIALS_SECRET_ARN": full_secret_arn,
                 "ENV": "dev",
-                "POSTGRES_DB" : "rpa"
+                "POSTGRES_DB" : "rpa",
+                **self.environment
             },
             timeout=Duration.seconds(10)
         )
\ No newline at end of file
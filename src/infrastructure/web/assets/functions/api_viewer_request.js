@@ -0,0 +1,13 @@
+// Viewer-request function for the API behaviors of the website distribution.
+// Placeholders in double underscores are substituted by WebsiteManager at synth time.
+
+var API_PREFIX = __API_PREFIX__;
+
+// The API is mounted under the prefix on the distribution but serves its routes from the root of the stage
+function handler(event) {
+    var request = event.request;
+    if (request.uri.indexOf(API_PREFIX) === 0) {
+        request.uri = request.uri.substring(API_PREFIX.length) || '/';
+    }
+    return request;
+}
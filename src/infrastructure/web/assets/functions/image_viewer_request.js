@@ -0,0 +1,65 @@
+// Viewer-request function for the image optimization behavior of the website distribution.
+// Placeholders in double underscores are substituted by ImageOptimizer at synth time.
+
+var WIDTHS = __WIDTHS__;
+var DEFAULT_QUALITY = __DEFAULT_QUALITY__;
+var EXPLICIT_FORMATS = ['avif', 'webp', 'jpeg', 'png', 'original'];
+
+// Snap to the next configured width so arbitrary widths cannot multiply the number of variants
+function normaliseWidth(value) {
+    var width = parseInt(value, 10);
+    if (isNaN(width) || width <= 0) {
+        return null;
+    }
+    for (var i = 0; i < WIDTHS.length; i++) {
+        if (WIDTHS[i] >= width) {
+            return WIDTHS[i];
+        }
+    }
+    return WIDTHS[WIDTHS.length - 1];
+}
+
+function normaliseQuality(value) {
+    var quality = parseInt(value, 10);
+    if (isNaN(quality)) {
+        return DEFAULT_QUALITY;
+    }
+    quality = Math.min(90, Math.max(30, quality));
+    return Math.round(quality / 5) * 5;
+}
+
+// Negotiate the best format the viewer accepts, so the cache key carries the format instead of the Accept header
+function negotiateFormat(value, headers) {
+    if (value && EXPLICIT_FORMATS.indexOf(value) !== -1) {
+        return value;
+    }
+    var accept = headers['accept'] ? headers['accept'].value : '';
+    if (accept.indexOf('image/avif') !== -1) {
+        return 'avif';
+    }
+    if (accept.indexOf('image/webp') !== -1) {
+        return 'webp';
+    }
+    return 'original';
+}
+
+function parameter(querystring, name) {
+    return querystring[name] ? querystring[name].value : null;
+}
+
+function handler(event) {
+    var request = event.request;
+    var querystring = request.querystring;
+
+    var normalised = {
+        q: { value: String(normaliseQuality(parameter(querystring, 'q'))) },
+        f: { value: negotiateFormat(parameter(querystring, 'f'), request.headers) }
+    };
+    var width = normaliseWidth(parameter(querystring, 'w'));
+    if (width !== null) {
+        normalised.w = { value: String(width) };
+    }
+
+    request.querystring = normalised;
+    return request;
+}
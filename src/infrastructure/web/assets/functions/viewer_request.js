@@ -0,0 +1,81 @@
+// Viewer-request function for the website distribution.
+// Placeholders in double underscores are substituted by WebsiteManager at synth time.
+
+var PRECOMPRESSED_EXTENSIONS = __PRECOMPRESSED_EXTENSIONS__;
+var SERVE_PRECOMPRESSED = __SERVE_PRECOMPRESSED__;
+var SPA_ROUTE_PREFIXES = __SPA_ROUTE_PREFIXES__;
+var SPA_FALLBACK_PATH = __SPA_FALLBACK_PATH__;
+
+function extensionOf(uri) {
+    var lastSegment = uri.substring(uri.lastIndexOf('/') + 1);
+    var dot = lastSegment.lastIndexOf('.');
+    return dot === -1 ? '' : lastSegment.substring(dot).toLowerCase();
+}
+
+function isSpaRoute(uri) {
+    for (var i = 0; i < SPA_ROUTE_PREFIXES.length; i++) {
+        if (uri.indexOf(SPA_ROUTE_PREFIXES[i]) === 0) {
+            return true;
+        }
+    }
+    return false;
+}
+
+// Map routes to the document `nuxt generate` writes for them, e.g. /about -> /about/index.html. Routes under
+// SPA_ROUTE_PREFIXES are rendered client-side, e.g. /properties/123, and all share the SPA fallback document.
+// Any other route without a prerendered document gets the SPA document from the bucket's website error document,
+// with the 404 status of an unknown page.
+function rewriteRoute(request) {
+    var uri = request.uri;
+    if (extensionOf(uri) === '' && isSpaRoute(uri)) {
+        request.uri = SPA_FALLBACK_PATH;
+    } else if (uri.charAt(uri.length - 1) === '/') {
+        request.uri = uri + 'index.html';
+    } else if (extensionOf(uri) === '') {
+        request.uri = uri + '/index.html';
+    }
+}
+
+// Returns the codings of an Accept-Encoding header the viewer accepts, skipping any listed with q=0
+function acceptedEncodings(value) {
+    var accepted = [];
+    var tokens = value.toLowerCase().split(',');
+    for (var i = 0; i < tokens.length; i++) {
+        var parameters = tokens[i].split(';');
+        var coding = parameters[0].trim();
+        var quality = 1;
+        for (var j = 1; j < parameters.length; j++) {
+            var parameter = parameters[j].trim();
+            if (parameter.indexOf('q=') === 0) {
+                quality = parseFloat(parameter.substring(2));
+            }
+        }
+        if (coding && quality > 0) {
+            accepted.push(coding);
+        }
+    }
+    return accepted;
+}
+
+// Rewrite to the build-time .br/.gz variant the viewer accepts; the rewritten URI is also the cache key
+function selectEncoding(request) {
+    if (PRECOMPRESSED_EXTENSIONS.indexOf(extensionOf(request.uri)) === -1) {
+        return;
+    }
+    var header = request.headers['accept-encoding'];
+    var accepted = header ? acceptedEncodings(header.value) : [];
+    if (accepted.indexOf('br') !== -1) {
+        request.uri += '.br';
+    } else if (accepted.indexOf('gzip') !== -1) {
+        request.uri += '.gz';
+    }
+}
+
+function handler(event) {
+    var request = event.request;
+    rewriteRoute(request);
+    if (SERVE_PRECOMPRESSED) {
+        selectEncoding(request);
+    }
+    return request;
+}
@@ -0,0 +1,167 @@
+import base64
+import io
+import json
+import os
+import boto3
+from urllib.parse import unquote
+import logging
+from botocore.exceptions import ClientError
+from PIL import Image, ImageOps
+
+# Configure logging
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+PATH_PREFIX = os.environ.get('PATH_PREFIX', '/images/')
+SOURCE_BUCKET = os.environ.get('SOURCE_BUCKET')
+DERIVED_BUCKET = os.environ.get('DERIVED_BUCKET')
+ORIGIN_VERIFY_SECRET = os.environ.get('ORIGIN_VERIFY_SECRET')
+SOURCE_REFERER = os.environ.get('SOURCE_REFERER')
+
+MAX_WIDTH = 2560
+# Lambda function URL responses are capped at 6 MB, base64 inflates the body by a third
+MAX_RESPONSE_BYTES = 4 * 1024 * 1024
+CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+FORMATS = {
+    "avif": ("AVIF", "image/avif"),
+    "webp": ("WEBP", "image/webp"),
+    "jpeg": ("JPEG", "image/jpeg"),
+    "png": ("PNG", "image/png"),
+}
+
+s3 = boto3.client('s3')
+
+# The website bucket only allows reads carrying the CloudFront referer secret
+if SOURCE_REFERER:
+    def add_referer(request, **kwargs):
+        request.headers['Referer'] = SOURCE_REFERER
+    s3.meta.events.register('before-send.s3.GetObject', add_referer)
+
+def handler(event, context):
+    """
+    Lambda function URL handler resizing and converting images for the website distribution.
+
+    The viewer-request function has already normalised the query string to `w`, `q` and `f`, so every
+    combination is a finite, cacheable variant. Variants are stored in the derived bucket and only ever
+    produced once.
+
+    Args:
+        event (dict): The function URL request event.
+        context (object): The runtime information of the Lambda function.
+
+    Returns:
+        dict: The function URL response with the image as a base64 body.
+    """
+    headers = event.get('headers') or {}
+    if headers.get('x-origin-verify') != ORIGIN_VERIFY_SECRET:
+        return error_response(403, "Forbidden")
+
+    # rawPath is percent-encoded, the originals are stored in the website bucket under their full path
+    path = unquote(event.get('rawPath', ''))
+    if not path.startswith(PATH_PREFIX):
+        return error_response(404, "Not found")
+    source_key = path.lstrip('/')
+
+    try:
+        width, quality, image_format = parse_parameters(event.get('queryStringParameters') or {}, source_key)
+    except ValueError as e:
+        return error_response(400, str(e))
+
+    derived_key = f"w{width or 'orig'}_q{quality}/{source_key}.{image_format}"
+    content_type = FORMATS[image_format][1]
+
+    body = get_object(DERIVED_BUCKET, derived_key)
+    if body is None:
+        original = get_object(SOURCE_BUCKET, source_key)
+        if original is None:
+            return error_response(404, "Not found")
+        body = transform(original, width, quality, image_format)
+        s3.put_object(Bucket=DERIVED_BUCKET, Key=derived_key, Body=body, ContentType=content_type, CacheControl=CACHE_CONTROL)
+        logger.info(f"Created {derived_key} ({len(original)} -> {len(body)} bytes)")
+
+    if len(body) > MAX_RESPONSE_BYTES:
+        logger.error(f"{derived_key} is {len(body)} bytes, too large to return through the function URL")
+        return error_response(502, "Image too large")
+
+    return {
+        "statusCode": 200,
+        "headers": {"Content-Type": content_type, "Cache-Control": CACHE_CONTROL},
+        "body": base64.b64encode(body).decode(),
+        "isBase64Encoded": True,
+    }
+
+def parse_parameters(parameters, source_key):
+    """
+    Validates the normalised query string parameters.
+
+    Args:
+        parameters (dict): The query string parameters.
+        source_key (str): The key of the original image, used to resolve format=original.
+
+    Returns:
+        tuple: (width or None, quality, format).
+
+    Raises:
+        ValueError: If a parameter is out of range.
+    """
+    width = int(parameters['w']) if parameters.get('w') else None
+    if width is not None and not 0 < width <= MAX_WIDTH:
+        raise ValueError(f"Width must be between 1 and {MAX_WIDTH}")
+
+    quality = int(parameters.get('q', 75))
+    if not 1 <= quality <= 100:
+        raise ValueError("Quality must be between 1 and 100")
+
+    image_format = parameters.get('f', 'original')
+    if image_format == 'original':
+        # The viewer-request function only falls back to the original format for viewers accepting neither AVIF
+        # nor WebP, so other originals (gif, webp, bmp) are served as PNG, which keeps their transparency
+        extension = os.path.splitext(source_key)[1].lower().lstrip('.')
+        image_format = 'jpeg' if extension in ('jpg', 'jpeg') else 'png'
+    if image_format not in FORMATS:
+        raise ValueError(f"Format must be one of {', '.join(FORMATS)}")
+
+    return width, quality, image_format
+
+def transform(original, width, quality, image_format):
+    """
+    Resizes an image to the given width, never upscaling, and encodes it in the given format.
+
+    Args:
+        original (bytes): The original image.
+        width (int): The target width, or None to keep the original size.
+        quality (int): The encoder quality.
+        image_format (str): One of the FORMATS keys.
+
+    Returns:
+        bytes: The encoded image.
+    """
+    image = ImageOps.exif_transpose(Image.open(io.BytesIO(original)))
+    if width and image.width > width:
+        image = image.resize((width, round(image.height * width / image.width)), Image.LANCZOS)
+
+    pil_format = FORMATS[image_format][0]
+    if pil_format == "JPEG" and image.mode not in ("RGB", "L"):
+        image = image.convert("RGB")
+
+    output = io.BytesIO()
+    options = {"optimize": True} if pil_format == "PNG" else {"quality": quality}
+    image.save(output, pil_format, **options)
+    return output.getvalue()
+
+def get_object(bucket, key):
+    try:
+        return s3.get_object(Bucket=bucket, Key=key)['Body'].read()
+    except ClientError as e:
+        if e.response['Error']['Code'] in ('NoSuchKey', '404'):
+            return None
+        logger.error(f"Error retrieving s3://{bucket}/{key}: {e}")
+        raise e
+
+def error_response(status_code, message):
+    return {
+        "statusCode": status_code,
+        "headers": {"Content-Type": "application/json", "Cache-Control": "public, max-age=60"},
+        "body": json.dumps({"message": message}),
+    }
@@ -0,0 +1,102 @@
+from aws_cdk import (
+    aws_s3 as s3,
+    aws_cloudfront as cloudfront,
+    aws_cloudfront_origins as origins,
+    aws_lambda as lambda_,
+    Fn,
+    RemovalPolicy,
+    Duration
+)
+from constructs import Construct
+from typing import List
+import os, json
+from src.core.abstracts.lambda_factory import AbstractLambdaFactory
+
+class ImageOptimizerLambdaFactory(AbstractLambdaFactory):
+    def __init__(self, scope: Construct):
+        super().__init__(scope)
+
+    def create_image_optimizer_lambda(self, environment: dict) -> lambda_.Function:
+        source_dir = "src/infrastructure/web/assets/lambda/image_optimizer"
+        runtime = lambda_.Runtime.PYTHON_3_11
+        self.create_package_directory(source_dir, runtime)
+        return self.create_lambda(
+            id="ImageOptimizer-DEV",
+            handler="image_optimizer.handler",
+            runtime=runtime,
+            code=lambda_.Code.from_asset(source_dir+"/package"),
+            environment=environment,
+            timeout=Duration.seconds(25),
+            memory_size=1536,
+        )
+
+class ImageOptimizer(Construct):
+    """
+    Adds an image optimization behavior to the website distribution.
+
+    Requests under `path_pattern` are normalised at the viewer edge (width snapped to `widths`, quality clamped,
+    AVIF/WebP negotiated from Accept) and served from the edge cache. On a miss, a Lambda function URL resizes
+    the original from `source_bucket` once and keeps the result in a derived-images bucket.
+    """
+    def __init__(self, scope: Construct, id: str, distribution: cloudfront.Distribution, source_bucket: s3.IBucket,
+                 origin_verify_secret: str, source_referer: str = None, path_pattern: str = "/images/*",
+                 widths: List[int] = [320, 640, 768, 1024, 1280, 1600, 1920, 2560], default_quality: int = 75):
+        super().__init__(scope, id)
+
+        self.derived_bucket = s3.Bucket(
+            self, "DerivedImagesBucket",
+            removal_policy=RemovalPolicy.DESTROY,
+            # Derived images can always be recreated from the originals
+            lifecycle_rules=[s3.LifecycleRule(expiration=Duration.days(180))]
+        )
+
+        self.lambda_function = ImageOptimizerLambdaFactory(self).create_image_optimizer_lambda(environment={
+            "PATH_PREFIX": path_pattern.rstrip("*"),
+            "SOURCE_BUCKET": source_bucket.bucket_name,
+            "DERIVED_BUCKET": self.derived_bucket.bucket_name,
+            "ORIGIN_VERIFY_SECRET": origin_verify_secret,
+            "SOURCE_REFERER": source_referer or "",
+        })
+        source_bucket.grant_read(self.lambda_function)
+        self.derived_bucket.grant_read_write(self.lambda_function)
+
+        # The function URL is public, requests without the origin verify header are rejected by the handler
+        function_url = self.lambda_function.add_function_url(auth_type=lambda_.FunctionUrlAuthType.NONE)
+        image_origin = origins.HttpOrigin(
+            Fn.select(2, Fn.split("/", function_url.url)),
+            protocol_policy=cloudfront.OriginProtocolPolicy.HTTPS_ONLY,
+            custom_headers={"X-Origin-Verify": origin_verify_secret},
+            read_timeout=Duration.seconds(30)
+        )
+
+        with open(os.path.join(os.path.dirname(__file__), "assets", "functions", "image_viewer_request.js")) as f:
+            code = (f.read()
+                .replace("__WIDTHS__", json.dumps(sorted(widths)))
+                .replace("__DEFAULT_QUALITY__", json.dumps(default_quality)))
+        viewer_request_function = cloudfront.Function(self, "ImageViewerRequestFunction",
+            code=cloudfront.FunctionCode.from_inline(code),
+            runtime=cloudfront.FunctionRuntime.JS_2_0,
+            comment="Normalise image parameters and negotiate the image format"
+        )
+
+        # The normalised query string is the whole cache key, so each variant is cached exactly once
+        cache_policy = cloudfront.CachePolicy(self, "ImageCachePolicy",
+            min_ttl=Duration.days(1),
+            default_ttl=Duration.days(365),
+            max_ttl=Duration.days(365),
+            query_string_behavior=cloudfront.CacheQueryStringBehavior.allow_list("w", "q", "f"),
+            header_behavior=cloudfront.CacheHeaderBehavior.none(),
+            cookie_behavior=cloudfront.CacheCookieBehavior.none(),
+            comment="Cache optimized images by width, quality and format"
+        )
+
+        distribution.add_behavior(path_pattern, image_origin,
+            viewer_protocol_policy=cloudfront.ViewerProtocolPolicy.REDIRECT_TO_HTTPS,
+            allowed_methods=cloudfront.AllowedMethods.ALLOW_GET_HEAD,
+            cache_policy=cache_policy,
+            function_associations=[cloudfront.FunctionAssociation(
+                function=viewer_request_function,
+                event_type=cloudfront.FunctionEventType.VIEWER_REQUEST
+            )],
+            compress=False
+        )
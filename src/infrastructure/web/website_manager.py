@@ -8,25 +8,45 @@ from aws_cdk import (
     RemovalPolicy,
     aws_cognito as cognito,
     aws_iam as iam,
+    aws_apigateway as apigateway,
     Stack,
     Duration
 )
 from constructs import Construct
 import secrets, os, json
+from typing import List
 from src.core.secrets_manager import SecretManager
+from src.core.models.cache_profile import CacheProfile, PRECOMPRESSED_EXTENSIONS
+from src.core.models.api_cache_route import ApiCacheRoute
 
 class WebsiteManager(WebsiteManagerAbstract):
-    def __init__(self, scope, updateReferer):
+    def __init__(self, scope, updateReferer, cache_profile: CacheProfile = None, spa_fallback_path: str = "/200.html", spa_routes: List[str] = []):
         super().__init__(scope)
-        sm = SecretManager()
-        if updateReferer:
-            sm.update_secret("REFERER_SECRET", secrets.token_urlsafe(32))
-        
-        self.secret_referer_value = sm.get_secret("REFERER_SECRET")
+        self.cache_profile = cache_profile or CacheProfile.development()
+        self.spa_fallback_path = spa_fallback_path  # `nuxt generate` writes 200.html as the SPA fallback document
+        self.spa_routes = spa_routes  # Path prefixes of client-side routes, served the fallback document with 200
+        # SecretManager reads no files until a secret is used, the secrets are resolved where they are needed
+        self.secret_manager = SecretManager()
+        self.update_referer = updateReferer
+
+    @property
+    def secret_referer_value(self) -> str:
+        if self.update_referer:
+            self.secret_manager.update_secret("REFERER_SECRET", secrets.token_urlsafe(32))
+            self.update_referer = False
+        return self.secret_manager.get_secret("REFERER_SECRET")
+
+    @property
+    def image_origin_verify_value(self) -> str:
+        # Separate from the referer secret, so a leak of one does not open both the bucket and the image function URL
+        return self.secret_manager.get_or_generate_secret("IMAGE_ORIGIN_VERIFY_SECRET")
     
     def setup_s3(self):
         self.bucket = s3.Bucket(self.scope, "DevWebsiteBucket",
             website_index_document="index.html",
+            # Error responses of a distribution apply to every behavior, including /api/* and /images/*, so the SPA
+            # fallback of unknown routes is served by the website endpoint of the bucket instead (with the 404 status)
+            website_error_document=self.spa_fallback_path.lstrip("/"),
             public_read_access=False,  # Block public access
             removal_policy=RemovalPolicy.DESTROY,
         )
@@ -56,21 +76,38 @@ class WebsiteManager(WebsiteManagerAbstract):
         # Grant read access to the OAI on the S3 bucket
         self.bucket.grant_read(oai)
         
-        # Define a cache policy for development
-        cache_policy = cloudfront.CachePolicy(self.scope, "DevCachePolicy",
-            max_ttl=Duration.minutes(10),
-            default_ttl=Duration.minutes(5),
-            min_ttl=Duration.seconds(0),
-            comment="Cache policy for development environment"
+        html_cache_policy, asset_cache_policy = self.create_cache_policies()
+        # Origin Shield collapses origin fetches from every regional edge cache into one layer next to the bucket
+        s3_origin = origins.S3Origin(self.bucket, origin_access_identity=oai, custom_headers={"Referer": self.secret_referer_value},
+            origin_shield_enabled=self.cache_profile.origin_shield,
+            origin_shield_region=(self.cache_profile.origin_shield_region or Stack.of(self.scope).region) if self.cache_profile.origin_shield else None
         )
 
+        viewer_request_function = self.create_viewer_request_function()
+        function_associations = [cloudfront.FunctionAssociation(
+            function=viewer_request_function,
+            event_type=cloudfront.FunctionEventType.VIEWER_REQUEST
+        )]
+
+        def behavior(cache_policy: cloudfront.ICachePolicy) -> cloudfront.BehaviorOptions:
+            return cloudfront.BehaviorOptions(
+                origin=s3_origin,
+                viewer_protocol_policy=cloudfront.ViewerProtocolPolicy.REDIRECT_TO_HTTPS,
+                cache_policy=cache_policy,
+                compress=self.cache_profile.enable_compression,
+                function_associations=function_associations
+            )
+
         # Create a CloudFront distribution with the OAI
+        # HTML and route payloads use the short-lived default behavior, content-hashed bundles are cached long term.
+        # Nuxt build manifests live under /_nuxt/builds/ but are not content-hashed, so they keep the short TTL.
         self.distribution = cloudfront.Distribution(self.scope, "DevDistribution",
-            default_behavior=cloudfront.BehaviorOptions(
-                origin=origins.S3Origin(self.bucket, origin_access_identity=oai, custom_headers={"Referer": self.secret_referer_value}),
-                viewer_protocol_policy=cloudfront.ViewerProtocolPolicy.REDIRECT_TO_HTTPS,
-                cache_policy=cache_policy
-            ),
+            default_behavior=behavior(html_cache_policy),
+            additional_behaviors={
+                "/_nuxt/builds/*": behavior(html_cache_policy),
+                self.cache_profile.asset_path_pattern: behavior(asset_cache_policy),
+            },
+            http_version=cloudfront.HttpVersion.HTTP2_AND_3,
         )
 
         # Update the S3 bucket policy to restrict access to the CloudFront OAI
@@ -81,6 +118,140 @@ class WebsiteManager(WebsiteManagerAbstract):
             effect=iam.Effect.ALLOW
         ))
 
+    def create_viewer_request_function(self) -> cloudfront.Function:
+        """
+        Create the viewer-request CloudFront Function from assets/functions/viewer_request.js.
+
+        The function maps routes to their prerendered documents at the edge, and routes under `spa_routes` to the
+        SPA fallback document, so deep links are cached under the document's key and answered with 200 instead of
+        round-tripping to the S3 website endpoint and its 404 error document, and optionally rewrites
+        requests for compressible files to the precompressed .br/.gz object the viewer accepts.
+
+        :return: The viewer-request function.
+        """
+        with open(os.path.join(os.path.dirname(__file__), "assets", "functions", "viewer_request.js")) as f:
+            code = (f.read()
+                .replace("__PRECOMPRESSED_EXTENSIONS__", json.dumps(PRECOMPRESSED_EXTENSIONS))
+                .replace("__SERVE_PRECOMPRESSED__", json.dumps(self.cache_profile.serve_precompressed))
+                .replace("__SPA_ROUTE_PREFIXES__", json.dumps(self.spa_routes))
+                .replace("__SPA_FALLBACK_PATH__", json.dumps(self.spa_fallback_path)))
+
+        return cloudfront.Function(self.scope, "ViewerRequestFunction",
+            code=cloudfront.FunctionCode.from_inline(code),
+            runtime=cloudfront.FunctionRuntime.JS_2_0,
+            comment="Route rewriting and precompressed variant selection"
+        )
+
+    def create_cache_policies(self):
+        """
+        Create the cache policies for HTML documents and for content-hashed assets from the cache profile.
+
+        :return: Tuple of (html_cache_policy, asset_cache_policy).
+        """
+        profile = self.cache_profile
+        html_cache_policy = cloudfront.CachePolicy(self.scope, "DevCachePolicy",
+            max_ttl=Duration.seconds(profile.html_max_ttl),
+            default_ttl=Duration.seconds(profile.html_default_ttl),
+            min_ttl=Duration.seconds(profile.html_min_ttl),
+            enable_accept_encoding_gzip=profile.enable_compression,
+            enable_accept_encoding_brotli=profile.enable_compression,
+            comment=f"Cache policy for HTML and route payloads ({profile.name})"
+        )
+        asset_cache_policy = cloudfront.CachePolicy(self.scope, "DevAssetCachePolicy",
+            max_ttl=Duration.seconds(profile.asset_max_ttl),
+            default_ttl=Duration.seconds(profile.asset_default_ttl),
+            min_ttl=Duration.seconds(profile.asset_min_ttl),
+            enable_accept_encoding_gzip=profile.enable_compression,
+            enable_accept_encoding_brotli=profile.enable_compression,
+            comment=f"Cache policy for content-hashed assets ({profile.name})"
+        )
+        return html_cache_policy, asset_cache_policy
+
+    def add_api_behaviors(self, rest_api: apigateway.RestApi, cached_routes: List[ApiCacheRoute] = [], path_prefix: str = "/api"):
+        """
+        Serve the REST API from the website distribution under `path_prefix`.
+
+        Browsers reuse the TLS connection to the nearest edge for API calls, and CloudFront keeps warm connections
+        to the regional API endpoint. `cached_routes` are cached at the edge keyed on their query strings; every
+        other request under the prefix is passed through uncached.
+
+        :param rest_api: The API to add as an origin.
+        :param cached_routes: The GET routes to cache, in order of precedence.
+        :param path_prefix: The path the API is mounted under on the distribution.
+        """
+        api_origin = origins.RestApiOrigin(rest_api)
+
+        with open(os.path.join(os.path.dirname(__file__), "assets", "functions", "api_viewer_request.js")) as f:
+            code = f.read().replace("__API_PREFIX__", json.dumps(path_prefix))
+        api_function = cloudfront.Function(self.scope, "ApiViewerRequestFunction",
+            code=cloudfront.FunctionCode.from_inline(code),
+            runtime=cloudfront.FunctionRuntime.JS_2_0,
+            comment="Strip the API prefix before forwarding to API Gateway"
+        )
+
+        # Host must stay API Gateway's own, and Authorization can only be forwarded through the cache key
+        origin_request_policy = cloudfront.OriginRequestPolicy(self.scope, "ApiOriginRequestPolicy",
+            header_behavior=cloudfront.OriginRequestHeaderBehavior.allow_list(
+                "Accept", "Accept-Language", "Content-Type", "Origin", "X-Requested-With"
+            ),
+            query_string_behavior=cloudfront.OriginRequestQueryStringBehavior.all(),
+            cookie_behavior=cloudfront.OriginRequestCookieBehavior.all(),
+            comment="Forward API request headers, query strings and cookies"
+        )
+        # A max TTL of 1s is the smallest that still allows Authorization in the cache key
+        pass_through_cache_policy = cloudfront.CachePolicy(self.scope, "ApiPassThroughCachePolicy",
+            min_ttl=Duration.seconds(0),
+            default_ttl=Duration.seconds(0),
+            max_ttl=Duration.seconds(1),
+            header_behavior=cloudfront.CacheHeaderBehavior.allow_list("Authorization"),
+            query_string_behavior=cloudfront.CacheQueryStringBehavior.all(),
+            cookie_behavior=cloudfront.CacheCookieBehavior.none(),
+            enable_accept_encoding_gzip=True,
+            enable_accept_encoding_brotli=True,
+            comment="Pass API requests through uncached"
+        )
+
+        function_associations = [cloudfront.FunctionAssociation(
+            function=api_function,
+            event_type=cloudfront.FunctionEventType.VIEWER_REQUEST
+        )]
+
+        # Routes with the same TTLs and visibility share a cache policy
+        cache_policies = {}
+        for route in cached_routes:
+            policy_key = (route.default_ttl, route.max_ttl, route.public)
+            if policy_key not in cache_policies:
+                cache_policies[policy_key] = cloudfront.CachePolicy(self.scope, f"ApiGetCachePolicy{len(cache_policies)}",
+                    min_ttl=Duration.seconds(0),
+                    default_ttl=Duration.seconds(route.default_ttl),
+                    max_ttl=Duration.seconds(route.max_ttl),
+                    header_behavior=cloudfront.CacheHeaderBehavior.none() if route.public else cloudfront.CacheHeaderBehavior.allow_list("Authorization"),
+                    query_string_behavior=cloudfront.CacheQueryStringBehavior.all(),
+                    cookie_behavior=cloudfront.CacheCookieBehavior.none(),
+                    enable_accept_encoding_gzip=True,
+                    enable_accept_encoding_brotli=True,
+                    comment=f"Cache {'public' if route.public else 'per-caller'} API GET routes for {route.default_ttl}s"
+                )
+            self.distribution.add_behavior(route.path_pattern, api_origin,
+                viewer_protocol_policy=cloudfront.ViewerProtocolPolicy.HTTPS_ONLY,
+                # Only GET and HEAD responses are cached, writes to the same paths are passed through
+                allowed_methods=cloudfront.AllowedMethods.ALLOW_ALL,
+                cached_methods=cloudfront.CachedMethods.CACHE_GET_HEAD,
+                cache_policy=cache_policies[policy_key],
+                origin_request_policy=origin_request_policy,
+                function_associations=function_associations,
+                compress=True
+            )
+
+        self.distribution.add_behavior(f"{path_prefix}/*", api_origin,
+            viewer_protocol_policy=cloudfront.ViewerProtocolPolicy.HTTPS_ONLY,
+            allowed_methods=cloudfront.AllowedMethods.ALLOW_ALL,
+            cache_policy=pass_through_cache_policy,
+            origin_request_policy=origin_request_policy,
+            function_associations=function_associations,
+            compress=True
+        )
+
     def setup_route53(self):
         # Setup Route 53 if required for the development stack
         pass
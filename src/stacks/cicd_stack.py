@@ -6,7 +6,7 @@ a pipeline that listens for changes in the GitHub repository and triggers the bu
 """
 
 from constructs import Construct
-import os, shutil, sys
+import os, re, shutil, sys
 from aws_cdk import (
     Stack,
     aws_codepipeline as codepipeline,
@@ -23,36 +23,52 @@ from aws_cdk import (
     Duration
 )
 
-from src.cicd.pipeline_manager import PipelineManager
+from src.cicd.pipeline_manager import PipelineManager, StageManagerBuildImage
 from src.cicd.lambda_factory import LambdaFactory
 from src.cicd.notification_manager import NotificationManager
 from src.core.models.repository import Repository
 
+# S3 expiration counts from when an object was last written. CodeBuild rewrites its cache after every build, so it
+# lives 30 days past the last build. Dependency tarballs are written once per lockfile and expire 30 days after that
+# even while in use, after which the next build misses, reinstalls and saves a fresh tarball.
+BUILD_CACHE_LIFECYCLE_RULE = s3.LifecycleRule(prefix="build-cache/", expiration=Duration.days(30))
+
+# Published Lambda versions keep their own copy of the code, so staged packages are only needed until the deploy
+LAMBDA_PACKAGE_LIFECYCLE_RULE = s3.LifecycleRule(prefix="lambda-packages/", expiration=Duration.days(30))
+
 class CICDStack(Stack):
     def __init__(self, scope: Construct, construct_id: str, repositories: dict, **kwargs) -> None:
         super().__init__(scope, construct_id, **kwargs)
 
-        dev_web_repo_info: Repository = repositories.get("dev-website-repo")
-        artifact_bucket_web = s3.Bucket(self, "ArtifactBucket", removal_policy=RemovalPolicy.DESTROY)
-        pipeline_manager_web = PipelineManager(self, dev_web_repo_info.stageType, artifact_bucket_web, pipeline_name="RentalPropertiesAgentWeb_DEV", repository_info=dev_web_repo_info)
-        pipeline_manager_web.configure_pipeline()
-        
-        dev_middle_tier_repo_info: Repository = repositories.get("dev-api-repo")
-        artifact_bucket_mt = s3.Bucket(self, "ArtifactBucketMT", removal_policy=RemovalPolicy.DESTROY)
-        pipeline_manager_mt = PipelineManager(self, dev_middle_tier_repo_info.stageType, artifact_bucket_mt, pipeline_name="RentalPropertiesAgentMT_DEV", repository_info=dev_middle_tier_repo_info)
-        pipeline_manager_mt.configure_pipeline()
-        
+        # One artifact bucket for every pipeline, CodePipeline and the stage managers keep their objects under per-pipeline and per-repository prefixes
+        artifact_bucket = s3.Bucket(self, "ArtifactBucket", removal_policy=RemovalPolicy.DESTROY, lifecycle_rules=[BUILD_CACHE_LIFECYCLE_RULE, LAMBDA_PACKAGE_LIFECYCLE_RULE])
+
+        # The build images are published first so the application projects can be pointed at them
+        ordered_repositories = sorted(repositories.values(), key=lambda repo_info: not issubclass(repo_info.stageType, StageManagerBuildImage))
+        image_repositories = {}
+        pipeline_managers = []
+        for repo_info in ordered_repositories:
+            image_repository = image_repositories.get(repo_info.stageType.build_image_name)
+            if image_repository is not None:
+                repo_info.build_dependencies.append(image_repository)
+
+            pipeline_name = repo_info.pipeline_name or f"{re.sub(r'[^A-Za-z0-9]', '', repo_info.name)}_DEV"
+            pipeline_manager = PipelineManager(self, repo_info.stageType, artifact_bucket, pipeline_name=pipeline_name, repository_info=repo_info)
+            pipeline_manager.configure_pipeline()
+            repo_info.pipeline_name = pipeline_manager.pipeline.pipeline_name
+            pipeline_managers.append(pipeline_manager)
+
+            if isinstance(pipeline_manager.stage_manager, StageManagerBuildImage):
+                image_repositories.update(pipeline_manager.stage_manager.image_repositories)
+
+        pipeline_arns = [pipeline_manager.pipeline.pipeline_arn for pipeline_manager in pipeline_managers]
         lambda_factory = LambdaFactory(self)
-        github_lambda = lambda_factory.create_github_status_lambda(self, [pipeline_manager_web.pipeline.pipeline_arn, pipeline_manager_mt.pipeline.pipeline_arn], [artifact_bucket_web, artifact_bucket_mt])
-        discord_lambda = lambda_factory.create_discord_notifier_lambda(self, [pipeline_manager_web.pipeline.pipeline_arn, pipeline_manager_mt.pipeline.pipeline_arn])
-        
-        dev_web_repo_info.pipeline_name = pipeline_manager_web.pipeline.pipeline_name
-        dev_middle_tier_repo_info.pipeline_name = pipeline_manager_mt.pipeline.pipeline_name
+        github_lambda = lambda_factory.create_github_status_lambda(self, pipeline_arns, [artifact_bucket])
+        discord_lambda = lambda_factory.create_discord_notifier_lambda(self, pipeline_arns)
+        self.notifier_functions = [github_lambda, discord_lambda]
 
+        # Build status is reported for the packaging build of every repository that has one
         notification_manager = NotificationManager(self)
-        notification_manager.create_build_start_rule(dev_web_repo_info, github_lambda)
-        notification_manager.create_build_success_rule(dev_web_repo_info, github_lambda, discord_lambda)
-        notification_manager.create_build_failure_rule(dev_web_repo_info, github_lambda, discord_lambda)
-        notification_manager.create_build_start_rule(dev_middle_tier_repo_info, github_lambda)
-        notification_manager.create_build_success_rule(dev_middle_tier_repo_info, github_lambda, discord_lambda)
-        notification_manager.create_build_failure_rule(dev_middle_tier_repo_info, github_lambda, discord_lambda)
\ No newline at end of file
+        for repo_info in ordered_repositories:
+            if repo_info.build_project_name is not None:
+                notification_manager.create_build_rules(repo_info, github_lambda, discord_lambda)
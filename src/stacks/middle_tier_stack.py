@@ -20,16 +20,20 @@ from aws_cdk import (
     RemovalPolicy,
     Duration
 )
+from src.infrastructure.media.media_uploads import MediaUploads
+from src.core.models.media_upload_settings import MediaUploadSettings
+
 class MiddleTierStack(Stack):
-    def __init__(self, scope: Construct, construct_id: str, private_lambda: lambda_.Function, **kwargs) -> None:
+    def __init__(self, scope: Construct, construct_id: str, private_lambda: lambda_.Function, private_lambda_alias: lambda_.Alias = None,
+                 media_upload_settings: MediaUploadSettings = MediaUploadSettings(), **kwargs) -> None:
         super().__init__(scope, construct_id, **kwargs)
 
         self._lambda_function = private_lambda
         
-        # Create the API Gateway REST API
+        # Create the API Gateway REST API, invoking the alias when the function is deployed through one
         self.rest_api = apigateway.LambdaRestApi(
             self, "FastApiEndpoint",
-            handler=self._lambda_function,
+            handler=private_lambda_alias or self._lambda_function,
             proxy=False
         )
         
@@ -38,6 +42,9 @@ class MiddleTierStack(Stack):
         
         self.setup_cognito_user_pool()
         
+        # Listing photos are uploaded straight to S3 with presigned multipart URLs minted by the API
+        self.media_uploads = MediaUploads(self, "MediaUploads", api_lambda=self._lambda_function, settings=media_upload_settings)
+        
     def setup_cognito_user_pool(self):
         # Create the Cognito user pool with email and username sign-in options
         self.user_pool = cognito.UserPool(self, "DevUserPool",
@@ -82,6 +89,10 @@ class MiddleTierStack(Stack):
     def cognito_user_pool(self) -> cognito.UserPool:
         return self.user_pool
     
+    @property
+    def media_uploads_bucket(self) -> s3.Bucket:
+        return self.media_uploads.bucket
+    
     @property
     def api_gateway(self) -> apigateway.RestApi:
         return self.rest_api
\ No newline at end of file
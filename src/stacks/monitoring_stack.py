@@ -0,0 +1,25 @@
+"""
+Monitoring stack -- dashboard over the pipelines and the runtime resources of the other stacks
+"""
+from constructs import Construct
+from aws_cdk import Stack
+from src.infrastructure.monitoring.performance_dashboard import PerformanceDashboard
+from src.stacks.cicd_stack import CICDStack
+from src.stacks.vpc_stack import VPCStack
+from src.stacks.website_stack import WebsiteStack
+from src.stacks.middle_tier_stack import MiddleTierStack
+
+class MonitoringStack(Stack):
+    def __init__(self, scope: Construct, construct_id: str, repositories: dict, vpc_stack: VPCStack, website_stack: WebsiteStack,
+                 middle_tier_stack: MiddleTierStack, cicd_stack: CICDStack, **kwargs) -> None:
+        super().__init__(scope, construct_id, **kwargs)
+
+        self.performance_dashboard = PerformanceDashboard(self, "PerformanceDashboard",
+            repositories=list(repositories.values()),
+            notifier_functions=cicd_stack.notifier_functions,
+            rest_api=middle_tier_stack.api_gateway,
+            api_function=vpc_stack.private_lambda_instance,
+            database=vpc_stack.database_instance,
+            nat_auto_scaling_group_names=vpc_stack.nat_auto_scaling_group_names,
+            distribution=website_stack.distribution
+        )
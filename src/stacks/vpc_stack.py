@@ -17,15 +17,17 @@ from aws_cdk import (
     Duration
 )
 from constructs import Construct
-import boto3, json
 from cdk_fck_nat import FckNatInstanceProvider
 from src.infrastructure.vpc.nat_provider import NatProvider
 from src.infrastructure.vpc.bastion_host import BastionHost
 from src.infrastructure.rds.rds_instance import RdsInstance
+from src.infrastructure.rds.query_stats_exporter import QueryStatsExporter
 from src.infrastructure.vpc.lambda_instance import LambdaInstance
+from src.infrastructure.vpc.lambda_canary_deployment import LambdaCanaryDeployment
+from src.core.models.media_upload_settings import MediaUploadSettings
 
 class VPCStack(Stack):
-    def __init__(self, scope: Construct, id: str, **kwargs):
+    def __init__(self, scope: Construct, id: str, api_package_type: str = "zip", media_upload_settings: MediaUploadSettings = None, **kwargs):
         super().__init__(scope, id, **kwargs)
         
         nat_provider = NatProvider(self, id="Nat Provider", instance_type="t4g.micro")
@@ -53,7 +55,8 @@ class VPCStack(Stack):
         
         bastion_host = BastionHost(self, "BastionHost", vpc=vpc)
         rds_instance = RdsInstance(self, "RdsInstance", vpc=vpc, bastion_sg=bastion_host.security_group, vpc_subnet=ec2.SubnetSelection(subnet_group_name="RdsPrivateSubnet"))
-        self.lambda_api_instance = LambdaInstance(self, "LambdaInstance", vpc=vpc, vpc_subnet=ec2.SubnetSelection(subnet_group_name="LambdaPrivateSubnet"))
+        self.lambda_api_instance = LambdaInstance(self, "LambdaInstance", vpc=vpc, vpc_subnet=ec2.SubnetSelection(subnet_group_name="LambdaPrivateSubnet"), package_type=api_package_type,
+                                                   environment=media_upload_settings.lambda_environment() if media_upload_settings else {})
         
         # Configure
         self.lambda_api_instance.set_egress_rule(
@@ -71,6 +74,32 @@ class VPCStack(Stack):
         rds_instance.create()
         self.lambda_api_instance.create()
         
+        # The API invokes the function through an alias that CodeDeploy shifts to new versions gradually
+        self.lambda_canary_deployment = LambdaCanaryDeployment(self, "FastApiCanaryDeployment", lambda_function=self.lambda_api_instance.lambda_function)
+        
+        self.vpc = vpc
+        self.rds_instance = rds_instance
+        
+        # Periodically export the slowest queries to CloudWatch and S3
+        self.query_stats_exporter = QueryStatsExporter(self, "QueryStatsExporter", vpc=vpc, vpc_subnet=ec2.SubnetSelection(subnet_group_name="LambdaPrivateSubnet"), rds_instance=rds_instance)
+        
     @property
     def private_lambda_instance(self) -> lambda_.Function:
-        return self.lambda_api_instance.lambda_function
\ No newline at end of file
+        return self.lambda_api_instance.lambda_function
+    
+    @property
+    def private_lambda_alias(self) -> lambda_.Alias:
+        return self.lambda_canary_deployment.alias
+    
+    @property
+    def private_lambda_deployment_group(self):
+        return self.lambda_canary_deployment.deployment_group
+    
+    @property
+    def database_instance(self) -> rds.DatabaseInstance:
+        return self.rds_instance.instance
+    
+    @property
+    def nat_auto_scaling_group_names(self):
+        # fck-nat runs each NAT instance in a single instance auto scaling group inside its public subnet
+        return [subnet.node.find_child("FckNatAsg").auto_scaling_group_name for subnet in self.vpc.public_subnets]
\ No newline at end of file
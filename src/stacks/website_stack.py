@@ -6,21 +6,42 @@ from aws_cdk import (
     aws_cloudfront_origins as origins,
     RemovalPolicy,
     aws_cognito as cognito,
+    aws_apigateway as apigateway,
     Stack
 )
 from constructs import Construct
 from src.infrastructure.web.website_manager import WebsiteManager
+from src.infrastructure.web.image_optimizer import ImageOptimizer
+from src.core.models.cache_profile import CacheProfile
+from src.core.models.api_cache_route import ApiCacheRoute
+from typing import List
 
 class WebsiteStack(Stack):
-    def __init__(self, scope: Construct, id: str, updateRefererSecret: bool = True, **kwargs):
+    def __init__(self, scope: Construct, id: str, updateRefererSecret: bool = True, cache_profile: CacheProfile = None, enableImageOptimizer: bool = True,
+                 spa_routes: List[str] = [], **kwargs):
         super().__init__(scope, id, **kwargs)
         
-        self.website_manager = WebsiteManager(self, updateReferer=updateRefererSecret)
+        self.website_manager = WebsiteManager(self, updateReferer=updateRefererSecret, cache_profile=cache_profile, spa_routes=spa_routes)
 
         self.website_manager.setup_s3()
         self.website_manager.setup_cloudfront()
+        if enableImageOptimizer:
+            # Originals are read from the website bucket, which only serves requests carrying the referer secret
+            self.image_optimizer = ImageOptimizer(self, "ImageOptimizer",
+                distribution=self.website_manager.distribution,
+                source_bucket=self.website_manager.bucket,
+                origin_verify_secret=self.website_manager.image_origin_verify_value,
+                source_referer=self.website_manager.secret_referer_value
+            )
         # self.setup_route53()  # Uncomment if Route 53 is needed for the development environment
 
+    def add_api(self, rest_api: apigateway.RestApi, cached_routes: List[ApiCacheRoute] = []):
+        self.website_manager.add_api_behaviors(rest_api, cached_routes)
+
     @property
     def website_bucket(self) -> s3.Bucket:
-        return self.website_manager.bucket
\ No newline at end of file
+        return self.website_manager.bucket
+    
+    @property
+    def distribution(self) -> cloudfront.Distribution:
+        return self.website_manager.distribution
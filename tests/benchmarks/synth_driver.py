@@ -0,0 +1,51 @@
+"""
+Runs app.py with timers around the construction of every stack and the synth, and writes the timings as JSON.
+
+Usage: python -m tests.benchmarks.synth_driver <output file>
+
+Run from the repository root with CDK_OUTDIR pointing at a scratch directory.
+"""
+import functools
+import glob
+import importlib
+import inspect
+import json
+import os
+import runpy
+import sys
+import time
+
+def wrap(owner, name, timings, key):
+    original = getattr(owner, name)
+
+    @functools.wraps(original)
+    def timed(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return original(*args, **kwargs)
+        finally:
+            timings[key] = timings.get(key, 0) + time.perf_counter() - start
+
+    setattr(owner, name, timed)
+
+def main(output_file):
+    timings = {"stacks": {}}
+    start = time.perf_counter()
+
+    import aws_cdk
+    for path in sorted(glob.glob("src/stacks/*.py")):
+        module = importlib.import_module(path[:-3].replace("/", "."))
+        for name, cls in inspect.getmembers(module, inspect.isclass):
+            if cls.__module__ == module.__name__ and issubclass(cls, aws_cdk.Stack):
+                wrap(cls, "__init__", timings["stacks"], name)
+    timings["import"] = time.perf_counter() - start
+
+    wrap(aws_cdk.App, "synth", timings, "synth")
+    runpy.run_path("app.py", run_name="__main__")
+    timings["total"] = time.perf_counter() - start
+
+    with open(output_file, "w") as f:
+        json.dump(timings, f, indent=2)
+
+if __name__ == "__main__":
+    main(sys.argv[1])
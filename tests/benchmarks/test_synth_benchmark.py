@@ -0,0 +1,100 @@
+"""
+Benchmarks of the inner dev loop: import time of the heavy modules, construction time of every stack and the
+total synth of app.py.
+
+The measurements are compared against tests/benchmarks/baseline.json, which is recorded by the first run on a
+machine, and the tests fail when one is slower than the baseline by more than BENCHMARK_TOLERANCE (a fraction,
+0.5 by default) and BENCHMARK_MIN_DELTA seconds. Run with BENCHMARK_UPDATE_BASELINE=1 to record a new baseline
+after an intended change. The benchmarks synthesize the whole app and only run with RUN_BENCHMARKS=1:
+
+    RUN_BENCHMARKS=1 python -m pytest tests/benchmarks -q
+"""
+import json
+import os
+import re
+import subprocess
+import sys
+import tempfile
+import pytest
+
+REPOSITORY_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+BASELINE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+TOLERANCE = float(os.getenv("BENCHMARK_TOLERANCE", "0.5"))
+MIN_DELTA = float(os.getenv("BENCHMARK_MIN_DELTA", "0.05"))
+IMPORT_RUNS = 3
+
+MODULES = [
+    "aws_cdk",
+    "boto3",
+    "cryptography.fernet",
+    "src.core.secrets_manager",
+    "src.stacks.vpc_stack",
+    "src.stacks.website_stack",
+    "src.stacks.middle_tier_stack",
+    "src.stacks.cicd_stack",
+    "src.stacks.monitoring_stack",
+]
+
+pytestmark = pytest.mark.skipif(not os.getenv("RUN_BENCHMARKS"), reason="set RUN_BENCHMARKS=1 to run the benchmarks")
+
+def benchmark_environment(**variables):
+    environment = dict(os.environ, JSII_SILENCE_WARNING_DEPRECATED_NODE_VERSION="1", **variables)
+    environment.setdefault("AWS_ACCOUNT_ID", "123456789012")
+    environment.setdefault("AWS_REGION", "us-east-1")
+    return environment
+
+def measure_import(module):
+    """
+    Returns the cumulative import time of a module in seconds, the best of IMPORT_RUNS fresh interpreters.
+    """
+    times = []
+    for _ in range(IMPORT_RUNS):
+        result = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                                cwd=REPOSITORY_ROOT, env=benchmark_environment(), capture_output=True, text=True, check=True)
+        # import time: self [us] | cumulative | imported package
+        cumulative = [int(match.group(1)) for match in re.finditer(rf"^import time:\s+\d+ \|\s+(\d+) \|\s*{re.escape(module)}$", result.stderr, re.MULTILINE)]
+        times.append(cumulative[-1] / 1e6)
+    return min(times)
+
+def measure_synth():
+    """
+    Synthesizes app.py into a scratch directory and returns the timings of synth_driver.
+    """
+    with tempfile.TemporaryDirectory() as output_directory:
+        timings_file = os.path.join(output_directory, "timings.json")
+        subprocess.run([sys.executable, "-m", "tests.benchmarks.synth_driver", timings_file], cwd=REPOSITORY_ROOT,
+                       env=benchmark_environment(CDK_OUTDIR=os.path.join(output_directory, "cdk.out")), check=True, stdout=subprocess.DEVNULL)
+        with open(timings_file) as f:
+            return json.load(f)
+
+@pytest.fixture(scope="module")
+def measurements():
+    synth = measure_synth()
+    results = {f"import {module}": measure_import(module) for module in MODULES}
+    results.update({f"construct {stack}": seconds for stack, seconds in synth["stacks"].items()})
+    results["synth"] = synth["synth"]
+    results["total"] = synth["total"]
+    return results
+
+@pytest.fixture(scope="module")
+def baseline(measurements):
+    if os.getenv("BENCHMARK_UPDATE_BASELINE") or not os.path.exists(BASELINE_FILE):
+        with open(BASELINE_FILE, "w") as f:
+            json.dump(measurements, f, indent=2, sort_keys=True)
+    with open(BASELINE_FILE) as f:
+        return json.load(f)
+
+def test_no_regressions(measurements, baseline):
+    for name, seconds in sorted(measurements.items()):
+        print(f"{name}: {seconds:.3f}s (baseline {baseline.get(name, float('nan')):.3f}s)")
+    regressions = [
+        f"{name}: {seconds:.3f}s, baseline {baseline[name]:.3f}s"
+        for name, seconds in measurements.items()
+        if name in baseline and seconds > baseline[name] * (1 + TOLERANCE) and seconds - baseline[name] > MIN_DELTA
+    ]
+    assert not regressions, "Slower than the baseline:\n" + "\n".join(regressions)
+
+def test_all_stacks_measured(measurements):
+    # A stack missing from the timings was not constructed by app.py or not picked up by synth_driver
+    for stack in ["VPCStack", "WebsiteStack", "MiddleTierStack", "CICDStack"]:
+        assert f"construct {stack}" in measurements
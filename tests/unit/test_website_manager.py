@@ -0,0 +1,55 @@
+import aws_cdk as core
+import aws_cdk.assertions as assertions
+from aws_cdk import aws_apigateway as apigateway
+import pytest
+
+from src.core.models.api_cache_route import ApiCacheRoute
+from src.core.secrets_manager import SecretManager
+from src.stacks.website_stack import WebsiteStack
+
+ALL_METHODS = ["GET", "HEAD", "OPTIONS", "PUT", "PATCH", "POST", "DELETE"]
+
+@pytest.fixture
+def template(tmp_path, monkeypatch):
+    # SecretManager keeps its files in the working directory
+    monkeypatch.chdir(tmp_path)
+    SecretManager().generate_secret("REFERER_SECRET", "referer")
+
+    app = core.App()
+    stack = WebsiteStack(app, "TestWebsiteStack", updateRefererSecret=False, enableImageOptimizer=False)
+    rest_api = apigateway.RestApi(stack, "Api")
+    rest_api.root.add_method("GET", apigateway.MockIntegration())
+    stack.add_api(rest_api, cached_routes=[ApiCacheRoute(path_pattern="/api/properties*")])
+    return assertions.Template.from_stack(stack)
+
+def cache_behaviors(template):
+    distribution = next(iter(template.find_resources("AWS::CloudFront::Distribution").values()))
+    return {behavior["PathPattern"]: behavior for behavior in distribution["Properties"]["DistributionConfig"]["CacheBehaviors"]}
+
+def test_cached_api_routes_pass_writes_through(template):
+    behavior = cache_behaviors(template)["/api/properties*"]
+    assert behavior["AllowedMethods"] == ALL_METHODS
+    assert behavior["CachedMethods"] == ["GET", "HEAD"]
+
+def test_api_prefix_allows_every_method(template):
+    assert cache_behaviors(template)["/api/*"]["AllowedMethods"] == ALL_METHODS
+
+def test_distribution_has_no_error_responses(template):
+    # Error responses would apply to the API behaviors too, the SPA fallback is the bucket's error document
+    template.has_resource_properties("AWS::CloudFront::Distribution", {
+        "DistributionConfig": assertions.Match.object_like({"CustomErrorResponses": assertions.Match.absent()})
+    })
+    template.has_resource_properties("AWS::S3::Bucket", {
+        "WebsiteConfiguration": {"IndexDocument": "index.html", "ErrorDocument": "200.html"}
+    })
+
+def test_spa_routes_are_rewritten_to_the_fallback_document(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    SecretManager().generate_secret("REFERER_SECRET", "referer")
+
+    app = core.App()
+    stack = WebsiteStack(app, "TestWebsiteStack", updateRefererSecret=False, enableImageOptimizer=False, spa_routes=["/properties/"])
+    function = next(iter(assertions.Template.from_stack(stack).find_resources("AWS::CloudFront::Function").values()))
+    code = function["Properties"]["FunctionCode"]
+    assert 'var SPA_ROUTE_PREFIXES = ["/properties/"];' in code
+    assert 'var SPA_FALLBACK_PATH = "/200.html";' in code